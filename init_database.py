@@ -10,7 +10,7 @@ from pathlib import Path
 # Добавляем путь к src
 sys.path.append(str(Path(__file__).parent / "src"))
 
-from src.database.connection import get_engine
+from src.database.connection import get_async_engine
 from src.database.models import Base
 
 
@@ -21,7 +21,7 @@ async def init_database():
     
     try:
         # Получаем движок
-        engine = get_engine()
+        engine = get_async_engine()
         
         # Создаем все таблицы
         print("Создаем таблицы...")
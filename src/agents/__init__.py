@@ -3,5 +3,13 @@
 """
 
 from .vkr_topic_agent import VKRTopicAgent, TopicGenerationConfig
+from .streaming_parser import IncrementalTopicParser
+from .structured_output import GeneratedTopics
+from .packing import MicroBatcher
+from .rate_limit import ProviderLimiter, TokenBucket, get_provider_limiter, reset_provider_limiters
+from .http_client import get_http_client, close_http_client
 
-__all__ = ["VKRTopicAgent", "TopicGenerationConfig"]
+__all__ = ["VKRTopicAgent", "TopicGenerationConfig", "IncrementalTopicParser", "GeneratedTopics",
+           "MicroBatcher",
+           "ProviderLimiter", "TokenBucket", "get_provider_limiter", "reset_provider_limiters",
+           "get_http_client", "close_http_client"]
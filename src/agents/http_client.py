@@ -0,0 +1,132 @@
+"""
+Общий HTTP-клиент для обращений к провайдерам моделей
+
+Все OpenAI-совместимые клиенты (openai, openrouter) используют один
+httpx.AsyncClient на процесс: пул keepalive-соединений, HTTP/2 (если
+установлен пакет h2) и таймауты из настроек. Так соединения и
+TLS-сессии переиспользуются между агентами и запросами.
+
+Соединения пула принадлежат event loop, в котором открыты, поэтому
+клиентам моделей передается LoopBoundClient: он отправляет запросы
+через клиент текущего event loop (один на loop, как лимитеры в
+rate_limit).
+"""
+
+import asyncio
+import weakref
+from typing import Any, Dict, Optional
+
+import httpx
+from loguru import logger
+
+from ..config import settings
+
+
+class ConnectionStats:
+    """Счетчики запросов и новых соединений для оценки переиспользования"""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections = 0
+        self.tls_handshakes = 0
+
+    async def on_request(self, request: httpx.Request) -> None:
+        """Хук запроса httpx: подписка на события соединения httpcore"""
+        self.requests += 1
+        request.extensions["trace"] = self._trace
+
+    async def _trace(self, event: str, info: Dict[str, Any]) -> None:
+        if event == "connection.connect_tcp.complete":
+            self.connections += 1
+        elif event == "connection.start_tls.complete":
+            self.tls_handshakes += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """Запросы, новые соединения и доля запросов по уже открытым соединениям"""
+        return {
+            "requests": self.requests,
+            "connections": self.connections,
+            "tls_handshakes": self.tls_handshakes,
+            "reuse_ratio": 1 - self.connections / self.requests if self.requests else None
+        }
+
+
+def http2_available() -> bool:
+    """Установлен ли пакет h2 (поддержка HTTP/2 в httpx)"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_http_client(stats: Optional[ConnectionStats] = None) -> httpx.AsyncClient:
+    """
+    Создание HTTP-клиента с параметрами пула и таймаутами из настроек
+
+    Args:
+        stats: Счетчики соединений (None - без учета)
+
+    Returns:
+        Новый httpx.AsyncClient
+    """
+    http2 = settings.http2 and http2_available()
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry
+        ),
+        timeout=httpx.Timeout(settings.http_timeout, connect=settings.http_connect_timeout),
+        event_hooks={"request": [stats.on_request]} if stats is not None else None
+    )
+
+
+class LoopBoundClient(httpx.AsyncClient):
+    """HTTP-клиент, отправляющий запросы через общий клиент текущего event loop"""
+
+    async def send(self, request: httpx.Request, **kwargs: Any) -> httpx.Response:
+        return await loop_http_client().send(request, **kwargs)
+
+    async def aclose(self) -> None:
+        await close_http_client()
+
+
+# Пулы соединений привязаны к event loop - клиенты хранятся отдельно для каждого
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+    weakref.WeakKeyDictionary()
+)
+_client: Optional[LoopBoundClient] = None
+connection_stats = ConnectionStats()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Общий HTTP-клиент процесса для клиентов моделей (можно получить вне event loop)"""
+    global _client
+    if _client is None:
+        _client = LoopBoundClient(
+            timeout=httpx.Timeout(settings.http_timeout, connect=settings.http_connect_timeout)
+        )
+    return _client
+
+
+def loop_http_client() -> httpx.AsyncClient:
+    """HTTP-клиент текущего event loop (создается при первом обращении)"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _clients[loop] = create_http_client(connection_stats)
+        http2 = settings.http2 and http2_available()
+        logger.info(
+            f"Создан общий HTTP-клиент моделей: HTTP/2 {'включен' if http2 else 'выключен'}, "
+            f"до {settings.http_max_connections} соединений"
+        )
+    return client
+
+
+async def close_http_client() -> None:
+    """Закрытие HTTP-клиента текущего event loop (при остановке сервиса)"""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,110 @@
+"""
+Микропакетирование запросов к модели
+
+Запросы, пришедшие в течение короткого окна, собираются в пакет по
+ключу совместимости и передаются обработчику одним списком. Обработчик
+возвращает результат (или исключение) для каждого запроса пакета.
+"""
+
+import asyncio
+import time
+from typing import (
+    Any, Awaitable, Callable, Dict, Generic, Hashable, List, Set, Tuple, TypeVar, Union
+)
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+PackHandler = Callable[[List[T]], Awaitable[List[Union[R, Exception]]]]
+
+
+class MicroBatcher(Generic[T, R]):
+    """Сбор одновременных запросов в пакеты"""
+
+    def __init__(self, handler: PackHandler, window: float, max_size: int = 8):
+        """
+        Args:
+            handler: Обработка пакета; результаты в порядке запросов
+            window: Сколько ждать попутных запросов после первого (секунды)
+            max_size: Размер пакета, при котором он отправляется сразу
+        """
+        self.handler = handler
+        self.window = window
+        self.max_size = max_size
+
+        self._pending: Dict[Hashable, List[Tuple[T, "asyncio.Future[R]", float]]] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+        self._batches = 0
+        self._items = 0
+        self._max_batch_size = 0
+        self._wait_time = 0.0
+
+    async def submit(self, key: Hashable, item: T) -> R:
+        """
+        Добавление запроса в пакет и ожидание его результата
+
+        Args:
+            key: Ключ совместимости (в один пакет попадают запросы с равным ключом)
+            item: Запрос
+
+        Returns:
+            Результат обработки запроса (исключение пробрасывается)
+        """
+        loop = asyncio.get_running_loop()
+        future: "asyncio.Future[R]" = loop.create_future()
+
+        batch = self._pending.setdefault(key, [])
+        batch.append((item, future, time.perf_counter()))
+        if len(batch) >= self.max_size:
+            self._flush(key)
+        elif len(batch) == 1:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+
+        return await future
+
+    def _flush(self, key: Hashable) -> None:
+        """Отправка накопленного пакета обработчику"""
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, None)
+        if not batch:
+            return
+
+        now = time.perf_counter()
+        self._batches += 1
+        self._items += len(batch)
+        self._max_batch_size = max(self._max_batch_size, len(batch))
+        self._wait_time += sum(now - queued_at for _, _, queued_at in batch)
+
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[T, "asyncio.Future[R]", float]]) -> None:
+        try:
+            results = await self.handler([item for item, _, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+
+        for (_, future, _), result in zip(batch, results):
+            if future.done():  # вызывающий отменил ожидание
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Метрики пакетирования: число и размер пакетов, добавленная задержка"""
+        return {
+            "window": self.window,
+            "batches": self._batches,
+            "items": self._items,
+            "avg_batch_size": self._items / self._batches if self._batches else None,
+            "max_batch_size": self._max_batch_size,
+            "avg_wait_time": self._wait_time / self._items if self._items else None
+        }
@@ -0,0 +1,307 @@
+"""
+Сборка промптов генерации тем без повторного разбора шаблона
+
+Шаблон сообщения пользователя разбирается один раз в список фрагментов
+текста и имен переменных, системное сообщение создается один раз и
+передается во все промпты. Блоки контекста кафедры одинаковы для сотен
+студентов одной кафедры, поэтому они кэшируются по содержимому
+DepartmentContext, и сборка промпта сводится к соединению строк.
+
+Сообщения упорядочены от общего к частному: системное сообщение
+(одинаковое для всех запросов), контекст кафедры отдельным системным
+сообщением (одинаковое для всех студентов кафедры) и только затем
+запрос студента. Общее начало промпта провайдеры кэшируют: OpenAI -
+автоматически, Anthropic - до отметок cache_control, которые
+расставляет with_cache_control.
+"""
+
+from collections import OrderedDict
+from string import Formatter
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+
+
+TRENDS_TEXT = "Включи анализ современных трендов и направлений развития."
+METHODOLOGY_TEXT = "Включи описание методологии исследования."
+
+# Блоки контекста кафедры и системные сообщения с ними (с инструкцией о дубликатах и без нее)
+DepartmentEntry = Tuple[str, str, Optional[SystemMessage], Optional[SystemMessage]]
+
+
+def format_student_context(preferences) -> str:
+    """Форматирование контекста студента"""
+    if not preferences:
+        return ""
+
+    context_parts = []
+
+    if preferences.interests:
+        context_parts.append(f"Области интересов студента: {', '.join(preferences.interests)}")
+
+    if preferences.skills:
+        context_parts.append(f"Навыки студента: {', '.join(preferences.skills)}")
+
+    if preferences.career_goals:
+        context_parts.append(f"Карьерные цели: {', '.join(preferences.career_goals)}")
+
+    if preferences.preferred_technologies:
+        technologies = ', '.join(preferences.preferred_technologies)
+        context_parts.append(f"Предпочитаемые технологии: {technologies}")
+
+    if preferences.work_style:
+        context_parts.append(f"Стиль работы: {preferences.work_style}")
+
+    if preferences.complexity_preference:
+        context_parts.append(f"Предпочтение сложности: {preferences.complexity_preference}")
+
+    return "\n".join(context_parts) if context_parts else ""
+
+
+def format_department_context(context) -> str:
+    """Форматирование контекста кафедры"""
+    if not context:
+        return ""
+
+    context_parts = []
+
+    if context.research_directions:
+        directions = ', '.join(context.research_directions)
+        context_parts.append(f"Направления исследований кафедры: {directions}")
+
+    if context.available_resources:
+        context_parts.append(f"Доступные ресурсы: {', '.join(context.available_resources)}")
+
+    if context.supervisor_expertise:
+        expertise = ', '.join(context.supervisor_expertise)
+        context_parts.append(f"Экспертиза научных руководителей: {expertise}")
+
+    if context.recent_publications:
+        publications = ', '.join(context.recent_publications[:3])  # Ограничиваем количество
+        context_parts.append(f"Недавние публикации: {publications}")
+
+    return "\n".join(context_parts) if context_parts else ""
+
+
+def format_duplicate_avoidance(avoid_duplicates: bool, department_context) -> str:
+    """Форматирование инструкций по избежанию дублирования"""
+    if not avoid_duplicates or not department_context or not department_context.existing_topics:
+        return ""
+
+    # Ограничиваем количество
+    existing_topics_text = "\n".join(
+        [f"- {topic}" for topic in department_context.existing_topics[:10]]
+    )
+    return f"""
+ВАЖНО: Избегай дублирования с существующими темами на кафедре:
+{existing_topics_text}
+
+Генерируй только новые, уникальные темы, которые не пересекаются с перечисленными выше."""
+
+
+def format_personalization(preferences) -> str:
+    """Форматирование персонализации"""
+    if not preferences:
+        return ""
+
+    personalization_parts = []
+
+    if preferences.interests:
+        personalization_parts.append("учитывай интересы студента")
+
+    if preferences.skills:
+        personalization_parts.append("соответствуй навыкам студента")
+
+    if preferences.career_goals:
+        personalization_parts.append("способствуй достижению карьерных целей")
+
+    if personalization_parts:
+        return f"Персонализируй темы, чтобы они {', '.join(personalization_parts)}."
+
+    return ""
+
+
+def format_department_message(department_context_text: str, duplicate_avoidance_text: str) -> str:
+    """Текст системного сообщения с контекстом кафедры"""
+    blocks = [
+        text.strip()
+        for text in (department_context_text, duplicate_avoidance_text)
+        if text.strip()
+    ]
+    return "\n\n".join(blocks)
+
+
+def with_cache_control(prompt: List[BaseMessage]) -> List[BaseMessage]:
+    """
+    Промпт с отметками кэширования Anthropic
+
+    Anthropic принимает одно системное сообщение в начале промпта, поэтому
+    начальные системные сообщения объединяются в одно из нескольких блоков
+    текста. Каждый блок отмечается cache_control: кэшируется и общая
+    инструкция, и инструкция вместе с контекстом кафедры.
+
+    Args:
+        prompt: Сообщения промпта
+
+    Returns:
+        Новый список сообщений (prompt не меняется)
+    """
+    leading = 0
+    while leading < len(prompt) and isinstance(prompt[leading], SystemMessage):
+        leading += 1
+    if not leading:
+        return prompt
+    blocks = [
+        {"type": "text", "text": message.content, "cache_control": {"type": "ephemeral"}}
+        for message in prompt[:leading]
+        if isinstance(message.content, str) and message.content
+    ]
+    return [SystemMessage(content=blocks), *prompt[leading:]]
+
+
+def compile_template(template: str) -> List[Tuple[str, Optional[str]]]:
+    """
+    Разбор шаблона в формате str.format
+
+    Returns:
+        Пары (текст, имя переменной после него или None)
+
+    Raises:
+        ValueError: Если в шаблоне есть спецификации формата или преобразования
+    """
+    parts = []
+    for literal, name, format_spec, conversion in Formatter().parse(template):
+        if format_spec or conversion:
+            raise ValueError(
+                f"Переменная {name} шаблона задана с форматом - такие шаблоны не поддерживаются"
+            )
+        parts.append((literal, name))
+    return parts
+
+
+def _content_key(context) -> Tuple[Any, ...]:
+    """Содержимое модели в виде хешируемого кортежа"""
+    return tuple(
+        (name, tuple(value) if isinstance(value, list) else value)
+        for name, value in context
+    )
+
+
+class PromptRenderer:
+    """Сборка сообщений промпта по конфигурации генерации"""
+
+    def __init__(self, template: ChatPromptTemplate, cache_size: int = 1024):
+        """
+        Args:
+            template: Шаблон из системного сообщения и шаблона сообщения пользователя
+            cache_size: Сколько блоков контекста кафедр хранить
+        """
+        system_message, human_template = template.messages
+        self.system_message = system_message
+        self.cache_size = cache_size
+        self._parts = compile_template(human_template.prompt.template)
+        self._department_blocks: "OrderedDict[Tuple[Any, ...], DepartmentEntry]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def render(self, config) -> List[BaseMessage]:
+        """
+        Сообщения промпта для конфигурации
+
+        Returns:
+            Системное сообщение, сообщение с контекстом кафедры (если он
+            задан; один и тот же объект для одинакового контекста) и
+            сообщение пользователя без контекста кафедры
+        """
+        request = HumanMessage(content=self.render_request(config, department=False))
+        department_message = self.department_message(
+            config.department_context, config.avoid_duplicates
+        )
+        if department_message is None:
+            return [self.system_message, request]
+        return [self.system_message, department_message, request]
+
+    def render_request(self, config, department: bool = True) -> str:
+        """
+        Текст сообщения пользователя
+
+        Args:
+            config: Конфигурация генерации
+            department: Подставить контекст кафедры в текст (для пакетных
+                промптов, где у каждого запроса своя кафедра)
+        """
+        if department:
+            department_context_text, duplicate_avoidance_text = self.department_blocks(
+                config.department_context
+            )
+        else:
+            department_context_text = duplicate_avoidance_text = ""
+        preferences = config.student_preferences
+        values = {
+            "count": format(config.count),
+            "field": config.field,
+            "specialization_text": (
+                f"специализация: {config.specialization}" if config.specialization else ""
+            ),
+            "level": format(config.level),
+            "trends_text": TRENDS_TEXT if config.include_trends else "",
+            "methodology_text": METHODOLOGY_TEXT if config.include_methodology else "",
+            "student_context_text": format_student_context(preferences),
+            "department_context_text": department_context_text,
+            "duplicate_avoidance_text": duplicate_avoidance_text if config.avoid_duplicates else "",
+            "personalization_text": format_personalization(preferences),
+        }
+        chunks = []
+        for literal, name in self._parts:
+            chunks.append(literal)
+            if name is not None:
+                chunks.append(values[name])
+        return "".join(chunks)
+
+    def department_blocks(self, context) -> Tuple[str, str]:
+        """
+        Блоки контекста кафедры (кэшируются по содержимому)
+
+        Returns:
+            Контекст кафедры и инструкция не повторять существующие темы
+        """
+        return self._department_entry(context)[:2]
+
+    def department_message(self, context, avoid_duplicates: bool = True) -> Optional[SystemMessage]:
+        """Системное сообщение с контекстом кафедры (None, если контекст пуст)"""
+        entry = self._department_entry(context)
+        return entry[2] if avoid_duplicates else entry[3]
+
+    def _department_entry(self, context) -> DepartmentEntry:
+        if not context:
+            return "", "", None, None
+        key = _content_key(context)
+        entry = self._department_blocks.get(key)
+        if entry is not None:
+            self._hits += 1
+            self._department_blocks.move_to_end(key)
+            return entry
+
+        self._misses += 1
+        department_context_text = format_department_context(context)
+        duplicate_avoidance_text = format_duplicate_avoidance(True, context)
+        messages = []
+        for avoidance_text in (duplicate_avoidance_text, ""):
+            content = format_department_message(department_context_text, avoidance_text)
+            messages.append(SystemMessage(content=content) if content else None)
+        entry = (department_context_text, duplicate_avoidance_text, *messages)
+        self._department_blocks[key] = entry
+        if len(self._department_blocks) > self.cache_size:
+            self._department_blocks.popitem(last=False)
+        return entry
+
+    def metrics(self) -> Dict[str, Any]:
+        """Кэш блоков контекста кафедр"""
+        lookups = self._hits + self._misses
+        return {
+            "department_blocks": len(self._department_blocks),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_ratio": self._hits / lookups if lookups else 0.0
+        }
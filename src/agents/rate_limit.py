@@ -0,0 +1,206 @@
+"""
+Ограничение обращений к провайдерам языковых моделей
+
+Для каждого провайдера (префикс имени модели: openai, anthropic,
+openrouter) действует общий для всех агентов лимитер: максимум
+одновременных вызовов, запросов в минуту и токенов в минуту.
+Ожидающие вызовы обслуживаются в порядке поступления.
+"""
+
+import asyncio
+import time
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from ..config import settings
+
+
+def _percentile(samples: List[float], percent: int) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, len(ordered) * percent // 100)]
+
+
+class TokenBucket:
+    """Ведро токенов: rate_per_minute единиц в минуту, запас до capacity"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1) -> None:
+        """Ожидание, пока в ведре не наберется amount единиц, и их списание"""
+        amount = min(amount, self.capacity)
+        while True:
+            self._refill()
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return
+            await asyncio.sleep((amount - self._tokens) / self.rate)
+
+    def consume(self, amount: float) -> None:
+        """Списание без ожидания (баланс может стать отрицательным)"""
+        self._refill()
+        self._tokens -= amount
+
+
+class ProviderLimiter:
+    """Лимитер вызовов одного провайдера"""
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = 0,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0
+    ):
+        """
+        Args:
+            name: Провайдер (для метрик)
+            max_concurrency: Максимум одновременных вызовов (0 - без ограничения)
+            requests_per_minute: Запросов в минуту (0 - без ограничения)
+            tokens_per_minute: Токенов в минуту (0 - без ограничения)
+        """
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+
+        # asyncio.Lock пропускает ожидающих по очереди - порядок поступления сохраняется
+        self._queue_lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+
+        self._waiting = 0
+        self._in_flight = 0
+        self._calls = 0
+        self._throttled = 0
+        self._wait_times: Deque[float] = deque(maxlen=1000)
+
+    @asynccontextmanager
+    async def limit(self, estimated_tokens: int = 0) -> AsyncIterator["ProviderLimiter"]:
+        """
+        Ожидание разрешения на вызов и удержание слота на время вызова
+
+        Args:
+            estimated_tokens: Оценка токенов вызова (уточняется через record_tokens)
+        """
+        queued_at = time.perf_counter()
+        self._waiting += 1
+        try:
+            async with self._queue_lock:
+                if self._slots is not None:
+                    await self._slots.acquire()
+                try:
+                    if self._requests is not None:
+                        await self._requests.acquire(1)
+                    if self._tokens is not None and estimated_tokens:
+                        await self._tokens.acquire(estimated_tokens)
+                except BaseException:
+                    if self._slots is not None:
+                        self._slots.release()
+                    raise
+        finally:
+            self._waiting -= 1
+
+        wait_time = time.perf_counter() - queued_at
+        self._wait_times.append(wait_time)
+        self._calls += 1
+        if wait_time > 0.001:
+            self._throttled += 1
+
+        self._in_flight += 1
+        try:
+            yield self
+        finally:
+            self._in_flight -= 1
+            if self._slots is not None:
+                self._slots.release()
+
+    @property
+    def limits(self) -> Tuple[int, int, int]:
+        """(max_concurrency, requests_per_minute, tokens_per_minute)"""
+        return self.max_concurrency, self.requests_per_minute, self.tokens_per_minute
+
+    def record_tokens(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Поправка ведра токенов на фактический расход вызова"""
+        if self._tokens is not None:
+            self._tokens.consume(actual_tokens - estimated_tokens)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Метрики лимитера: очередь, вызовы, время ожидания"""
+        wait_times = list(self._wait_times)
+        return {
+            "max_concurrency": self.max_concurrency or None,
+            "requests_per_minute": self.requests_per_minute or None,
+            "tokens_per_minute": self.tokens_per_minute or None,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "calls": self._calls,
+            "throttled": self._throttled,
+            "wait_time_p50": _percentile(wait_times, 50),
+            "wait_time_p95": _percentile(wait_times, 95)
+        }
+
+
+# Примитивы asyncio привязаны к event loop - лимитеры хранятся отдельно для каждого
+_limiters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, ProviderLimiter]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_provider_limiter(model_name: str) -> ProviderLimiter:
+    """
+    Общий лимитер провайдера модели (вызывается внутри event loop)
+
+    Параметры берутся из настроек <provider>_max_concurrency,
+    <provider>_requests_per_minute и <provider>_tokens_per_minute.
+
+    Args:
+        model_name: Имя модели с префиксом провайдера ("openrouter:...")
+
+    Returns:
+        Лимитер провайдера (один на event loop)
+    """
+    provider = model_name.split(":", 1)[0]
+    limiters = _limiters.setdefault(asyncio.get_running_loop(), {})
+    limiter = limiters.get(provider)
+    if limiter is None:
+        limiter = limiters[provider] = ProviderLimiter(
+            provider,
+            getattr(settings, f"{provider}_max_concurrency", 0),
+            getattr(settings, f"{provider}_requests_per_minute", 0),
+            getattr(settings, f"{provider}_tokens_per_minute", 0)
+        )
+    return limiter
+
+
+def reset_provider_limiters() -> None:
+    """
+    Сброс лимитеров всех event loop (следующий вызов создаст их по текущим настройкам)
+
+    Лимитер с вызовами в полете заменять нельзя: новый не знает о занятых
+    слотах и израсходованных токенах. Поэтому настройки лимитов читаются
+    один раз, а сброс нужен только тестам, меняющим настройки.
+    """
+    _limiters.clear()
+
+
+def provider_limits_metrics() -> Dict[str, Dict[str, Any]]:
+    """Метрики лимитеров провайдеров, использованных в текущем event loop"""
+    try:
+        limiters = _limiters.get(asyncio.get_running_loop(), {})
+    except RuntimeError:  # вне event loop
+        return {}
+    return {provider: limiter.metrics() for provider, limiter in limiters.items()}
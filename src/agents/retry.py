@@ -0,0 +1,219 @@
+"""
+Повторы и хеджирование вызовов модели
+
+Временные ошибки (429, 5xx, таймауты, обрывы соединения) повторяются
+с экспоненциальной задержкой и случайным разбросом; заголовок
+Retry-After ответа провайдера имеет приоритет. При хеджировании, если
+ответ не пришел за p95 времени успешных вызовов, отправляется второй
+такой же запрос и берется тот, что завершится первым.
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+import anthropic
+import httpx
+import openai
+from loguru import logger
+
+
+T = TypeVar("T")
+
+TRANSIENT_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+
+_CONNECTION_ERRORS = (
+    asyncio.TimeoutError,
+    ConnectionError,
+    httpx.TransportError,
+    openai.APIConnectionError,
+    anthropic.APIConnectionError
+)
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Можно ли повторить вызов после этой ошибки"""
+    if isinstance(error, _CONNECTION_ERRORS):
+        return True
+    return _status_code(error) in TRANSIENT_STATUS_CODES
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """
+    Задержка из заголовков Retry-After / retry-after-ms ответа с ошибкой
+
+    Returns:
+        Секунды ожидания или None, если заголовка нет
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+
+    try:
+        if headers.get("retry-after-ms"):
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """Политика повторов: экспоненциальная задержка с полным разбросом"""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 20.0):
+        """
+        Args:
+            max_attempts: Всего попыток (1 - без повторов)
+            base_delay: Задержка перед первым повтором (секунды, до разброса)
+            max_delay: Максимальная задержка (секунды)
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, error: BaseException) -> float:
+        """
+        Задержка перед повтором
+
+        Args:
+            attempt: Номер неудавшейся попытки (с 1)
+            error: Ошибка попытки
+
+        Returns:
+            Retry-After провайдера (не больше max_delay) либо случайная
+            величина из [0, base_delay * 2^(attempt-1)]
+        """
+        server_delay = retry_after(error)
+        if server_delay is not None:
+            return min(server_delay, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class ResilientCaller:
+    """Выполнение вызовов модели с повторами и хеджированием"""
+
+    def __init__(
+        self,
+        retry_policy: RetryPolicy,
+        hedging: bool = False,
+        hedge_min_samples: int = 20,
+        latency_window: int = 200
+    ):
+        """
+        Args:
+            retry_policy: Политика повторов
+            hedging: Отправлять второй запрос, если первый дольше p95
+            hedge_min_samples: Сколько успешных вызовов нужно для оценки p95
+            latency_window: Сколько последних времен вызова учитывать
+        """
+        self.retry_policy = retry_policy
+        self.hedging = hedging
+        self.hedge_min_samples = hedge_min_samples
+
+        self._latencies: Deque[float] = deque(maxlen=latency_window)
+        self._retries = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+        self._failures = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        """p95 времени успешных вызовов или None, если хеджирование не применяется"""
+        if not self.hedging or len(self._latencies) < self.hedge_min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, len(ordered) * 95 // 100)]
+
+    async def call(self, operation: Callable[[], Awaitable[T]], hedge: bool = True) -> T:
+        """
+        Вызов с повторами временных ошибок
+
+        Args:
+            operation: Фабрика корутины одного запроса к модели
+            hedge: Разрешить повторный запрос при долгом ответе (False -
+                результат держит ресурсы, например открытый поток)
+
+        Returns:
+            Результат первой успешной попытки
+        """
+        attempt = 1
+        while True:
+            try:
+                return await self._attempt(operation, hedge)
+            except Exception as e:
+                if attempt >= self.retry_policy.max_attempts or not is_transient_error(e):
+                    self._failures += 1
+                    raise
+                delay = self.retry_policy.delay(attempt, e)
+                logger.warning(
+                    f"Временная ошибка модели ({e.__class__.__name__}), "
+                    f"повтор {attempt}/{self.retry_policy.max_attempts - 1} через {delay:.2f}с"
+                )
+                self._retries += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def _attempt(self, operation: Callable[[], Awaitable[T]], hedge: bool = True) -> T:
+        hedge_delay = self.hedge_delay() if hedge else None
+        start_time = time.perf_counter()
+
+        primary = asyncio.ensure_future(operation())
+        if hedge_delay is None:
+            result = await primary
+            # Время открытия потока не оценивает время ответа для хеджирования
+            if hedge:
+                self._latencies.append(time.perf_counter() - start_time)
+            return result
+
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done:
+                self._hedges += 1
+                logger.info(
+                    f"Ответ модели дольше p95 ({hedge_delay:.2f}с), отправлен повторный запрос"
+                )
+                tasks.add(asyncio.ensure_future(operation()))
+
+            while True:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                finished = next(iter(done))
+                tasks.discard(finished)
+                # Ошибка одного из запросов не важна, пока второй еще выполняется
+                if finished.exception() is None or not tasks:
+                    break
+
+            result = finished.result()
+            if finished is not primary:
+                self._hedge_wins += 1
+            self._latencies.append(time.perf_counter() - start_time)
+            return result
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Метрики повторов и хеджирования"""
+        return {
+            "retries": self._retries,
+            "failures": self._failures,
+            "hedging": self.hedging,
+            "hedge_delay": self.hedge_delay(),
+            "hedges": self._hedges,
+            "hedge_wins": self._hedge_wins
+        }
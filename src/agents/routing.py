@@ -0,0 +1,124 @@
+"""
+Выбор модели из цепочки по задержке и доле ошибок
+
+Для каждой модели поддерживаются скользящие средние (EWMA) времени
+ответа и доли ошибок. Запрос направляется самой быстрой исправной
+модели; при ошибке - следующей по порядку. Модель с долей ошибок выше
+порога считается неисправной до истечения паузы после последней ошибки.
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class ModelHealth:
+    """Состояние модели в цепочке"""
+    latency: Optional[float] = None  # EWMA времени успешного ответа (секунды)
+    error_rate: float = 0.0  # EWMA доли ошибок
+    calls: int = 0
+    failures: int = 0
+    routed: int = 0  # сколько раз модель выбрана первой
+    failovers: int = 0  # сколько раз запрос ушел с модели на следующую
+    last_failure_at: Optional[float] = None
+
+
+class ModelRouter:
+    """Маршрутизация запросов между моделями цепочки"""
+
+    def __init__(
+        self,
+        models: List[str],
+        alpha: float = 0.2,
+        max_error_rate: float = 0.5,
+        cooldown: float = 30.0
+    ):
+        """
+        Args:
+            models: Модели в порядке предпочтения (при равных условиях)
+            alpha: Вес нового наблюдения в скользящих средних
+            max_error_rate: Доля ошибок, выше которой модель неисправна
+            cooldown: Через сколько секунд после ошибки неисправная модель пробуется снова
+        """
+        self.models = list(models)
+        self.alpha = alpha
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self._health: Dict[str, ModelHealth] = {model: ModelHealth() for model in self.models}
+
+    def is_healthy(self, model: str) -> bool:
+        """Исправна ли модель (или истекла пауза после ошибки)"""
+        health = self._health[model]
+        if health.error_rate <= self.max_error_rate:
+            return True
+        return (
+            health.last_failure_at is not None
+            and time.monotonic() - health.last_failure_at >= self.cooldown
+        )
+
+    def order(self) -> List[str]:
+        """
+        Порядок попыток для очередного запроса
+
+        Исправные модели - по возрастанию средней задержки (еще не
+        вызывавшаяся модель идет первой, чтобы получить оценку; модель без
+        успешных ответов - последней), затем неисправные - по возрастанию
+        доли ошибок.
+        """
+        def latency(model: str) -> float:
+            health = self._health[model]
+            if health.latency is not None:
+                return health.latency
+            return 0.0 if health.calls == 0 else float("inf")
+
+        healthy = [model for model in self.models if self.is_healthy(model)]
+        unhealthy = [model for model in self.models if not self.is_healthy(model)]
+        healthy.sort(key=latency)
+        unhealthy.sort(key=lambda model: self._health[model].error_rate)
+        return healthy + unhealthy
+
+    def _update(self, current: Optional[float], value: float) -> float:
+        return value if current is None else current + self.alpha * (value - current)
+
+    def record_success(self, model: str, latency: float) -> None:
+        """Учет успешного ответа модели"""
+        health = self._health[model]
+        health.calls += 1
+        health.latency = self._update(health.latency, latency)
+        health.error_rate = self._update(health.error_rate, 0.0)
+
+    def record_failure(self, model: str, failover: bool) -> None:
+        """
+        Учет ошибки модели
+
+        Args:
+            model: Модель
+            failover: Запрос передан следующей модели цепочки
+        """
+        health = self._health[model]
+        health.calls += 1
+        health.failures += 1
+        health.error_rate = self._update(health.error_rate, 1.0)
+        health.last_failure_at = time.monotonic()
+        if failover:
+            health.failovers += 1
+
+    def record_route(self, model: str) -> None:
+        """Учет выбора модели первой для запроса"""
+        self._health[model].routed += 1
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Состояние моделей цепочки"""
+        return {
+            model: {
+                "healthy": self.is_healthy(model),
+                "latency_ewma": health.latency,
+                "error_rate_ewma": health.error_rate,
+                "calls": health.calls,
+                "failures": health.failures,
+                "routed": health.routed,
+                "failovers": health.failovers
+            }
+            for model, health in self._health.items()
+        }
@@ -0,0 +1,295 @@
+"""
+Инкрементальный разбор потокового ответа модели
+
+Ответ модели имеет вид {"topics": [{...}, {...}]}, возможно, внутри
+блока ```json и с пояснениями вокруг. Парсер получает текст частями и
+возвращает каждую тему, как только закрывается ее объект, не дожидаясь
+конца ответа. Текст вне массива topics (включая фигурные скобки в
+пояснениях) не разбирается.
+
+Типичные ошибки модели исправляются: висячие запятые перед } и ],
+оборванный на середине ответ (последний объект закрывается без
+недописанного поля). Каждый символ просматривается один раз, а в
+буфере хранится только текущий незакрытый объект, поэтому время
+разбора линейно по длине ответа.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+
+# Символы, меняющие состояние разбора вне строки и внутри строки
+_STRUCTURAL = re.compile(r'["{}\[\]]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+_TOPICS_ARRAY = re.compile(r'"topics"\s*:\s*\[')
+_TOPICS_KEY_TAIL = re.compile(r'"topics"\s*:?\s*$')
+_TOPICS_KEY = '"topics"'
+
+
+def _close_brackets(text: str, stack: List[str]) -> str:
+    """Закрытие открытых скобок (висячая запятая в конце удаляется)"""
+    text = text.rstrip()
+    if text.endswith(","):
+        text = text[:-1]
+    return text + "".join("}" if bracket == "{" else "]" for bracket in reversed(stack))
+
+
+def repair_json(text: str) -> str:
+    """
+    Исправление типичных ошибок JSON в ответе модели
+
+    Удаляются висячие запятые перед } и ]. Если текст оборван,
+    открытые скобки закрываются; недописанные строка или пара
+    "ключ: значение" отбрасываются до предыдущей запятой.
+
+    Args:
+        text: JSON-текст (без пояснений вокруг)
+
+    Returns:
+        Исправленный текст; если исправить не удалось - текст без висячих запятых
+    """
+    output: List[str] = []
+    stack: List[str] = []
+    last_comma: Optional[Tuple[int, Tuple[str, ...]]] = None
+    in_string = False
+    escaped = False
+
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append(char)
+        elif char in "}]":
+            # Висячая запятая перед закрывающей скобкой
+            while output and output[-1].isspace():
+                output.pop()
+            if output and output[-1] == ",":
+                output.pop()
+            if stack:
+                stack.pop()
+        elif char == ",":
+            last_comma = (len(output), tuple(stack))
+        output.append(char)
+
+    repaired = "".join(output)
+    if not stack:
+        return repaired
+
+    # Ответ оборван: сначала закрываем как есть (если оборван не внутри строки)
+    candidates = [] if in_string else [_close_brackets(repaired, stack)]
+    if last_comma is not None:
+        position, comma_stack = last_comma
+        candidates.append(_close_brackets(repaired[:position], list(comma_stack)))
+
+    for candidate in candidates:
+        try:
+            json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        return candidate
+    return repaired
+
+
+def loads_tolerant(text: str) -> Any:
+    """
+    json.loads с исправлением типичных ошибок модели
+
+    Raises:
+        json.JSONDecodeError: Если текст не удалось исправить
+    """
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return json.loads(repair_json(text))
+
+
+class IncrementalTopicParser:
+    """Потоковый парсер массива topics"""
+
+    def __init__(self):
+        self._chunks: List[str] = []
+        self._pending = ""          # еще нужная часть текста (текущий объект темы)
+        self._position = 0          # следующий непросмотренный символ в _pending
+        self._in_topics = False     # внутри массива topics
+        self._done = False          # массив topics закрыт
+        self._depth = 0             # глубина вложенности внутри массива
+        self._object_start = -1     # начало текущего объекта темы в _pending
+        self._in_string = False
+        self._escaped = False
+        self.found_topics = False   # в массиве topics встречен объект темы
+        self.topics_emitted = 0
+        self.repaired = 0           # объекты, исправленные перед разбором
+        self.truncated = False      # ответ оборван внутри массива topics
+
+    @property
+    def text(self) -> str:
+        """Весь полученный текст"""
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """
+        Добавление части ответа
+
+        Args:
+            chunk: Очередной фрагмент текста модели
+
+        Returns:
+            Темы, объекты которых закрылись в этом фрагменте
+        """
+        if not chunk:
+            return []
+        self._chunks.append(chunk)
+        if self._done:
+            return []
+
+        self._pending += chunk
+        if not self._in_topics and not self._find_topics_array():
+            return []
+
+        completed = self._scan()
+        self._compact()
+        self.topics_emitted += len(completed)
+        return completed
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """
+        Завершение разбора после окончания ответа
+
+        Returns:
+            Последняя тема оборванного ответа, если ее удалось восстановить
+        """
+        if not self._in_topics:
+            return []
+
+        self.truncated = True
+        if self._object_start < 0:
+            self._in_topics = False
+            self._done = True
+            return []
+
+        topic = self._decode(self._pending[self._object_start:])
+        self._in_topics = False
+        self._done = True
+        self._object_start = -1
+        if topic is None or not topic.get("title"):
+            return []
+        self.topics_emitted += 1
+        return [topic]
+
+    def _scan(self) -> List[Dict[str, Any]]:
+        """Просмотр новых символов массива topics"""
+        completed = []
+        buffer = self._pending
+        position = self._position
+        length = len(buffer)
+
+        while position < length:
+            if self._in_string:
+                if self._escaped:
+                    # Экранированный символ на границе фрагментов
+                    self._escaped = False
+                    position += 1
+                    continue
+                match = _STRING_SPECIAL.search(buffer, position)
+                if match is None:
+                    position = length
+                    break
+                position = match.end()
+                if match.group() == "\\":
+                    self._escaped = True
+                else:
+                    self._in_string = False
+                continue
+
+            match = _STRUCTURAL.search(buffer, position)
+            if match is None:
+                position = length
+                break
+            char = match.group()
+            index = match.start()
+            position = index + 1
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 0 and char == "{":
+                    self._object_start = index
+                    self.found_topics = True
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 0 and char == "}" and self._object_start >= 0:
+                    topic = self._decode(buffer[self._object_start:position])
+                    if topic is not None:
+                        completed.append(topic)
+                    self._object_start = -1
+                elif self._depth < 0:
+                    self._in_topics = False
+                    self._depth = 0
+                    if self.found_topics:
+                        # Массив topics закрыт, остальной текст не разбирается
+                        self._done = True
+                        break
+                    # Пустой "массив" вроде [...] в пояснении: ищем следующий
+                    self._pending = buffer[position:]
+                    self._position = 0
+                    if not self._find_topics_array():
+                        return completed
+                    buffer = self._pending
+                    position = 0
+                    length = len(buffer)
+
+        self._position = position
+        return completed
+
+    def _compact(self) -> None:
+        """Удаление уже разобранного текста из буфера"""
+        if self._done:
+            self._pending = ""
+            self._position = 0
+            return
+        start = self._object_start if self._object_start >= 0 else self._position
+        if start > 0:
+            self._pending = self._pending[start:]
+            self._position -= start
+            if self._object_start >= 0:
+                self._object_start = 0
+
+    def _find_topics_array(self) -> bool:
+        """Поиск начала массива topics в накопленном тексте"""
+        match = _TOPICS_ARRAY.search(self._pending)
+        if match is None:
+            # Оставляем только хвост, в котором может начинаться ключ "topics"
+            tail = _TOPICS_KEY_TAIL.search(self._pending)
+            keep = len(self._pending) - tail.start() if tail else len(_TOPICS_KEY) - 1
+            self._pending = self._pending[-keep:]
+            return False
+
+        self._in_topics = True
+        self._pending = self._pending[match.end():]
+        self._position = 0
+        return True
+
+    def _decode(self, raw_object: str) -> Optional[Dict[str, Any]]:
+        try:
+            topic = json.loads(raw_object)
+        except json.JSONDecodeError:
+            try:
+                topic = json.loads(repair_json(raw_object))
+            except json.JSONDecodeError as e:
+                logger.warning(f"Пропущен некорректный объект темы в потоке: {e}")
+                return None
+            self.repaired += 1
+        return topic if isinstance(topic, dict) else None
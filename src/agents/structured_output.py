@@ -0,0 +1,55 @@
+"""
+Схема структурированного ответа модели и учет ошибок разбора
+
+GeneratedTopics передается в with_structured_output: модель возвращает
+темы вызовом инструмента (или по JSON-схеме), и ответ проверяется
+pydantic без разбора текста. ParseStats считает для каждой модели,
+сколько ответов не удалось разобрать.
+"""
+
+from typing import Any, Dict, List
+
+from pydantic import BaseModel, Field
+
+
+class GeneratedTopic(BaseModel):
+    """Тема ВКР в ответе модели (поля VKRTopic, которые заполняет модель)"""
+    title: str = Field(..., description="Название темы")
+    description: str = Field("", description="Краткое описание актуальности")
+    keywords: List[str] = Field(default_factory=list, description="Ключевые слова")
+    methodology: str = Field("", description="Предполагаемые методы исследования")
+    expected_results: str = Field("", description="Ожидаемые результаты")
+    difficulty: str = Field("Средняя", description="Сложность: Легкая, Средняя или Сложная")
+
+
+class GeneratedTopics(BaseModel):
+    """Темы ВКР, сгенерированные по запросу"""
+    topics: List[GeneratedTopic] = Field(..., description="Список тем")
+
+
+class ParseStats:
+    """Счетчики разбора ответов по моделям"""
+
+    def __init__(self):
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def record(self, model: str, failed: bool = False, repaired: bool = False) -> None:
+        """
+        Учет разобранного ответа
+
+        Args:
+            model: Ответившая модель
+            failed: Ответ не соответствует формату (применен запасной разбор)
+            repaired: JSON ответа пришлось исправлять
+        """
+        stats = self._stats.setdefault(model, {"responses": 0, "failures": 0, "repaired": 0})
+        stats["responses"] += 1
+        stats["failures"] += int(failed)
+        stats["repaired"] += int(repaired)
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Ответы, ошибки разбора и их доля для каждой модели"""
+        return {
+            model: {**stats, "failure_rate": stats["failures"] / stats["responses"]}
+            for model, stats in self._stats.items()
+        }
@@ -3,17 +3,32 @@
 """
 
 import asyncio
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+import hashlib
+import json
+import re
+import time
+from contextlib import AsyncExitStack
+from enum import Enum
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple, Union
+from dataclasses import dataclass, fields
 from loguru import logger
 
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
-from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate
 
 from ..config import settings
+from ..cache.single_flight import SingleFlight
 from ..models.topic_models import VKRTopic, TopicRequest, TopicResponse, StudentPreferences, DepartmentContext
+from .prompts import PromptRenderer, with_cache_control
+from .streaming_parser import IncrementalTopicParser
+from .structured_output import GeneratedTopics, ParseStats
+from .packing import MicroBatcher
+from .rate_limit import get_provider_limiter, provider_limits_metrics
+from .retry import ResilientCaller, RetryPolicy
+from .routing import ModelRouter
+from .http_client import connection_stats, get_http_client
 
 
 @dataclass
@@ -31,48 +46,168 @@ class TopicGenerationConfig:
     student_preferences: Optional[StudentPreferences] = None
     department_context: Optional[DepartmentContext] = None
     avoid_duplicates: bool = True
+    
+    def fingerprint(self, model_name: str) -> str:
+        """
+        Отпечаток конфигурации для кэширования ответов
+        
+        Одинаковые по содержанию конфигурации (независимо от порядка полей
+        и способа задания уровня) дают одинаковый отпечаток.
+        
+        Args:
+            model_name: Модель, которая будет генерировать темы
+            
+        Returns:
+            SHA-256 канонического JSON конфигурации и имени модели
+        """
+        def canonical(value: Any) -> Any:
+            if hasattr(value, "dict"):
+                return canonical(value.dict())
+            if isinstance(value, Enum):
+                return value.value
+            if isinstance(value, dict):
+                return {key: canonical(item) for key, item in value.items()}
+            if isinstance(value, (list, tuple)):
+                return [canonical(item) for item in value]
+            return value
+        
+        payload = {field.name: canonical(getattr(self, field.name)) for field in fields(self)}
+        payload["model"] = model_name
+        canonical_json = json.dumps(
+            payload, ensure_ascii=False, sort_keys=True, separators=(",", ":")
+        )
+        return hashlib.sha256(canonical_json.encode("utf-8")).hexdigest()
 
 
 class VKRTopicAgent:
     """Агент для генерации тем ВКР"""
     
-    def __init__(self, model_name: Optional[str] = None):
+    def __init__(self, model_name: Optional[str] = None, models: Optional[List[str]] = None):
         """
         Инициализация агента
         
         Args:
             model_name: Название модели для использования
+            models: Цепочка моделей для маршрутизации (вместо model_name);
+                без обоих параметров - default_model и fallback_models из настроек
         """
-        self.model_name = model_name or settings.default_model
-        self.llm = self._initialize_llm()
+        if models:
+            self.models = list(models)
+        elif model_name:
+            self.models = [model_name]
+        else:
+            self.models = [settings.default_model, *settings.fallback_models]
+        self.model_name = self.models[0]
+        self._llms = {model: self._initialize_llm(model) for model in self.models}
+        self._structured_llms: Dict[str, Any] = {}
+        self.structured_output = settings.structured_output
         self.prompt_template = self._create_prompt_template()
+        # Шаблон разбирается один раз, блоки контекста кафедр кэшируются
+        self._prompts = PromptRenderer(self.prompt_template)
+        
+        # Одновременные одинаковые запросы ждут один вызов модели
+        self._generations: SingleFlight[List[VKRTopic]] = SingleFlight()
+        
+        # Небольшие запросы, пришедшие в одном окне, упаковываются в один вызов модели
+        self._packer: Optional[MicroBatcher[TopicGenerationConfig, List[VKRTopic]]] = None
+        if settings.micro_batch_window > 0:
+            self._packer = MicroBatcher(
+                self._generate_packed,
+                window=settings.micro_batch_window,
+                max_size=settings.micro_batch_max_size
+            )
+        
+        # Повторы временных ошибок и хеджирование медленных вызовов (для каждой модели)
+        self._callers = {
+            model: ResilientCaller(
+                RetryPolicy(
+                    max_attempts=settings.llm_max_attempts,
+                    base_delay=settings.llm_retry_base_delay,
+                    max_delay=settings.llm_retry_max_delay
+                ),
+                hedging=settings.llm_hedging,
+                hedge_min_samples=settings.llm_hedge_min_samples
+            )
+            for model in self.models
+        }
+        
+        # Выбор самой быстрой исправной модели цепочки
+        self._router = ModelRouter(
+            self.models,
+            alpha=settings.routing_ewma_alpha,
+            max_error_rate=settings.routing_max_error_rate,
+            cooldown=settings.routing_cooldown
+        )
+        
+        # Расход модели: вызовы, символы промптов, токены (если модель их сообщает)
+        self._usage = {
+            "llm_calls": 0,
+            "prompt_chars": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            # Входные токены, прочитанные из кэша префиксов провайдера и записанные в него
+            "cache_read_tokens": 0,
+            "cache_creation_tokens": 0
+        }
+        self._parse_stats = ParseStats()
+        
+    @property
+    def llm(self):
+        """Клиент основной (первой в цепочке) модели"""
+        return self._llms[self.model_name]
+    
+    @llm.setter
+    def llm(self, value) -> None:
+        self._llms[self.model_name] = value
+        self._structured_llms.pop(self.model_name, None)
+    
+    def _structured_llm(self, model: str):
+        """Клиент модели, возвращающий темы по схеме GeneratedTopics"""
+        if model not in self._structured_llms:
+            self._structured_llms[model] = self._llms[model].with_structured_output(
+                GeneratedTopics, method=settings.structured_output_method, include_raw=True
+            )
+        return self._structured_llms[model]
+    
+    def _initialize_llm(self, model_name: Optional[str] = None):
+        """
+        Инициализация языковой модели
         
-    def _initialize_llm(self):
-        """Инициализация языковой модели"""
-        if self.model_name.startswith("openai:"):
-            model = self.model_name.split(":", 1)[1]
+        Повторы клиента отключены - их выполняет ResilientCaller.
+        OpenAI-совместимые клиенты используют общий пул соединений
+        (get_http_client); langchain-anthropic сам разделяет один
+        HTTP-клиент между экземплярами ChatAnthropic.
+        """
+        model_name = model_name or self.model_name
+        if model_name.startswith("openai:"):
+            model = model_name.split(":", 1)[1]
             return ChatOpenAI(
                 model=model,
                 api_key=settings.openai_api_key,
-                temperature=0.7
+                temperature=0.7,
+                max_retries=0,
+                http_async_client=get_http_client()
             )
-        elif self.model_name.startswith("anthropic:"):
-            model = self.model_name.split(":", 1)[1]
+        elif model_name.startswith("anthropic:"):
+            model = model_name.split(":", 1)[1]
             return ChatAnthropic(
                 model=model,
                 api_key=settings.anthropic_api_key,
-                temperature=0.7
+                temperature=0.7,
+                max_retries=0
             )
-        elif self.model_name.startswith("openrouter:"):
-            model = self.model_name.split(":", 1)[1]
+        elif model_name.startswith("openrouter:"):
+            model = model_name.split(":", 1)[1]
             return ChatOpenAI(
                 model=model,
                 api_key=settings.openrouter_api_key,
                 base_url="https://openrouter.ai/api/v1",
-                temperature=0.7
+                temperature=0.7,
+                max_retries=0,
+                http_async_client=get_http_client()
             )
         else:
-            raise ValueError(f"Неподдерживаемая модель: {self.model_name}")
+            raise ValueError(f"Неподдерживаемая модель: {model_name}")
     
     def _create_prompt_template(self) -> ChatPromptTemplate:
         """Создание шаблона промпта для генерации тем"""
@@ -105,7 +240,10 @@ class VKRTopicAgent:
 ```
 
 Генерируй темы на русском языке, если не указано иное. ОБЯЗАТЕЛЬНО возвращай только валидный JSON без дополнительного текста."""),
-            HumanMessage(content="""Сгенерируй {count} тем ВКР по направлению "{field}" 
+            # Переменные подставляются только в шаблон
+            # (системное сообщение содержит фигурные скобки JSON)
+            HumanMessagePromptTemplate.from_template(
+                """Сгенерируй {count} тем ВКР по направлению "{field}" 
             {specialization_text} для уровня "{level}".
             
             {trends_text}
@@ -119,53 +257,55 @@ class VKRTopicAgent:
             - Соответствуют уровню образования
             - Имеют практическую значимость
             - Могут быть исследованы в рамках учебного процесса
-            {personalization_text}""")
+            {personalization_text}"""
+            )
         ])
     
     async def generate_topics(self, config: TopicGenerationConfig) -> List[VKRTopic]:
         """
         Генерация тем ВКР
         
+        Одновременные вызовы с одинаковой конфигурацией объединяются
+        в один запрос к модели; каждый вызывающий получает свои копии тем.
+        
         Args:
             config: Конфигурация генерации
             
         Returns:
             Список сгенерированных тем
         """
+        topics = await self._generations.run(
+            config.fingerprint(self.model_name),
+            lambda: self._generate_topics(config)
+        )
+        return [topic.copy(deep=True) for topic in topics]
+    
+    async def _generate_topics(self, config: TopicGenerationConfig) -> List[VKRTopic]:
+        # Схема структурированного вывода описывает ответ на один запрос -
+        # такие запросы не упаковываются
+        if (self._packer is not None and not self.structured_output
+                and config.count <= settings.micro_batch_max_count):
+            return await self._packer.submit((self.model_name, config.language), config)
+        return await self._generate_single(config)
+    
+    async def _generate_single(self, config: TopicGenerationConfig) -> List[VKRTopic]:
+        """Генерация тем отдельным вызовом модели"""
         try:
             logger.info(f"Генерация {config.count} тем для {config.field}")
             
-            # Подготовка параметров промпта
-            specialization_text = f"специализация: {config.specialization}" if config.specialization else ""
-            trends_text = "Включи анализ современных трендов и направлений развития." if config.include_trends else ""
-            methodology_text = "Включи описание методологии исследования." if config.include_methodology else ""
-            
-            # Контекстная информация
-            student_context_text = self._format_student_context(config.student_preferences) if hasattr(config, 'student_preferences') and config.student_preferences else ""
-            department_context_text = self._format_department_context(config.department_context) if hasattr(config, 'department_context') and config.department_context else ""
-            duplicate_avoidance_text = self._format_duplicate_avoidance(config.avoid_duplicates, config.department_context) if hasattr(config, 'avoid_duplicates') and config.avoid_duplicates else ""
-            personalization_text = self._format_personalization(config.student_preferences) if hasattr(config, 'student_preferences') and config.student_preferences else ""
-            
-            # Формирование промпта
-            prompt = self.prompt_template.format_messages(
-                count=config.count,
-                field=config.field,
-                specialization_text=specialization_text,
-                level=config.level,
-                trends_text=trends_text,
-                methodology_text=methodology_text,
-                student_context_text=student_context_text,
-                department_context_text=department_context_text,
-                duplicate_avoidance_text=duplicate_avoidance_text,
-                personalization_text=personalization_text
-            )
+            prompt = self._build_prompt(config)
             
             # Генерация ответа
-            response = await self.llm.ainvoke(prompt)
+            response, model = await self._invoke(prompt, structured=self.structured_output)
             
             # Парсинг ответа
-            logger.info(f"Ответ модели: {response.content[:200]}...")
-            topics = self._parse_response(response.content, config)
+            if self.structured_output:
+                topics = self._parse_structured_response(response, config, model)
+            else:
+                logger.info(f"Ответ модели {model}: {response.content[:200]}...")
+                topics = self._parse_response(response.content, config, model)
+            for topic in topics:
+                topic.model_used = model
             
             logger.info(f"Успешно сгенерировано {len(topics)} тем")
             return topics
@@ -174,41 +314,419 @@ class VKRTopicAgent:
             logger.error(f"Ошибка при генерации тем: {e}")
             raise
     
-    def _parse_response(self, response: str, config: TopicGenerationConfig) -> List[VKRTopic]:
-        """Парсинг ответа модели в структурированные темы"""
-        topics = []
+    async def _generate_packed(
+        self, configs: List[TopicGenerationConfig]
+    ) -> List[Union[List[VKRTopic], Exception]]:
+        """
+        Генерация тем для пакета запросов одним вызовом модели
         
-        try:
-            # Сначала пробуем парсить JSON
-            import json
+        Системный промпт передается один раз, запросы - помеченными
+        разделами. Запросы, раздел которых модель не вернула, выполняются
+        отдельными вызовами.
+        
+        Args:
+            configs: Конфигурации запросов пакета
             
-            # Ищем JSON в ответе
-            start_idx = response.find('{')
-            end_idx = response.rfind('}') + 1
+        Returns:
+            Темы (или исключение) для каждого запроса в порядке configs
+        """
+        if len(configs) == 1:
+            return [await self._generate_single(configs[0])]
+        
+        try:
+            logger.info(f"Пакетная генерация: {len(configs)} запросов одним вызовом модели")
+            response, model = await self._invoke(self._build_packed_prompt(configs))
+            results: List[Any]
+            results, json_sections = self._parse_packed_response(response.content, configs)
+            for topics in results:
+                for topic in topics:
+                    topic.model_used = model
+        except Exception as e:
+            logger.error(f"Ошибка при пакетной генерации тем: {e}")
+            raise
+        
+        missing = [index for index, topics in enumerate(results) if not topics]
+        # Один ответ модели - одна запись разбора, сколько бы запросов в нем ни было
+        self._parse_stats.record(model, failed=not json_sections or bool(missing))
+        if missing:
+            logger.warning(
+                f"Модель не вернула темы для {len(missing)} из {len(configs)} запросов пакета"
+            )
+            retried = await asyncio.gather(
+                *[self._generate_single(configs[index]) for index in missing],
+                return_exceptions=True
+            )
+            for index, topics in zip(missing, retried):
+                results[index] = topics
+        
+        return results
+    
+    async def stream_topics(self, config: TopicGenerationConfig) -> AsyncIterator[VKRTopic]:
+        """
+        Потоковая генерация тем ВКР
+        
+        Темы выдаются по мере того, как модель закрывает их JSON-объекты
+        (структурированный вывод здесь не применяется). Если ответ не
+        содержит массива topics, после окончания потока применяется
+        обычный разбор ответа. Переход на следующую модель цепочки
+        возможен, только пока не выдано ни одной темы.
+        
+        Args:
+            config: Конфигурация генерации
             
-            if start_idx != -1 and end_idx > start_idx:
-                json_str = response[start_idx:end_idx]
-                data = json.loads(json_str)
-                
-                # Парсим темы из JSON
-                for topic_data in data.get('topics', []):
-                    topic = VKRTopic(
-                        title=topic_data.get('title', ''),
-                        field=config.field,
-                        specialization=config.specialization,
-                        level=config.level,
-                        description=topic_data.get('description', ''),
-                        keywords=topic_data.get('keywords', []),
-                        methodology=topic_data.get('methodology', ''),
-                        expected_results=topic_data.get('expected_results', ''),
-                        difficulty_level=topic_data.get('difficulty', 'Средняя')
+        Yields:
+            Сгенерированные темы
+        """
+        logger.info(f"Потоковая генерация {config.count} тем для {config.field}")
+        
+        parser = IncrementalTopicParser()
+        emitted = 0
+        
+        prompt = self._build_prompt(config)
+        order = self._router.order()
+        self._router.record_route(order[0])
+        
+        try:
+            for position, model in enumerate(order):
+                start_time = time.perf_counter()
+                try:
+                    # Ошибки до первой части ответа (429, 5xx) повторяются как у обычных вызовов
+                    slot, stream, first_chunk = await self._callers[model].call(
+                        lambda model=model: self._open_stream(prompt, model), hedge=False
                     )
-                    topics.append(topic)
+                    self._usage["llm_calls"] += 1
+                    self._usage["prompt_chars"] += sum(len(message.content) for message in prompt)
+                    try:
+                        chunk = first_chunk
+                        while chunk is not None:
+                            self._record_usage(getattr(chunk, "usage_metadata", None))
+                            content = chunk.content if isinstance(chunk.content, str) else ""
+                            for topic_data in parser.feed(content):
+                                if emitted < config.count:
+                                    emitted += 1
+                                    topic = self._topic_from_data(topic_data, config)
+                                    topic.model_used = model
+                                    yield topic
+                            chunk = await anext(stream, None)
+                    finally:
+                        await slot.aclose()
+                except Exception as e:
+                    failover = emitted == 0 and position < len(order) - 1
+                    self._router.record_failure(model, failover)
+                    if not failover:
+                        raise
+                    logger.warning(
+                        f"Модель {model} недоступна ({e}), поток передан {order[position + 1]}"
+                    )
+                    parser = IncrementalTopicParser()
+                    continue
                 
-                return topics[:config.count]
+                self._router.record_success(model, time.perf_counter() - start_time)
+                break
+            
+            for topic_data in parser.finish():
+                if emitted < config.count:
+                    emitted += 1
+                    topic = self._topic_from_data(topic_data, config)
+                    topic.model_used = model
+                    yield topic
+            
+            if parser.topics_emitted == 0:
+                for topic in self._parse_response(parser.text, config, model):
+                    topic.model_used = model
+                    emitted += 1
+                    yield topic
+            else:
+                self._parse_stats.record(model, repaired=bool(parser.repaired or parser.truncated))
+            
+            logger.info(f"Успешно сгенерировано {emitted} тем (поток)")
+            
+        except Exception as e:
+            logger.error(f"Ошибка при потоковой генерации тем: {e}")
+            raise
+    
+    async def _open_stream(
+        self, prompt: List[BaseMessage], model: str
+    ) -> Tuple[AsyncExitStack, Any, Any]:
+        """
+        Открытие потока ответа модели (до первой части ответа)
         
-        except (json.JSONDecodeError, KeyError, TypeError) as e:
-            logger.warning(f"Ошибка парсинга JSON: {e}, пробуем текстовый парсинг")
+        Returns:
+            Слот лимитера провайдера вместе с потоком (закрыть после
+            чтения), поток и первая часть ответа (None, если ответ пуст)
+        """
+        slot = AsyncExitStack()
+        limiter = get_provider_limiter(model)
+        await slot.enter_async_context(limiter.limit(self._estimate_tokens(prompt)))
+        try:
+            stream = self._llms[model].astream(self._provider_prompt(prompt, model))
+            if hasattr(stream, "aclose"):
+                slot.push_async_callback(stream.aclose)
+            first_chunk = await anext(stream, None)
+        except BaseException:
+            await slot.aclose()
+            raise
+        return slot, stream, first_chunk
+    
+    def _build_prompt(self, config: TopicGenerationConfig) -> List[BaseMessage]:
+        """Формирование сообщений промпта по конфигурации"""
+        return self._prompts.render(config)
+    
+    def _build_packed_prompt(self, configs: List[TopicGenerationConfig]) -> List[BaseMessage]:
+        """Формирование одного промпта для нескольких запросов (разделы "Запрос N")"""
+        sections = [
+            f"### Запрос {number}\n{self._prompts.render_request(config).strip()}"
+            for number, config in enumerate(configs, start=1)
+        ]
+        header = f"""Выполни {len(configs)} независимых запросов на генерацию тем ВКР.
+Ответь одним JSON-объектом, где темы сгруппированы по номеру запроса:
+{{"requests": [{{"request": 1, "topics": [...]}}, {{"request": 2, "topics": [...]}}]}}
+Каждая тема - в формате, указанном выше; количество тем для каждого запроса - как в запросе.
+
+"""
+        return [
+            self._prompts.system_message,
+            HumanMessage(content=header + "\n\n".join(sections))
+        ]
+    
+    def _parse_packed_response(
+        self, response: str, configs: List[TopicGenerationConfig]
+    ) -> Tuple[List[List[VKRTopic]], bool]:
+        """
+        Разделение ответа на пакетный промпт по запросам
+        
+        Разделы ищутся в JSON ("requests"), а если ответ не JSON -
+        по заголовкам "Запрос N" в тексте. Каждый раздел разбирается
+        через _parse_response с конфигурацией своего запроса.
+        
+        Args:
+            response: Текст ответа модели
+            configs: Конфигурации запросов пакета
+            
+        Returns:
+            Темы для каждого запроса (пустой список, если раздел не найден)
+            и признак того, что разделы найдены в JSON
+        """
+        sections: Dict[int, str] = {}
+        
+        start_idx = response.find('{')
+        end_idx = response.rfind('}') + 1
+        try:
+            data = json.loads(response[start_idx:end_idx]) if start_idx != -1 else {}
+            for section in data.get('requests', []):
+                sections[int(section['request'])] = json.dumps(
+                    {"topics": section.get('topics', [])}, ensure_ascii=False
+                )
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError, AttributeError) as e:
+            logger.warning(f"Ошибка парсинга JSON пакетного ответа: {e}, ищем разделы в тексте")
+        
+        json_sections = bool(sections)
+        if not sections:
+            parts = re.split(r'^\s*#*\s*Запрос\s+(\d+)\s*:?\s*$', response, flags=re.MULTILINE)
+            for number, text in zip(parts[1::2], parts[2::2]):
+                sections[int(number)] = text
+        
+        return [
+            self._parse_response(sections[number], config) if number in sections else []
+            for number, config in enumerate(configs, start=1)
+        ], json_sections
+    
+    @staticmethod
+    def _provider_prompt(prompt: List[BaseMessage], model: str) -> List[BaseMessage]:
+        """
+        Промпт в виде для провайдера модели
+        
+        Для Anthropic общее начало промпта отмечается cache_control;
+        OpenAI и OpenRouter кэшируют общий префикс автоматически.
+        """
+        if settings.prompt_caching and model.startswith("anthropic:"):
+            return with_cache_control(prompt)
+        return prompt
+    
+    def _record_usage(self, usage: Optional[Dict[str, Any]]) -> None:
+        """Учет токенов по usage_metadata ответа (или части потока)"""
+        if not isinstance(usage, dict):
+            return
+        self._usage["input_tokens"] += usage.get("input_tokens", 0)
+        self._usage["output_tokens"] += usage.get("output_tokens", 0)
+        details = usage.get("input_token_details") or {}
+        self._usage["cache_read_tokens"] += details.get("cache_read", 0) or 0
+        self._usage["cache_creation_tokens"] += details.get("cache_creation", 0) or 0
+    
+    @staticmethod
+    def _estimate_tokens(prompt: List[BaseMessage]) -> int:
+        """Грубая оценка токенов промпта (~4 символа на токен)"""
+        return sum(len(message.content) for message in prompt) // 4
+    
+    async def _invoke(self, prompt: List[BaseMessage], structured: bool = False) -> Tuple[Any, str]:
+        """
+        Вызов модели в пределах лимитов провайдера с повторами и учетом расхода
+        
+        Модели цепочки пробуются в порядке ModelRouter.order(): при ошибке
+        (после повторов) запрос передается следующей модели.
+        
+        Args:
+            prompt: Сообщения промпта
+            structured: Запросить темы по схеме GeneratedTopics
+            
+        Returns:
+            Ответ модели (при structured - словарь raw/parsed/parsing_error)
+            и имя ответившей модели
+        """
+        estimated_tokens = self._estimate_tokens(prompt)
+        order = self._router.order()
+        self._router.record_route(order[0])
+        
+        for position, model in enumerate(order):
+            limiter = get_provider_limiter(model)
+            
+            async def call(model: str = model, limiter=limiter) -> Any:
+                async with limiter.limit(estimated_tokens):
+                    llm = self._structured_llm(model) if structured else self._llms[model]
+                    return await llm.ainvoke(self._provider_prompt(prompt, model))
+            
+            start_time = time.perf_counter()
+            try:
+                response = await self._callers[model].call(call)
+            except Exception as e:
+                failover = position < len(order) - 1
+                self._router.record_failure(model, failover)
+                if not failover:
+                    raise
+                logger.warning(
+                    f"Модель {model} недоступна ({e}), запрос передан {order[position + 1]}"
+                )
+                continue
+            
+            self._router.record_success(model, time.perf_counter() - start_time)
+            break
+        
+        self._usage["llm_calls"] += 1
+        self._usage["prompt_chars"] += sum(len(message.content) for message in prompt)
+        message = response.get("raw") if isinstance(response, dict) else response
+        usage = getattr(message, "usage_metadata", None)
+        self._record_usage(usage)
+        if isinstance(usage, dict):
+            limiter.record_tokens(estimated_tokens, usage.get("total_tokens", 0))
+        return response, model
+    
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Метрики агента: расход модели, выбор моделей, повторы, упаковка,
+        лимиты, HTTP, разбор ответов, промпты
+        """
+        input_tokens = self._usage["input_tokens"]
+        return {
+            **self._usage,
+            "cache_read_ratio": (
+                self._usage["cache_read_tokens"] / input_tokens if input_tokens else 0.0
+            ),
+            "routing": self._router.metrics(),
+            "resilience": {model: caller.metrics() for model, caller in self._callers.items()},
+            "packing": self._packer.metrics() if self._packer is not None else None,
+            "rate_limits": provider_limits_metrics(),
+            "http": connection_stats.metrics(),
+            "parsing": self._parse_stats.metrics(),
+            "prompts": self._prompts.metrics()
+        }
+    
+    def _topic_from_data(
+        self, topic_data: Dict[str, Any], config: TopicGenerationConfig
+    ) -> VKRTopic:
+        """Создание темы из JSON-объекта ответа модели"""
+        return VKRTopic(
+            title=topic_data.get('title', ''),
+            field=config.field,
+            specialization=config.specialization,
+            level=config.level,
+            description=topic_data.get('description', ''),
+            keywords=topic_data.get('keywords', []),
+            methodology=topic_data.get('methodology', ''),
+            expected_results=topic_data.get('expected_results', ''),
+            difficulty_level=topic_data.get('difficulty', 'Средняя')
+        )
+    
+    def _parse_structured_response(
+        self, response: Dict[str, Any], config: TopicGenerationConfig, model: str
+    ) -> List[VKRTopic]:
+        """
+        Темы из структурированного ответа модели
+        
+        Если ответ не прошел проверку схемы, темы извлекаются из
+        аргументов вызова инструмента или текста ответа обычным разбором
+        (учитывается как ошибка разбора модели).
+        
+        Args:
+            response: Результат with_structured_output(include_raw=True)
+            config: Конфигурация генерации
+            model: Ответившая модель
+            
+        Returns:
+            Сгенерированные темы
+        """
+        parsed = response.get("parsed")
+        if isinstance(parsed, GeneratedTopics) and response.get("parsing_error") is None:
+            self._parse_stats.record(model)
+            return [
+                self._topic_from_data(topic.dict(), config)
+                for topic in parsed.topics[:config.count]
+            ]
+        
+        logger.warning(
+            f"Ответ модели {model} не соответствует схеме: {response.get('parsing_error')}"
+        )
+        self._parse_stats.record(model, failed=True)
+        raw = response.get("raw")
+        tool_calls = getattr(raw, "tool_calls", None) or []
+        invalid_tool_calls = getattr(raw, "invalid_tool_calls", None) or []
+        if tool_calls:
+            text = json.dumps(tool_calls[0].get("args", {}), ensure_ascii=False)
+        elif invalid_tool_calls:
+            text = invalid_tool_calls[0].get("args") or ""
+        else:
+            text = raw.content if isinstance(getattr(raw, "content", None), str) else ""
+        return self._parse_response(text, config)
+    
+    def _parse_response(
+        self, response: str, config: TopicGenerationConfig, model: Optional[str] = None
+    ) -> List[VKRTopic]:
+        """
+        Парсинг ответа модели в структурированные темы
+        
+        Темы берутся из массива topics тем же потоковым парсером, что и
+        при stream_topics: пояснения и скобки вне массива игнорируются,
+        висячие запятые и оборванный конец ответа исправляются. Если
+        массива topics в ответе нет, применяется текстовый разбор.
+        
+        Args:
+            response: Текст ответа модели
+            config: Конфигурация генерации
+            model: Ответившая модель (для учета ошибок разбора)
+            
+        Returns:
+            Сгенерированные темы
+        """
+        parser = IncrementalTopicParser()
+        topics_data = parser.feed(response) + parser.finish()
+        if model is not None:
+            self._parse_stats.record(
+                model,
+                failed=not parser.found_topics,
+                repaired=bool(parser.repaired or parser.truncated)
+            )
+        if parser.found_topics:
+            if parser.repaired or parser.truncated:
+                logger.warning(
+                    f"JSON ответа модели исправлен (объектов: {parser.repaired}, "
+                    f"ответ оборван: {'да' if parser.truncated else 'нет'})"
+                )
+            return [
+                self._topic_from_data(topic_data, config)
+                for topic_data in topics_data[:config.count]
+            ]
+        
+        logger.warning("В ответе нет массива topics, пробуем текстовый парсинг")
+        topics = []
         
         # Fallback: простой парсинг по номерам тем
         lines = response.split('\n')
@@ -255,87 +773,6 @@ class VKRTopicAgent:
         
         return topics[:config.count]
     
-    def _format_student_context(self, preferences) -> str:
-        """Форматирование контекста студента"""
-        if not preferences:
-            return ""
-        
-        context_parts = []
-        
-        if preferences.interests:
-            context_parts.append(f"Области интересов студента: {', '.join(preferences.interests)}")
-        
-        if preferences.skills:
-            context_parts.append(f"Навыки студента: {', '.join(preferences.skills)}")
-        
-        if preferences.career_goals:
-            context_parts.append(f"Карьерные цели: {', '.join(preferences.career_goals)}")
-        
-        if preferences.preferred_technologies:
-            context_parts.append(f"Предпочитаемые технологии: {', '.join(preferences.preferred_technologies)}")
-        
-        if preferences.work_style:
-            context_parts.append(f"Стиль работы: {preferences.work_style}")
-        
-        if preferences.complexity_preference:
-            context_parts.append(f"Предпочтение сложности: {preferences.complexity_preference}")
-        
-        return "\n".join(context_parts) if context_parts else ""
-    
-    def _format_department_context(self, context) -> str:
-        """Форматирование контекста кафедры"""
-        if not context:
-            return ""
-        
-        context_parts = []
-        
-        if context.research_directions:
-            context_parts.append(f"Направления исследований кафедры: {', '.join(context.research_directions)}")
-        
-        if context.available_resources:
-            context_parts.append(f"Доступные ресурсы: {', '.join(context.available_resources)}")
-        
-        if context.supervisor_expertise:
-            context_parts.append(f"Экспертиза научных руководителей: {', '.join(context.supervisor_expertise)}")
-        
-        if context.recent_publications:
-            context_parts.append(f"Недавние публикации: {', '.join(context.recent_publications[:3])}")  # Ограничиваем количество
-        
-        return "\n".join(context_parts) if context_parts else ""
-    
-    def _format_duplicate_avoidance(self, avoid_duplicates: bool, department_context) -> str:
-        """Форматирование инструкций по избежанию дублирования"""
-        if not avoid_duplicates or not department_context or not department_context.existing_topics:
-            return ""
-        
-        existing_topics_text = "\n".join([f"- {topic}" for topic in department_context.existing_topics[:10]])  # Ограничиваем количество
-        return f"""
-ВАЖНО: Избегай дублирования с существующими темами на кафедре:
-{existing_topics_text}
-
-Генерируй только новые, уникальные темы, которые не пересекаются с перечисленными выше."""
-    
-    def _format_personalization(self, preferences) -> str:
-        """Форматирование персонализации"""
-        if not preferences:
-            return ""
-        
-        personalization_parts = []
-        
-        if preferences.interests:
-            personalization_parts.append("учитывай интересы студента")
-        
-        if preferences.skills:
-            personalization_parts.append("соответствуй навыкам студента")
-        
-        if preferences.career_goals:
-            personalization_parts.append("способствуй достижению карьерных целей")
-        
-        if personalization_parts:
-            return f"Персонализируй темы, чтобы они {', '.join(personalization_parts)}."
-        
-        return ""
-    
     async def generate_topics_simple(self, field: str, count: int = 5, 
                                    specialization: Optional[str] = None,
                                    level: str = "Бакалавриат") -> List[VKRTopic]:
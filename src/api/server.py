@@ -2,22 +2,33 @@
 FastAPI сервер для сервиса генерации тем ВКР
 """
 
-from fastapi import FastAPI, HTTPException, Depends, Query
+from fastapi import FastAPI, HTTPException, Depends, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
+import json
 import time
 import uuid
-from typing import List, Optional
+from dataclasses import replace
+from typing import Any, AsyncIterator, List, Optional, Tuple
 from loguru import logger
+from pydantic import BaseModel, Field
 
-from ..agents import VKRTopicAgent, TopicGenerationConfig
+from ..agents import VKRTopicAgent, TopicGenerationConfig, close_http_client
 from ..models import (
     TopicRequest, TopicResponse, TopicSearchRequest, TopicSearchResponse,
     TopicUpdateRequest, TopicStats, VKRTopic, EducationLevel, TopicStatus,
     StudentPreferences, DepartmentContext
 )
 from ..config import settings
-from ..database import get_db, TopicRepository
+from ..cache import create_response_cache
+from ..similarity import create_duplicate_filter, create_neighbour_graph
+from ..jobs import Job, JobManager, JobQueueFullError, JobStatus, run_bounded, create_topic_pool
+from ..database import (
+    get_db, repository_scope, TopicRepository, BufferedTopicWriter, init_engine, dispose_engine,
+    init_async_engine, dispose_async_engine, ensure_search_index, install_stats_counters,
+    install_keyword_index, TotalMode
+)
 
 
 # Создание FastAPI приложения
@@ -41,19 +52,82 @@ app.add_middleware(
 # Глобальный агент
 topic_agent = None
 
+# Кэш ответов генерации (создается при запуске, None - без кэша)
+response_cache = None
+
+# Очередь фоновых задач генерации
+job_manager = None
+
+# Отсев тем, почти совпадающих с уже сохраненными (None - без отсева)
+duplicate_filter = None
+_duplicate_index_task = None
+
+# Запас заранее сгенерированных тем (None - запас выключен)
+topic_pool = None
+
+# Граф похожих тем (None - выдача похожих тем выключена)
+neighbour_graph = None
+_neighbour_task = None
+_neighbour_refresh_requested = False
+
 
 @app.on_event("startup")
 async def startup_event():
     """Инициализация при запуске"""
-    global topic_agent
+    global topic_agent, response_cache, job_manager, duplicate_filter, _duplicate_index_task
+    global neighbour_graph, topic_pool
     try:
+        if settings.db_async:
+            async with init_async_engine().begin() as connection:
+                await connection.run_sync(ensure_search_index)
+                await connection.run_sync(install_stats_counters)
+                await connection.run_sync(install_keyword_index)
+        else:
+            with init_engine().begin() as connection:
+                ensure_search_index(connection)
+                install_stats_counters(connection)
+                install_keyword_index(connection)
         topic_agent = VKRTopicAgent()
+        response_cache = create_response_cache()
+        job_manager = JobManager(
+            workers=settings.job_workers,
+            queue_size=settings.job_queue_size,
+            retention=settings.job_retention
+        )
+        job_manager.start()
+        duplicate_filter = create_duplicate_filter()
+        if duplicate_filter is not None:
+            # Названия тем из базы загружаются в фоне; первая проверка дождется загрузки
+            _duplicate_index_task = asyncio.ensure_future(_refresh_duplicate_filter())
+            neighbour_graph = create_neighbour_graph(duplicate_filter.semantic)
+            _schedule_neighbour_refresh()
+        topic_pool = create_topic_pool(_generate_pool_topics, _check_pooled_topics)
+        if topic_pool is not None:
+            topic_pool.start()
         logger.info("VKR Topic Agent инициализирован")
     except Exception as e:
         logger.error(f"Ошибка инициализации агента: {e}")
         raise
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Освобождение ресурсов при остановке"""
+    if job_manager is not None:
+        await job_manager.stop()
+    if topic_pool is not None:
+        await topic_pool.stop()
+    dispose_engine()
+    await dispose_async_engine()
+    if response_cache is not None:
+        response_cache.close()
+    if duplicate_filter is not None:
+        duplicate_filter.save()
+    if neighbour_graph is not None:
+        neighbour_graph.save()
+    await close_http_client()
+
+
 @app.get("/")
 async def root():
     """Корневой эндпоинт"""
@@ -74,65 +148,256 @@ async def health_check():
     }
 
 
+def _build_generation_config(request: TopicRequest) -> TopicGenerationConfig:
+    """Конфигурация генерации по параметрам запроса"""
+    return TopicGenerationConfig(
+        field=request.field,
+        specialization=request.specialization,
+        level=request.level,
+        count=request.count,
+        include_trends=request.include_trends,
+        include_methodology=request.include_methodology,
+        language=request.language,
+        student_preferences=request.student_preferences,
+        department_context=request.department_context,
+        avoid_duplicates=request.avoid_duplicates
+    )
+
+
+async def _refresh_duplicate_filter() -> None:
+    """Загрузка в индекс дубликатов названий тем, появившихся в базе"""
+    try:
+        async with repository_scope() as repository:
+            await duplicate_filter.refresh(repository)
+    except Exception as e:
+        logger.error(f"Ошибка загрузки индекса дубликатов: {e}")
+
+
+def _schedule_neighbour_refresh() -> None:
+    """Фоновое добавление сохраненных тем в граф похожих тем"""
+    global _neighbour_task, _neighbour_refresh_requested
+    if neighbour_graph is None:
+        return
+    _neighbour_refresh_requested = True
+    if _neighbour_task is None or _neighbour_task.done():
+        _neighbour_task = asyncio.ensure_future(_refresh_neighbour_graph())
+
+
+async def _refresh_neighbour_graph() -> None:
+    """
+    Догрузка новых тем в семантический индекс и граф
+
+    Повторяется, пока приходят новые запросы на обновление.
+    """
+    global _neighbour_refresh_requested
+    while _neighbour_refresh_requested:
+        _neighbour_refresh_requested = False
+        await _refresh_duplicate_filter()
+        try:
+            await neighbour_graph.refresh()
+        except Exception as e:
+            logger.error(f"Ошибка обновления графа похожих тем: {e}")
+
+
+def _existing_titles(config: TopicGenerationConfig) -> List[str]:
+    """Названия тем кафедры из запроса"""
+    if config.department_context is None:
+        return []
+    return list(config.department_context.existing_topics)
+
+
+async def _deduplicate_topics(
+    config: TopicGenerationConfig, topics: List[VKRTopic]
+) -> List[VKRTopic]:
+    """
+    Отсев тем, почти совпадающих с темами в базе, темами кафедры и друг с другом
+    
+    Вместо отсеянных тем модель генерирует недостающие (не больше
+    settings.dedup_max_regenerations дополнительных вызовов); в промпт
+    передаются только отсеянные названия, а не вся история кафедры.
+    
+    Args:
+        config: Конфигурация генерации
+        topics: Сгенерированные темы
+        
+    Returns:
+        Темы без дубликатов (не больше config.count)
+    """
+    await _refresh_duplicate_filter()
+    existing = _existing_titles(config)
+    accepted: List[VKRTopic] = []
+    rejected: List[str] = []
+    
+    for round_number in range(settings.dedup_max_regenerations + 1):
+        duplicates = duplicate_filter.find_duplicates(
+            [topic.title for topic in topics],
+            existing + [topic.title for topic in accepted],
+            descriptions=[topic.description for topic in topics]
+        )
+        for topic, duplicate in zip(topics, duplicates):
+            if duplicate is None:
+                accepted.append(topic)
+            else:
+                logger.info(f"Отсеяна тема-дубликат: \"{topic.title}\" ~ \"{duplicate}\"")
+                rejected.append(topic.title)
+        
+        missing = config.count - len(accepted)
+        if missing <= 0 or not any(duplicates) or round_number == settings.dedup_max_regenerations:
+            break
+        
+        context = (
+            config.department_context.copy(update={"existing_topics": rejected})
+            if config.department_context is not None
+            else DepartmentContext(existing_topics=rejected)
+        )
+        topics = await topic_agent.generate_topics(
+            replace(config, count=missing, department_context=context, avoid_duplicates=True)
+        )
+    
+    return accepted[:config.count]
+
+
+async def _generate_pool_topics(
+    config: TopicGenerationConfig, existing: List[str]
+) -> List[VKRTopic]:
+    """Генерация тем для запаса без дубликатов сохраненных тем и тем запаса"""
+    topics = await topic_agent.generate_topics(config)
+    if duplicate_filter is None:
+        return topics
+    await _refresh_duplicate_filter()
+    duplicates = duplicate_filter.find_duplicates(
+        [topic.title for topic in topics], existing,
+        descriptions=[topic.description for topic in topics]
+    )
+    return [topic for topic, duplicate in zip(topics, duplicates) if duplicate is None]
+
+
+async def _check_pooled_topics(topics: List[VKRTopic]) -> List[bool]:
+    """Темы запаса, не совпадающие с темами, сохраненными после пополнения запаса"""
+    if duplicate_filter is None:
+        return [True] * len(topics)
+    await _refresh_duplicate_filter()
+    duplicates = duplicate_filter.find_duplicates(
+        [topic.title for topic in topics],
+        descriptions=[topic.description for topic in topics]
+    )
+    return [duplicate is None for duplicate in duplicates]
+
+
+def _sse_event(event: str, data: Any) -> str:
+    """Форматирование события Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+async def _generate_topics_response(
+    request: TopicRequest,
+    db: TopicRepository,
+    use_cache: bool = True
+) -> Tuple[TopicResponse, Optional[str]]:
+    """
+    Генерация тем (или получение из кэша) и сохранение в базу данных
+    
+    Args:
+        request: Параметры генерации тем
+        db: Репозиторий базы данных
+        use_cache: Использовать кэш ответов
+        
+    Returns:
+        Ответ с темами и статус кэша (HIT, MISS, BYPASS, POOL - из запаса тем; None - кэш отключен)
+    """
+    start_time = time.time()
+    request_id = str(uuid.uuid4())
+    config = _build_generation_config(request)
+    
+    pooled = None
+    if topic_pool is not None and use_cache:
+        pooled = await topic_pool.take(config)
+    
+    cached = None
+    cache_status = None
+    if pooled is not None:
+        cache_status = "POOL"
+    elif response_cache is not None:
+        cache_key = config.fingerprint(topic_agent.model_name)
+        if use_cache:
+            cached = await response_cache.get(cache_key)
+        else:
+            response_cache.record_bypass()
+        cache_status = "HIT" if cached else ("MISS" if use_cache else "BYPASS")
+    
+    if cached:
+        # Темы из кэша уже сохранены в базе исходным запросом
+        topics = cached.topics
+    else:
+        if pooled is not None:
+            # Темы запаса сгенерированы заранее, проверены на дубликаты и еще никому не выданы
+            topics = pooled
+        else:
+            topics = await topic_agent.generate_topics(config)
+            if duplicate_filter is not None and config.avoid_duplicates:
+                topics = await _deduplicate_topics(config, topics)
+        
+        # Сохранение в базу данных одной транзакцией
+        generation_params = request.dict()
+        for topic in topics:
+            topic.model_used = topic.model_used or settings.default_model
+            topic.generation_params = generation_params
+        await db.create_topics_bulk(topics)
+        _schedule_neighbour_refresh()
+        
+        if response_cache is not None and topics and pooled is None:
+            await response_cache.set(cache_key, topics, time.time() - start_time)
+    
+    generation_time = time.time() - start_time
+    
+    # Вычисление оценки качества
+    quality_score = sum(t.relevance_score or 0.5 for t in topics) / len(topics) if topics else 0
+    
+    response = TopicResponse(
+        topics=topics,
+        total_count=len(topics),
+        generation_time=generation_time,
+        model_used=topics[0].model_used if topics else settings.default_model,
+        request_id=request_id,
+        quality_score=quality_score
+    )
+    
+    logger.info(f"Успешно сгенерировано {len(topics)} тем за {generation_time:.2f}с")
+    return response, cache_status
+
+
 @app.post("/generate-topics", response_model=TopicResponse)
 async def generate_topics(
     request: TopicRequest,
+    http_response: Response,
+    use_cache: bool = Query(
+        True, description="Использовать кэш ответов (false - сгенерировать заново)"
+    ),
     db: TopicRepository = Depends(get_db)
 ):
     """
     Генерация тем ВКР
     
+    Одинаковые запросы обслуживаются из кэша ответов, запросы без
+    персонального контекста по популярным областям - из запаса заранее
+    сгенерированных тем (заголовок X-Cache).
+    
     Args:
         request: Параметры генерации тем
+        http_response: Ответ (для заголовка X-Cache)
+        use_cache: Использовать кэш ответов
         db: Репозиторий базы данных
         
     Returns:
         Сгенерированные темы
     """
     try:
-        start_time = time.time()
-        request_id = str(uuid.uuid4())
-        
         logger.info(f"Запрос на генерацию тем: {request.field}, {request.count} тем")
         
-        # Создание конфигурации
-        config = TopicGenerationConfig(
-            field=request.field,
-            specialization=request.specialization,
-            level=request.level,
-            count=request.count,
-            include_trends=request.include_trends,
-            include_methodology=request.include_methodology,
-            language=request.language,
-            student_preferences=request.student_preferences,
-            department_context=request.department_context,
-            avoid_duplicates=request.avoid_duplicates
-        )
+        response, cache_status = await _generate_topics_response(request, db, use_cache)
+        if cache_status is not None:
+            http_response.headers["X-Cache"] = cache_status
         
-        # Генерация тем
-        topics = await topic_agent.generate_topics(config)
-        
-        # Сохранение в базу данных
-        for topic in topics:
-            topic.model_used = settings.default_model
-            topic.generation_params = request.dict()
-            await db.create_topic(topic)
-        
-        generation_time = time.time() - start_time
-        
-        # Вычисление оценки качества
-        quality_score = sum(t.relevance_score or 0.5 for t in topics) / len(topics) if topics else 0
-        
-        response = TopicResponse(
-            topics=topics,
-            total_count=len(topics),
-            generation_time=generation_time,
-            model_used=settings.default_model,
-            request_id=request_id,
-            quality_score=quality_score
-        )
-        
-        logger.info(f"Успешно сгенерировано {len(topics)} тем за {generation_time:.2f}с")
         return response
         
     except Exception as e:
@@ -140,7 +405,284 @@ async def generate_topics(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/topics", response_model=TopicSearchResponse)
+@app.post("/generate-topics/stream")
+async def generate_topics_stream(
+    request: TopicRequest,
+    use_cache: bool = Query(
+        True, description="Использовать кэш ответов (false - сгенерировать заново)"
+    ),
+    db: TopicRepository = Depends(get_db)
+):
+    """
+    Потоковая генерация тем ВКР (Server-Sent Events)
+    
+    События: "topic" - очередная тема, как только модель ее закончила;
+    "done" - итог генерации; "error" - ошибка генерации.
+    
+    Args:
+        request: Параметры генерации тем
+        use_cache: Использовать кэш ответов
+        db: Репозиторий базы данных
+        
+    Returns:
+        Поток событий text/event-stream
+    """
+    start_time = time.time()
+    request_id = str(uuid.uuid4())
+    config = _build_generation_config(request)
+    
+    logger.info(f"Запрос на потоковую генерацию тем: {request.field}, {request.count} тем")
+    
+    async def events() -> AsyncIterator[str]:
+        topics = []
+        cached = None
+        cache_key = None
+        
+        try:
+            if response_cache is not None:
+                cache_key = config.fingerprint(topic_agent.model_name)
+                if use_cache:
+                    cached = await response_cache.get(cache_key)
+                else:
+                    response_cache.record_bypass()
+            
+            if cached:
+                topics = cached.topics
+                for topic in topics:
+                    yield _sse_event("topic", topic.dict())
+            else:
+                generation_params = request.dict()
+                check_duplicates = duplicate_filter is not None and config.avoid_duplicates
+                if check_duplicates:
+                    await _refresh_duplicate_filter()
+                    existing = _existing_titles(config)
+                async for topic in topic_agent.stream_topics(config):
+                    # Дубликаты пропускаются без догенерации, чтобы не задерживать поток
+                    if check_duplicates and duplicate_filter.find_duplicates(
+                        [topic.title], existing + [accepted.title for accepted in topics],
+                        descriptions=[topic.description]
+                    )[0] is not None:
+                        continue
+                    topic.model_used = topic.model_used or settings.default_model
+                    topic.generation_params = generation_params
+                    topics.append(topic)
+                    yield _sse_event("topic", topic.dict())
+                
+                # Сохранение в базу данных одной транзакцией после окончания потока
+                await db.create_topics_bulk(topics)
+                _schedule_neighbour_refresh()
+                if response_cache is not None and topics:
+                    await response_cache.set(cache_key, topics, time.time() - start_time)
+            
+            generation_time = time.time() - start_time
+            yield _sse_event("done", {
+                "total_count": len(topics),
+                "generation_time": generation_time,
+                "model_used": topics[0].model_used if topics else settings.default_model,
+                "request_id": request_id,
+                "cached": cached is not None
+            })
+            logger.info(f"Потоком сгенерировано {len(topics)} тем за {generation_time:.2f}с")
+            
+        except Exception as e:
+            logger.error(f"Ошибка потоковой генерации тем: {e}")
+            yield _sse_event("error", {"detail": str(e), "request_id": request_id})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+class BatchTopicRequest(BaseModel):
+    """Пакет запросов генерации тем"""
+    requests: List[TopicRequest] = Field(..., min_length=1)
+    concurrency: Optional[int] = Field(None, ge=1, le=64, description="Одновременных генераций")
+
+
+@app.post("/generate-topics/batch")
+async def generate_topics_batch(
+    batch: BatchTopicRequest,
+    use_cache: bool = Query(
+        True, description="Использовать кэш ответов (false - сгенерировать заново)"
+    ),
+    db: TopicRepository = Depends(get_db)
+):
+    """
+    Пакетная генерация тем (Server-Sent Events)
+    
+    Запросы выполняются параллельно (не более concurrency одновременно).
+    События: "item" - результат запроса по мере готовности (index - позиция
+    в пакете); "done" - итог пакета. Темы сохраняются пачками.
+    
+    Args:
+        batch: Запросы генерации и ограничение параллельности
+        use_cache: Использовать кэш ответов
+        db: Репозиторий базы данных
+        
+    Returns:
+        Поток событий text/event-stream
+    """
+    if len(batch.requests) > settings.batch_max_items:
+        raise HTTPException(
+            status_code=400,
+            detail=(
+                f"Слишком много запросов в пакете: "
+                f"{len(batch.requests)} > {settings.batch_max_items}"
+            )
+        )
+    
+    start_time = time.time()
+    concurrency = batch.concurrency or settings.batch_concurrency
+    logger.info(f"Пакетная генерация: {len(batch.requests)} запросов, параллельно {concurrency}")
+    
+    async def events() -> AsyncIterator[str]:
+        writer = BufferedTopicWriter(db, flush_size=settings.batch_persist_size)
+        succeeded = 0
+        total_topics = 0
+        
+        async def generate(request: TopicRequest) -> TopicResponse:
+            response, _ = await _generate_topics_response(request, writer, use_cache)
+            return response
+        
+        try:
+            async for index, result in run_bounded(batch.requests, generate, concurrency):
+                if isinstance(result, Exception):
+                    logger.error(f"Ошибка генерации в пакете (#{index}): {result}")
+                    yield _sse_event(
+                        "item", {"index": index, "status": "error", "error": str(result)}
+                    )
+                else:
+                    succeeded += 1
+                    total_topics += result.total_count
+                    yield _sse_event(
+                        "item", {"index": index, "status": "ok", "result": result.dict()}
+                    )
+            
+            await writer.flush()
+            _schedule_neighbour_refresh()
+            
+            generation_time = time.time() - start_time
+            yield _sse_event("done", {
+                "total_items": len(batch.requests),
+                "succeeded": succeeded,
+                "failed": len(batch.requests) - succeeded,
+                "total_topics": total_topics,
+                "stored_topics": writer.written,
+                "generation_time": generation_time
+            })
+            logger.info(
+                f"Пакет выполнен: {succeeded}/{len(batch.requests)} за {generation_time:.2f}с"
+            )
+            
+        except Exception as e:
+            logger.error(f"Ошибка пакетной генерации: {e}")
+            yield _sse_event("error", {"detail": str(e)})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+class JobResponse(BaseModel):
+    """Состояние фоновой задачи генерации"""
+    job_id: str
+    status: JobStatus
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    wait_time: Optional[float] = None
+    run_time: Optional[float] = None
+    result: Optional[TopicResponse] = None
+    error: Optional[str] = None
+    
+    @classmethod
+    def from_job(cls, job: Job) -> "JobResponse":
+        return cls(
+            job_id=job.id,
+            status=job.status,
+            created_at=job.created_at,
+            started_at=job.started_at,
+            finished_at=job.finished_at,
+            wait_time=job.wait_time,
+            run_time=job.run_time,
+            result=job.result,
+            error=job.error
+        )
+
+
+@app.post("/jobs/generate-topics", response_model=JobResponse, status_code=202)
+async def submit_generation_job(
+    request: TopicRequest,
+    use_cache: bool = Query(
+        True, description="Использовать кэш ответов (false - сгенерировать заново)"
+    )
+):
+    """
+    Постановка генерации тем в очередь фоновых задач
+    
+    Ответ возвращается сразу; результат - через GET /jobs/{job_id}.
+    
+    Args:
+        request: Параметры генерации тем
+        use_cache: Использовать кэш ответов
+        
+    Returns:
+        Задача в статусе queued
+    """
+    if job_manager is None:
+        raise HTTPException(status_code=503, detail="Очередь задач не инициализирована")
+    
+    async def run_generation() -> TopicResponse:
+        # Сессия на время задачи, а не запроса, поставившего ее в очередь
+        async with repository_scope() as db:
+            response, _ = await _generate_topics_response(request, db, use_cache)
+            return response
+    
+    try:
+        job = job_manager.submit("generate-topics", run_generation)
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    
+    return JobResponse.from_job(job)
+
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, description="Ждать завершения до N секунд (long-poll)")
+):
+    """
+    Состояние фоновой задачи
+    
+    Args:
+        job_id: Идентификатор задачи
+        wait: Максимальное время ожидания завершения (ограничено настройками)
+        
+    Returns:
+        Состояние задачи и результат, если она завершена
+    """
+    if job_manager is None:
+        raise HTTPException(status_code=503, detail="Очередь задач не инициализирована")
+    
+    job = await job_manager.wait(job_id, min(wait, settings.job_long_poll_max))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    
+    return JobResponse.from_job(job)
+
+
+class TopicPageResponse(TopicSearchResponse):
+    """Результаты поиска с курсором следующей страницы"""
+    total_count: Optional[int] = None
+    total_is_exact: bool = True
+    next_cursor: Optional[str] = None
+
+
+@app.get("/topics", response_model=TopicPageResponse)
 async def search_topics(
     query: str = Query(..., description="Поисковый запрос"),
     field: Optional[str] = Query(None, description="Фильтр по области"),
@@ -148,6 +690,11 @@ async def search_topics(
     status: Optional[TopicStatus] = Query(None, description="Фильтр по статусу"),
     limit: int = Query(20, ge=1, le=100, description="Количество результатов"),
     offset: int = Query(0, ge=0, description="Смещение"),
+    pagination: str = Query("offset", pattern="^(offset|cursor)$", description="Способ пагинации"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы"),
+    total: TotalMode = Query(
+        TotalMode.EXACT, description="Подсчет общего количества: exact, approximate, none"
+    ),
     db: TopicRepository = Depends(get_db)
 ):
     """
@@ -160,6 +707,9 @@ async def search_topics(
         status: Фильтр по статусу
         limit: Количество результатов
         offset: Смещение для пагинации
+        pagination: "offset" или "cursor" (keyset по дате создания)
+        cursor: Курсор из next_cursor предыдущего ответа (включает режим "cursor")
+        total: Способ подсчета общего количества
         db: Репозиторий базы данных
         
     Returns:
@@ -175,19 +725,29 @@ async def search_topics(
             offset=offset
         )
         
-        topics, total_count = await db.search_topics(search_request)
+        use_cursor = pagination == "cursor" or cursor is not None
+        page = await db.search_topics_page(
+            search_request,
+            cursor=cursor,
+            total_mode=total,
+            use_cursor=use_cursor
+        )
         
-        response = TopicSearchResponse(
-            topics=topics,
-            total_count=total_count,
-            page=offset // limit + 1,
+        response = TopicPageResponse(
+            topics=page.topics,
+            total_count=page.total_count,
+            total_is_exact=page.total_is_exact,
+            page=1 if use_cursor else offset // limit + 1,
             per_page=limit,
-            has_next=offset + limit < total_count,
-            has_prev=offset > 0
+            has_next=page.has_next,
+            has_prev=cursor is not None if use_cursor else offset > 0,
+            next_cursor=page.next_cursor
         )
         
         return response
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Ошибка поиска тем: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -221,6 +781,65 @@ async def get_topic(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class SimilarTopic(BaseModel):
+    """Похожая тема и ее сходство с исходной"""
+    topic: VKRTopic
+    similarity: float
+
+
+class SimilarTopicsResponse(BaseModel):
+    """Темы, похожие на заданную"""
+    topic_id: int
+    similar: List[SimilarTopic]
+
+
+@app.get("/topics/{topic_id}/similar", response_model=SimilarTopicsResponse)
+async def get_similar_topics(
+    topic_id: int,
+    k: int = Query(10, ge=1, le=settings.similar_topics_k, description="Количество похожих тем"),
+    db: TopicRepository = Depends(get_db)
+):
+    """
+    Темы, похожие на заданную по смыслу названия и описания
+    
+    Соседи берутся из заранее посчитанного графа; новые темы попадают
+    в него в фоне после сохранения, до этого их соседи ищутся по
+    семантическому индексу.
+    
+    Args:
+        topic_id: ID темы
+        k: Количество похожих тем
+        db: Репозиторий базы данных
+        
+    Returns:
+        Похожие темы по убыванию сходства
+    """
+    if neighbour_graph is None:
+        raise HTTPException(status_code=503, detail="Поиск похожих тем отключен")
+    try:
+        neighbours = neighbour_graph.neighbours(topic_id, k)
+        if neighbours is None:
+            # Темы нет в индексе: она не существует, еще не загружена или без значимых слов
+            if not await db.get_topic(topic_id):
+                raise HTTPException(status_code=404, detail="Тема не найдена")
+            neighbours = []
+        topics = await db.get_topics_by_ids([neighbour_id for neighbour_id, _ in neighbours])
+        return SimilarTopicsResponse(
+            topic_id=topic_id,
+            similar=[
+                SimilarTopic(topic=topics[neighbour_id], similarity=round(similarity, 4))
+                for neighbour_id, similarity in neighbours
+                if neighbour_id in topics
+            ]
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка поиска похожих тем для {topic_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.put("/topics/{topic_id}", response_model=VKRTopic)
 async def update_topic(
     topic_id: int,
@@ -242,6 +861,12 @@ async def update_topic(
         topic = await db.update_topic(topic_id, request)
         if not topic:
             raise HTTPException(status_code=404, detail="Тема не найдена")
+        text_changed = request.title is not None or request.description is not None
+        if duplicate_filter is not None and text_changed:
+            duplicate_filter.add(topic_id, topic.title, topic.description or "")
+            if neighbour_graph is not None:
+                neighbour_graph.invalidate(topic_id)
+                _schedule_neighbour_refresh()
         return topic
         
     except HTTPException:
@@ -270,6 +895,10 @@ async def delete_topic(
         success = await db.delete_topic(topic_id)
         if not success:
             raise HTTPException(status_code=404, detail="Тема не найдена")
+        if duplicate_filter is not None:
+            duplicate_filter.remove(topic_id)
+        if neighbour_graph is not None:
+            neighbour_graph.remove(topic_id)
         return {"message": "Тема успешно удалена"}
         
     except HTTPException:
@@ -299,6 +928,72 @@ async def get_stats(db: TopicRepository = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class KeywordCount(BaseModel):
+    """Ключевое слово и количество тем с ним"""
+    keyword: str
+    count: int
+
+
+class KeywordStatsResponse(BaseModel):
+    """Популярные ключевые слова"""
+    keywords: List[KeywordCount]
+    field: Optional[str] = None
+    level: Optional[EducationLevel] = None
+
+
+@app.get("/stats/keywords", response_model=KeywordStatsResponse)
+async def get_keyword_stats(
+    field: Optional[str] = Query(None, description="Фильтр по области"),
+    level: Optional[EducationLevel] = Query(None, description="Фильтр по уровню"),
+    limit: int = Query(50, ge=1, le=500, description="Количество ключевых слов"),
+    db: TopicRepository = Depends(get_db)
+):
+    """
+    Популярные ключевые слова по всем темам или по области/уровню
+    
+    Args:
+        field: Фильтр по области знаний
+        level: Фильтр по уровню образования
+        limit: Количество ключевых слов
+        db: Репозиторий базы данных
+        
+    Returns:
+        Ключевые слова по убыванию количества тем
+    """
+    try:
+        keywords = await db.get_top_keywords(limit, field=field, level=level)
+        return KeywordStatsResponse(
+            keywords=[KeywordCount(keyword=keyword, count=count) for keyword, count in keywords],
+            field=field,
+            level=level
+        )
+        
+    except Exception as e:
+        logger.error(f"Ошибка получения ключевых слов: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Метрики сервиса
+    
+    Returns:
+        Метрики кэша ответов (доля попаданий, сэкономленное время)
+        и очереди задач (глубина, время ожидания и выполнения),
+        расход модели и упаковка запросов, отсев дубликатов, граф похожих тем
+        и запас тем (доля попаданий, стоимость пополнения)
+    """
+    return {
+        "response_cache": response_cache.metrics() if response_cache is not None else None,
+        "jobs": job_manager.metrics() if job_manager is not None else None,
+        "agent": topic_agent.metrics() if topic_agent is not None else None,
+        "dedup": duplicate_filter.metrics() if duplicate_filter is not None else None,
+        "similar_topics": neighbour_graph.metrics() if neighbour_graph is not None else None,
+        "topic_pool": topic_pool.metrics() if topic_pool is not None else None
+    }
+
+
 @app.get("/fields")
 async def get_supported_fields():
     """
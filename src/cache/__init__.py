@@ -0,0 +1,12 @@
+"""
+Кэширование результатов генерации
+"""
+
+from .backends import CacheBackend, CacheEntry, MemoryCacheBackend, SQLiteCacheBackend
+from .response_cache import ResponseCache, CachedTopics, create_response_cache
+from .single_flight import SingleFlight
+
+__all__ = [
+    "CacheBackend", "CacheEntry", "MemoryCacheBackend", "SQLiteCacheBackend",
+    "ResponseCache", "CachedTopics", "create_response_cache", "SingleFlight"
+]
@@ -0,0 +1,180 @@
+"""
+Хранилища кэша: в памяти процесса и в файле SQLite
+
+Оба хранилища ограничивают число записей (вытесняется давно не
+использованная запись - LRU) и время жизни записи (TTL).
+"""
+
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+
+@dataclass
+class CacheEntry:
+    """Запись кэша"""
+    value: str                 # сериализованное значение (JSON)
+    expires_at: float          # time.time(), после которого запись недействительна
+    cost_seconds: float = 0.0  # сколько стоило получить значение без кэша
+
+
+class CacheBackend(ABC):
+    """Базовое хранилище кэша"""
+
+    name = "base"
+
+    # Обращения блокируют поток (выполняются вне event loop)
+    blocking = False
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Действующая запись по ключу или None"""
+
+    @abstractmethod
+    def set(self, key: str, entry: CacheEntry) -> None:
+        """Сохранение записи (с вытеснением при переполнении)"""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Удаление записи"""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Удаление всех записей"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Число записей"""
+
+    def close(self) -> None:
+        """Освобождение ресурсов хранилища"""
+
+
+class MemoryCacheBackend(CacheBackend):
+    """LRU-кэш в памяти процесса"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """LRU-кэш в файле SQLite, переживает перезапуск сервиса"""
+
+    name = "sqlite"
+    blocking = True
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                cost_seconds REAL NOT NULL DEFAULT 0,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS ix_cache_entries_last_access ON cache_entries(last_access)"
+        )
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value, expires_at, cost_seconds FROM cache_entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._connection.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+                return None
+            self._connection.execute(
+                "UPDATE cache_entries SET last_access = ? WHERE key = ?", (now, key)
+            )
+        return CacheEntry(value=row[0], expires_at=row[1], cost_seconds=row[2])
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection.execute("BEGIN")
+            try:
+                self._connection.execute(
+                    """INSERT OR REPLACE INTO cache_entries(
+                        key, value, expires_at, cost_seconds, last_access
+                    )
+                    VALUES (?, ?, ?, ?, ?)""",
+                    (key, entry.value, entry.expires_at, entry.cost_seconds, now)
+                )
+                # Сначала истекшие записи, затем давно не использованные
+                self._connection.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+                self._connection.execute(
+                    """DELETE FROM cache_entries WHERE key IN (
+                        SELECT key FROM cache_entries ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                    )""",
+                    (self.max_entries,)
+                )
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM cache_entries")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT count(*) FROM cache_entries").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
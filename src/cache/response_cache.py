@@ -0,0 +1,141 @@
+"""
+Кэш ответов генерации тем
+
+Ключ - хэш канонического представления TopicGenerationConfig и имени
+модели (TopicGenerationConfig.fingerprint), поэтому одинаковые запросы
+получают сохраненные темы без повторного обращения к модели.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from .backends import CacheBackend, CacheEntry, MemoryCacheBackend, SQLiteCacheBackend
+from ..config import settings
+from ..models import VKRTopic
+
+
+@dataclass
+class CachedTopics:
+    """Темы из кэша"""
+    topics: List[VKRTopic]
+    generation_time: float  # время исходной генерации (секунды)
+
+
+class ResponseCache:
+    """Кэш сгенерированных тем с метриками попаданий"""
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._bypassed = 0
+        self._latency_saved = 0.0
+
+    async def _call(self, method, *args):
+        """Обращение к хранилищу (файловое - в пуле потоков)"""
+        if self.backend.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def get(self, key: str) -> Optional[CachedTopics]:
+        """
+        Получение тем по ключу запроса
+
+        Args:
+            key: Отпечаток конфигурации генерации
+
+        Returns:
+            Темы и время исходной генерации или None
+        """
+        try:
+            entry = await self._call(self.backend.get, key)
+        except Exception as e:
+            logger.warning(f"Ошибка чтения кэша ответов: {e}")
+            entry = None
+
+        with self._lock:
+            if entry is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._latency_saved += entry.cost_seconds
+
+        topics = [VKRTopic(**topic_data) for topic_data in json.loads(entry.value)]
+        return CachedTopics(topics=topics, generation_time=entry.cost_seconds)
+
+    async def set(self, key: str, topics: List[VKRTopic], generation_time: float) -> None:
+        """
+        Сохранение сгенерированных тем
+
+        Args:
+            key: Отпечаток конфигурации генерации
+            topics: Сгенерированные темы
+            generation_time: Время генерации (секунды)
+        """
+        entry = CacheEntry(
+            value=json.dumps([topic.dict() for topic in topics], ensure_ascii=False, default=str),
+            expires_at=time.time() + self.ttl,
+            cost_seconds=generation_time
+        )
+        try:
+            await self._call(self.backend.set, key, entry)
+        except Exception as e:
+            logger.warning(f"Ошибка записи кэша ответов: {e}")
+
+    def record_bypass(self) -> None:
+        """Учет запроса, выполненного в обход кэша"""
+        with self._lock:
+            self._bypassed += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """Метрики кэша: доля попаданий и сэкономленное время"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "backend": self.backend.name,
+                "entries": len(self.backend),
+                "hits": self._hits,
+                "misses": self._misses,
+                "bypassed": self._bypassed,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "latency_saved_seconds": round(self._latency_saved, 3)
+            }
+
+    def close(self) -> None:
+        """Закрытие хранилища"""
+        self.backend.close()
+
+
+def create_response_cache() -> Optional[ResponseCache]:
+    """
+    Создание кэша ответов по настройкам
+
+    Returns:
+        Кэш или None, если settings.response_cache_backend == "none"
+    """
+    backend_name = settings.response_cache_backend
+
+    if backend_name == "none":
+        return None
+
+    if backend_name == "memory":
+        backend = MemoryCacheBackend(max_entries=settings.response_cache_max_entries)
+    elif backend_name == "sqlite":
+        backend = SQLiteCacheBackend(
+            settings.response_cache_path,
+            max_entries=settings.response_cache_max_entries
+        )
+    else:
+        raise ValueError(f"Неподдерживаемое хранилище кэша: {backend_name}")
+
+    logger.info(f"Кэш ответов: {backend.name}, TTL {settings.response_cache_ttl} с")
+    return ResponseCache(backend, ttl=settings.response_cache_ttl)
@@ -0,0 +1,60 @@
+"""
+Объединение одновременных одинаковых вызовов (single-flight)
+
+Пока вызов с данным ключом выполняется, повторные вызовы с тем же
+ключом не запускают работу заново, а ждут результата первого.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, TypeVar
+
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """Группа вызовов, объединяемых по ключу"""
+
+    def __init__(self):
+        self._in_flight: Dict[str, "asyncio.Future[T]"] = {}
+        self._coalesced = 0
+
+    async def run(self, key: str, operation: Callable[[], Awaitable[T]]) -> T:
+        """
+        Выполнение операции или ожидание уже запущенной с тем же ключом
+
+        Отмена одного из ожидающих не прерывает общую операцию.
+
+        Args:
+            key: Ключ объединения
+            operation: Фабрика корутины, выполняющей работу
+
+        Returns:
+            Результат общей операции (исключение передается всем ожидающим)
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(operation())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self._coalesced += 1
+
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: "asyncio.Future[T]") -> None:
+        """Удаление завершенной операции (исключение помечается полученным)"""
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            task.exception()
+
+    @property
+    def in_flight(self) -> int:
+        """Количество выполняемых операций"""
+        return len(self._in_flight)
+
+    @property
+    def coalesced(self) -> int:
+        """Количество вызовов, присоединенных к уже выполняемой операции"""
+        return self._coalesced
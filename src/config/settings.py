@@ -38,7 +38,118 @@ class Settings(BaseSettings):
     
     # База данных
     database_url: str = "sqlite:///./vkr_topics.db"
-    
+
+    # Пул соединений с базой данных
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: int = 30
+    db_pool_recycle: int = 1800  # секунды
+    db_pool_pre_ping: bool = True
+
+    # Асинхронный доступ к БД (AsyncSession + aiosqlite/asyncpg)
+    db_async: bool = False
+    async_database_url: Optional[str] = None  # по умолчанию выводится из database_url
+
+    # Поиск тем: "auto" - полнотекстовый индекс СУБД (FTS5/tsvector), "like" - подстрока
+    search_backend: str = "auto"
+
+    # Время жизни кэша /stats (секунды, 0 - без кэша); сбрасывается при записи
+    stats_cache_ttl: float = 30.0
+
+    # Количество популярных ключевых слов в /stats
+    stats_top_keywords: int = 10
+
+    # Кэш ответов /generate-topics: "memory", "sqlite" (файл response_cache_path) или "none"
+    response_cache_backend: str = "memory"
+    response_cache_ttl: float = 3600.0  # секунды
+    response_cache_max_entries: int = 1000
+    response_cache_path: str = "./vkr_response_cache.db"
+
+    # Фоновые задачи генерации (/jobs)
+    job_workers: int = 4
+    job_queue_size: int = 100
+    job_retention: int = 1000  # хранимых завершенных задач
+    job_long_poll_max: float = 60.0  # секунды
+
+    # Пакетная генерация (/generate-topics/batch)
+    batch_max_items: int = 100
+    batch_concurrency: int = 8
+    batch_persist_size: int = 200  # тем в одном INSERT
+
+    # Запас заранее сгенерированных тем для популярных сочетаний (область, уровень);
+    # выключен по умолчанию: пополнение запаса - платные вызовы модели без запроса пользователя
+    topic_pool_enabled: bool = False
+    topic_pool_capacity: int = 30  # до скольких тем пополняется запас сочетания
+    topic_pool_low_watermark: int = 10  # меньше скольких тем запас пополняется
+    topic_pool_batch_size: int = 10  # тем за один вызов модели при пополнении
+    topic_pool_hot_combos: int = 5  # для скольких самых популярных сочетаний ведется запас
+    topic_pool_min_requests: float = 3.0  # запросов для попадания в запас (затухание вдвое за час)
+    topic_pool_ttl: float = 86400.0  # секунды хранения темы в запасе
+    topic_pool_interval: float = 60.0  # период проверки запаса (секунды)
+
+    # Упаковка небольших запросов в один вызов модели (окно в секундах, 0 - выключено)
+    micro_batch_window: float = 0.0
+    micro_batch_max_size: int = 8  # запросов в одном вызове
+    micro_batch_max_count: int = 3  # упаковываются запросы не более чем на столько тем
+
+    # Ограничения вызовов провайдеров моделей (0 - без ограничения)
+    openai_max_concurrency: int = 0
+    openai_requests_per_minute: int = 0
+    openai_tokens_per_minute: int = 0
+    anthropic_max_concurrency: int = 0
+    anthropic_requests_per_minute: int = 0
+    anthropic_tokens_per_minute: int = 0
+    openrouter_max_concurrency: int = 0
+    openrouter_requests_per_minute: int = 0
+    openrouter_tokens_per_minute: int = 0
+
+    # Повторы временных ошибок модели (429, 5xx, таймауты) и хеджирование
+    llm_max_attempts: int = 3
+    llm_retry_base_delay: float = 0.5  # секунды, растет вдвое с каждой попыткой
+    llm_retry_max_delay: float = 20.0
+    llm_hedging: bool = False  # повторный запрос, если ответа нет дольше p95
+    llm_hedge_min_samples: int = 20  # вызовов для оценки p95
+
+    # Резервные модели после default_model; запрос уходит самой быстрой исправной
+    fallback_models: List[str] = []
+    routing_ewma_alpha: float = 0.2  # вес нового замера в средних задержки и доли ошибок
+    routing_max_error_rate: float = 0.5  # выше - модель неисправна
+    routing_cooldown: float = 30.0  # секунды до повторной попытки неисправной модели
+
+    # Общий HTTP-клиент моделей (пул keepalive-соединений, HTTP/2 при установленном h2)
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0  # секунды
+    http_timeout: float = 120.0  # секунды на чтение ответа модели
+    http_connect_timeout: float = 10.0
+    http2: bool = True
+
+    # Структурированный вывод: темы по JSON-схеме через вызов инструмента модели
+    structured_output: bool = False
+    structured_output_method: str = "function_calling"  # или json_schema, json_mode
+
+    # Кэширование общего начала промпта у провайдера (cache_control для Anthropic)
+    prompt_caching: bool = True
+
+    # Отсев почти повторяющихся тем (MinHash/LSH по символьным n-граммам названий)
+    dedup_enabled: bool = True
+    dedup_threshold: float = 0.7  # сходство Жаккара n-грамм, с которого тема - дубликат
+    dedup_num_perm: int = 96  # длина сигнатуры MinHash
+    dedup_bands: int = 16  # полос LSH (dedup_num_perm делится на dedup_bands)
+    dedup_ngram: int = 3
+    dedup_max_regenerations: int = 1  # дополнительных вызовов модели вместо отсеянных тем
+
+    # Семантический отсев: TF-IDF по основам слов и индекс в файле (отображается в память)
+    semantic_dedup_enabled: bool = True
+    semantic_threshold: float = 0.88  # косинусное сходство, с которого тема - дубликат по смыслу
+    semantic_nprobe: int = 2  # списков главных признаков темы, просматриваемых при поиске
+    semantic_index_path: str = "./vkr_semantic_index.bin"  # "" - индекс только в памяти
+
+    # Похожие темы (/topics/{id}/similar): граф ближайших соседей по семантическому индексу
+    similar_topics_enabled: bool = True
+    similar_topics_k: int = 20  # соседей, хранимых для темы (наибольший k запроса)
+    similar_graph_path: str = "./vkr_neighbours.bin"  # "" - граф только в памяти
+
     # Сервер
     host: str = "0.0.0.0"
     port: int = 8000
@@ -2,7 +2,24 @@
 Модули для работы с базой данных
 """
 
-from .repository import TopicRepository, get_db
+from .repository import TopicRepository, BufferedTopicWriter, get_db, repository_scope
+from .async_repository import AsyncTopicRepository
 from .models import TopicDB
+from .search import get_search_backend, ensure_search_index
+from .stats import install_stats_counters, stats_cache
+from .keywords import install_keyword_index, top_keywords
+from .pagination import TopicPage, TotalMode, encode_cursor, decode_cursor
+from .connection import (
+    init_engine, get_engine, dispose_engine, session_scope,
+    init_async_engine, get_async_engine, dispose_async_engine, async_session_scope
+)
 
-__all__ = ["TopicRepository", "get_db", "TopicDB"]
+__all__ = [
+    "TopicRepository", "AsyncTopicRepository", "BufferedTopicWriter",
+    "get_db", "repository_scope", "TopicDB",
+    "init_engine", "get_engine", "dispose_engine", "session_scope",
+    "init_async_engine", "get_async_engine", "dispose_async_engine", "async_session_scope",
+    "get_search_backend", "ensure_search_index",
+    "install_stats_counters", "stats_cache", "install_keyword_index", "top_keywords",
+    "TopicPage", "TotalMode", "encode_cursor", "decode_cursor"
+]
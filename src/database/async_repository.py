@@ -0,0 +1,91 @@
+"""
+Асинхронный репозиторий для работы с темами ВКР
+"""
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Tuple, Optional, Callable, TypeVar
+
+from .repository import TopicRepository
+from .pagination import TopicPage, TotalMode
+from ..models import (
+    VKRTopic, TopicSearchRequest, TopicUpdateRequest, TopicStats, EducationLevel
+)
+
+
+T = TypeVar("T")
+
+
+class AsyncTopicRepository:
+    """
+    Репозиторий тем ВКР поверх AsyncSession
+
+    Запросы те же, что и в TopicRepository, но выполняются через
+    AsyncSession.run_sync: ввод-вывод идет через асинхронный драйвер
+    (aiosqlite, asyncpg) и не блокирует event loop.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _run(self, operation: Callable[[TopicRepository], T]) -> T:
+        """Выполнение операции синхронного репозитория без блокировки event loop"""
+        return await self.db.run_sync(lambda session: operation(TopicRepository(session)))
+
+    async def create_topic(self, topic: VKRTopic) -> VKRTopic:
+        """Создание новой темы"""
+        return await self._run(lambda repo: repo._create_topic(topic))
+
+    async def create_topics_bulk(self, topics: List[VKRTopic]) -> List[VKRTopic]:
+        """Создание пакета тем в одной транзакции"""
+        return await self._run(lambda repo: repo._create_topics_bulk(topics))
+
+    async def get_topic(self, topic_id: int) -> Optional[VKRTopic]:
+        """Получение темы по ID"""
+        return await self._run(lambda repo: repo._get_topic(topic_id))
+
+    async def get_topics_by_ids(self, topic_ids: List[int]) -> Dict[int, VKRTopic]:
+        """Темы с указанными ID (отсутствующих в базе нет в результате)"""
+        return await self._run(lambda repo: repo._get_topics_by_ids(topic_ids))
+
+    async def update_topic(self, topic_id: int,
+                           update_data: TopicUpdateRequest) -> Optional[VKRTopic]:
+        """Обновление темы"""
+        return await self._run(lambda repo: repo._update_topic(topic_id, update_data))
+
+    async def delete_topic(self, topic_id: int) -> bool:
+        """Удаление темы"""
+        return await self._run(lambda repo: repo._delete_topic(topic_id))
+
+    async def search_topics(self, search_request: TopicSearchRequest) -> Tuple[List[VKRTopic], int]:
+        """Поиск тем по запросу"""
+        return await self._run(lambda repo: repo._search_topics(search_request))
+
+    async def search_topics_page(self, search_request: TopicSearchRequest,
+                                 cursor: Optional[str] = None,
+                                 total_mode: TotalMode = TotalMode.EXACT,
+                                 use_cursor: bool = False) -> TopicPage:
+        """Поиск тем с выбором способа пагинации и подсчета"""
+        return await self._run(
+            lambda repo: repo._search_topics_page(search_request, cursor, total_mode, use_cursor)
+        )
+
+    async def get_stats(self) -> TopicStats:
+        """Получение статистики по темам"""
+        return await self._run(lambda repo: repo._get_stats())
+
+    async def get_top_keywords(self, limit: int = 10,
+                               field: Optional[str] = None,
+                               level: Optional[EducationLevel] = None) -> List[Tuple[str, int]]:
+        """Популярные ключевые слова"""
+        return await self._run(lambda repo: repo._get_top_keywords(limit, field, level))
+
+    async def get_titles_after(
+        self, after_id: int = 0, limit: int = 10000
+    ) -> List[Tuple[int, str]]:
+        """Пары (ID, название) тем с ID больше after_id в порядке ID"""
+        return await self._run(lambda repo: repo._get_titles_after(after_id, limit))
+
+    async def get_topic_texts_after(self, after_id: int = 0,
+                                    limit: int = 10000) -> List[Tuple[int, str, Optional[str]]]:
+        """Тройки (ID, название, описание) тем с ID больше after_id в порядке ID"""
+        return await self._run(lambda repo: repo._get_topic_texts_after(after_id, limit))
@@ -0,0 +1,235 @@
+"""
+Подключение к базе данных: общий движок с пулом соединений и фабрика сессий
+"""
+
+from contextlib import contextmanager, asynccontextmanager
+from typing import Iterator, AsyncIterator, Optional
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, URL, make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+)
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+from loguru import logger
+
+from ..config import settings
+
+
+# Движок и фабрика сессий создаются один раз на процесс
+_engine: Optional[Engine] = None
+_session_factory: Optional[sessionmaker] = None
+_async_engine: Optional[AsyncEngine] = None
+_async_session_factory: Optional[async_sessionmaker] = None
+
+# Асинхронные драйверы для синхронных URL из настроек
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def _is_memory_sqlite(url: URL) -> bool:
+    """In-memory SQLite живет только в одном соединении"""
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def _pool_kwargs() -> dict:
+    """Параметры пула соединений из настроек"""
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+    }
+
+
+def to_async_url(database_url: str) -> URL:
+    """
+    Преобразование URL базы данных для асинхронного драйвера
+
+    Args:
+        database_url: URL базы данных (например, sqlite:///./vkr_topics.db)
+
+    Returns:
+        URL с драйвером aiosqlite/asyncpg
+    """
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+
+    if backend in ASYNC_DRIVERS and url.get_driver_name() not in ("aiosqlite", "asyncpg"):
+        url = url.set(drivername=ASYNC_DRIVERS[backend])
+
+    return url
+
+
+def create_db_engine(database_url: Optional[str] = None) -> Engine:
+    """
+    Создание движка с настроенным пулом соединений
+
+    Args:
+        database_url: URL базы данных (по умолчанию из настроек)
+
+    Returns:
+        Движок SQLAlchemy
+    """
+    url = make_url(database_url or settings.database_url)
+    engine_kwargs = {"pool_pre_ping": settings.db_pool_pre_ping}
+
+    if url.get_backend_name() == "sqlite":
+        # Сессия создается в потоке зависимости, а используется в обработчике
+        engine_kwargs["connect_args"] = {"check_same_thread": False}
+
+    if _is_memory_sqlite(url):
+        engine_kwargs["poolclass"] = StaticPool
+    else:
+        engine_kwargs.update(_pool_kwargs())
+
+    return create_engine(url, **engine_kwargs)
+
+
+def create_async_db_engine(database_url: Optional[str] = None) -> AsyncEngine:
+    """
+    Создание асинхронного движка (aiosqlite, asyncpg)
+
+    Args:
+        database_url: URL базы данных (по умолчанию settings.async_database_url
+            или settings.database_url с асинхронным драйвером)
+
+    Returns:
+        Асинхронный движок SQLAlchemy
+    """
+    url = to_async_url(database_url or settings.async_database_url or settings.database_url)
+    engine_kwargs = {"pool_pre_ping": settings.db_pool_pre_ping}
+
+    if _is_memory_sqlite(url):
+        engine_kwargs["poolclass"] = StaticPool
+    else:
+        engine_kwargs.update(_pool_kwargs())
+
+    return create_async_engine(url, **engine_kwargs)
+
+
+def init_engine(database_url: Optional[str] = None) -> Engine:
+    """
+    Инициализация общего движка (вызывается при запуске приложения)
+
+    Args:
+        database_url: URL базы данных (по умолчанию из настроек)
+
+    Returns:
+        Движок SQLAlchemy
+    """
+    global _engine, _session_factory
+
+    if _engine is not None:
+        _engine.dispose()
+
+    _engine = create_db_engine(database_url)
+    _session_factory = sessionmaker(autocommit=False, autoflush=False, bind=_engine)
+
+    logger.info(
+        f"Инициализирован пул соединений: {_engine.url.render_as_string(hide_password=True)}"
+    )
+    return _engine
+
+
+def get_engine() -> Engine:
+    """Получение общего движка (создается при первом обращении)"""
+    if _engine is None:
+        init_engine()
+    return _engine
+
+
+def get_session_factory() -> sessionmaker:
+    """Получение фабрики сессий, привязанной к общему движку"""
+    if _session_factory is None:
+        init_engine()
+    return _session_factory
+
+
+def init_async_engine(database_url: Optional[str] = None) -> AsyncEngine:
+    """
+    Инициализация общего асинхронного движка
+
+    Args:
+        database_url: URL базы данных (по умолчанию из настроек)
+
+    Returns:
+        Асинхронный движок SQLAlchemy
+
+    Raises:
+        RuntimeError: Если движок уже создан (пул асинхронного движка
+            закрывается только в event loop - сначала dispose_async_engine)
+    """
+    global _async_engine, _async_session_factory
+
+    if _async_engine is not None:
+        raise RuntimeError(
+            "Асинхронный движок уже инициализирован: сначала вызовите dispose_async_engine()"
+        )
+
+    _async_engine = create_async_db_engine(database_url)
+    _async_session_factory = async_sessionmaker(
+        bind=_async_engine, autoflush=False, expire_on_commit=False
+    )
+
+    logger.info(
+        f"Инициализирован асинхронный пул: {_async_engine.url.render_as_string(hide_password=True)}"
+    )
+    return _async_engine
+
+
+def get_async_engine() -> AsyncEngine:
+    """Получение общего асинхронного движка (создается при первом обращении)"""
+    if _async_engine is None:
+        init_async_engine()
+    return _async_engine
+
+
+def get_async_session_factory() -> async_sessionmaker:
+    """Получение фабрики асинхронных сессий"""
+    if _async_session_factory is None:
+        init_async_engine()
+    return _async_session_factory
+
+
+def dispose_engine() -> None:
+    """Закрытие всех соединений синхронного пула (вызывается при остановке приложения)"""
+    global _engine, _session_factory
+
+    if _engine is not None:
+        _engine.dispose()
+        logger.info("Пул соединений закрыт")
+
+    _engine = None
+    _session_factory = None
+
+
+async def dispose_async_engine() -> None:
+    """Закрытие всех соединений асинхронного пула"""
+    global _async_engine, _async_session_factory
+
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        logger.info("Асинхронный пул соединений закрыт")
+
+    _async_engine = None
+    _async_session_factory = None
+
+
+@contextmanager
+def session_scope() -> Iterator[Session]:
+    """Сессия на время блока с гарантированным закрытием"""
+    session = get_session_factory()()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@asynccontextmanager
+async def async_session_scope() -> AsyncIterator[AsyncSession]:
+    """Асинхронная сессия на время блока с гарантированным закрытием"""
+    async with get_async_session_factory()() as session:
+        yield session
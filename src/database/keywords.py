@@ -0,0 +1,207 @@
+"""
+Индекс ключевых слов тем ВКР
+
+Триггеры на vkr_topics раскладывают JSON-список keywords в строки
+vkr_topic_keywords (ключевое слово, область, уровень, количество тем),
+поэтому популярные ключевые слова считаются по счетчикам, а не
+разбором JSON всех тем. Для СУБД без триггеров используется подсчет
+по таблице тем.
+"""
+
+from collections import Counter
+from typing import List, Optional, Tuple
+from sqlalchemy import desc, event, func, inspect
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from loguru import logger
+
+from .models import Base, TopicDB, TopicKeywordCounter
+from ..models import EducationLevel
+
+
+TOPICS_TABLE = TopicDB.__tablename__
+KEYWORDS_TABLE = TopicKeywordCounter.__tablename__
+
+# Длина ключевого слова ограничена размером столбца keyword
+KEYWORD_MAX_LENGTH = TopicKeywordCounter.__table__.c.keyword.type.length
+
+# Уникальные непустые ключевые слова строки темы ({row} - new/old)
+_SQLITE_KEYWORDS = (
+    f"SELECT DISTINCT substr(trim(value), 1, {KEYWORD_MAX_LENGTH}) AS keyword "
+    "FROM json_each({row}.keywords) WHERE type = 'text' AND trim(value) <> ''"
+)
+
+_POSTGRES_KEYWORDS = (
+    f"SELECT DISTINCT left(btrim(value), {KEYWORD_MAX_LENGTH}) AS keyword "
+    "FROM json_array_elements_text(CASE WHEN json_typeof({row}.keywords) = 'array' "
+    "THEN {row}.keywords ELSE '[]'::json END) "
+    "WHERE value IS NOT NULL AND btrim(value) <> ''"
+)
+
+_INCREMENT_SQL = f"""INSERT INTO {KEYWORDS_TABLE}(keyword, field, level, topic_count)
+            SELECT keyword, {{row}}.field, {{row}}.level, 1
+            FROM ({{keywords}}) AS topic_keywords WHERE true
+            ON CONFLICT(keyword, field, level) DO UPDATE SET
+                topic_count = {KEYWORDS_TABLE}.topic_count + 1"""
+
+_DECREMENT_SQL = f"""UPDATE {KEYWORDS_TABLE} SET topic_count = topic_count - 1
+            WHERE field = {{row}}.field AND level = {{row}}.level
+                AND keyword IN ({{keywords}});
+            DELETE FROM {KEYWORDS_TABLE}
+            WHERE field = {{row}}.field AND level = {{row}}.level AND topic_count <= 0"""
+
+_TRIGGER_COLUMNS = "keywords, field, level"
+
+
+def _sqlite_sql(template: str, row: str) -> str:
+    return template.format(row=row, keywords=_SQLITE_KEYWORDS.format(row=row))
+
+
+def _postgres_sql(template: str, row: str) -> str:
+    return template.format(row=row, keywords=_POSTGRES_KEYWORDS.format(row=row))
+
+
+_SQLITE_DDL = [
+    f"""CREATE TRIGGER IF NOT EXISTS {KEYWORDS_TABLE}_ai AFTER INSERT ON {TOPICS_TABLE} BEGIN
+        {_sqlite_sql(_INCREMENT_SQL, "new")};
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {KEYWORDS_TABLE}_ad AFTER DELETE ON {TOPICS_TABLE} BEGIN
+        {_sqlite_sql(_DECREMENT_SQL, "old")};
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {KEYWORDS_TABLE}_au
+    AFTER UPDATE OF {_TRIGGER_COLUMNS} ON {TOPICS_TABLE} BEGIN
+        {_sqlite_sql(_DECREMENT_SQL, "old")};
+        {_sqlite_sql(_INCREMENT_SQL, "new")};
+    END""",
+]
+
+_POSTGRES_DDL = [
+    f"""CREATE OR REPLACE FUNCTION {KEYWORDS_TABLE}_apply() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            {_postgres_sql(_DECREMENT_SQL, "OLD")};
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            {_postgres_sql(_INCREMENT_SQL, "NEW")};
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    f"DROP TRIGGER IF EXISTS {KEYWORDS_TABLE}_trigger ON {TOPICS_TABLE}",
+    f"""CREATE TRIGGER {KEYWORDS_TABLE}_trigger
+    AFTER INSERT OR DELETE OR UPDATE OF {_TRIGGER_COLUMNS} ON {TOPICS_TABLE}
+    FOR EACH ROW EXECUTE FUNCTION {KEYWORDS_TABLE}_apply()""",
+]
+
+# Заполнение индекса по уже существующим темам
+_REBUILD_SQL = {
+    "sqlite": f"""INSERT INTO {KEYWORDS_TABLE}(keyword, field, level, topic_count)
+        SELECT keyword, field, level, count(*) FROM (
+            SELECT DISTINCT t.id, substr(trim(k.value), 1, {KEYWORD_MAX_LENGTH}) AS keyword,
+                t.field, t.level
+            FROM {TOPICS_TABLE} AS t, json_each(t.keywords) AS k
+            WHERE k.type = 'text' AND trim(k.value) <> ''
+        ) AS topic_keywords GROUP BY keyword, field, level""",
+    "postgresql": f"""INSERT INTO {KEYWORDS_TABLE}(keyword, field, level, topic_count)
+        SELECT keyword, field, level, count(*) FROM (
+            SELECT DISTINCT t.id, left(btrim(k.value), {KEYWORD_MAX_LENGTH}) AS keyword,
+                t.field, t.level
+            FROM {TOPICS_TABLE} AS t
+            CROSS JOIN LATERAL json_array_elements_text(
+                CASE WHEN json_typeof(t.keywords) = 'array' THEN t.keywords ELSE '[]'::json END
+            ) AS k(value)
+            WHERE k.value IS NOT NULL AND btrim(k.value) <> ''
+        ) AS topic_keywords GROUP BY keyword, field, level""",
+}
+
+_KEYWORD_DDL = {
+    "sqlite": _SQLITE_DDL,
+    "postgresql": _POSTGRES_DDL,
+}
+
+
+def keyword_index_supported(dialect_name: str) -> bool:
+    """Поддерживается ли индекс ключевых слов для СУБД"""
+    return dialect_name in _KEYWORD_DDL
+
+
+def install_keyword_index(connection: Connection) -> None:
+    """
+    Создание таблицы индекса ключевых слов и триггеров (идемпотентно)
+
+    Если индекс пуст, а темы уже есть, он заполняется одним запросом.
+
+    Args:
+        connection: Соединение (для AsyncConnection - через run_sync)
+    """
+    dialect_name = connection.dialect.name
+    if not keyword_index_supported(dialect_name) or not inspect(connection).has_table(TOPICS_TABLE):
+        return
+
+    TopicKeywordCounter.__table__.create(connection, checkfirst=True)
+    for statement in _KEYWORD_DDL[dialect_name]:
+        connection.exec_driver_sql(statement)
+
+    has_keywords = connection.execute(TopicKeywordCounter.__table__.select().limit(1)).first()
+    if has_keywords is None:
+        connection.exec_driver_sql(_REBUILD_SQL[dialect_name])
+        logger.info("Индекс ключевых слов заполнен по таблице тем")
+
+
+def top_keywords(session: Session, limit: int,
+                 field: Optional[str] = None,
+                 level: Optional[EducationLevel] = None) -> List[Tuple[str, int]]:
+    """
+    Самые частые ключевые слова
+
+    Args:
+        session: Сессия базы данных
+        limit: Количество ключевых слов
+        field: Только темы области знаний
+        level: Только темы уровня образования
+
+    Returns:
+        Пары (ключевое слово, количество тем) по убыванию количества
+    """
+    if keyword_index_supported(session.get_bind().dialect.name):
+        topic_count = func.sum(TopicKeywordCounter.topic_count).label("topic_count")
+        query = session.query(TopicKeywordCounter.keyword, topic_count)
+
+        if field:
+            query = query.filter(TopicKeywordCounter.field == field)
+
+        if level:
+            query = query.filter(TopicKeywordCounter.level == level)
+
+        rows = (
+            query.group_by(TopicKeywordCounter.keyword)
+            .order_by(desc(topic_count), TopicKeywordCounter.keyword)
+            .limit(limit)
+            .all()
+        )
+        return [(keyword, int(count)) for keyword, count in rows]
+
+    # Без триггеров: разбор JSON всех подходящих тем
+    query = session.query(TopicDB.keywords)
+
+    if field:
+        query = query.filter(TopicDB.field == field)
+
+    if level:
+        query = query.filter(TopicDB.level == level)
+
+    counts: Counter = Counter()
+    for (keywords,) in query.yield_per(1000):
+        counts.update({
+            keyword.strip()[:KEYWORD_MAX_LENGTH]
+            for keyword in keywords or []
+            if isinstance(keyword, str) and keyword.strip()
+        })
+
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _install_on_create(target, connection: Connection, **kw) -> None:
+    """Создание триггеров индекса после всех таблиц (триггеры ссылаются на обе)"""
+    install_keyword_index(connection)
@@ -2,7 +2,7 @@
 SQLAlchemy модели для базы данных
 """
 
-from sqlalchemy import Column, Integer, String, Text, Float, DateTime, JSON, Enum
+from sqlalchemy import Column, Integer, String, Text, Float, DateTime, JSON, Enum, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -17,6 +17,10 @@ class TopicDB(Base):
     """SQLAlchemy модель для хранения тем ВКР"""
     
     __tablename__ = "vkr_topics"
+    __table_args__ = (
+        # Keyset-пагинация: ORDER BY created_at DESC, id DESC
+        Index("ix_vkr_topics_created_at_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False, index=True)
@@ -68,6 +72,13 @@ class TopicDB(Base):
             generation_params=self.generation_params
         )
     
+    def to_row(self) -> Dict[str, Any]:
+        """Значения колонок для пакетной вставки (без незаданного id)"""
+        row = {column.key: getattr(self, column.key) for column in self.__table__.columns}
+        if row.get("id") is None:
+            row.pop("id", None)
+        return row
+    
     @classmethod
     def from_pydantic(cls, topic: 'VKRTopic') -> 'TopicDB':
         """Создание из Pydantic модели"""
@@ -92,3 +103,33 @@ class TopicDB(Base):
             generation_params=topic.generation_params,
             request_id=getattr(topic, 'request_id', None)
         )
+
+
+class TopicStatsCounter(Base):
+    """Счетчики тем по (область, уровень, статус), поддерживаются триггерами СУБД"""
+    
+    __tablename__ = "vkr_topic_stats"
+    
+    field = Column(String(100), primary_key=True)
+    level = Column(Enum(EducationLevel), primary_key=True)
+    status = Column(Enum(TopicStatus), primary_key=True)
+    
+    topic_count = Column(Integer, nullable=False, default=0)
+    relevance_sum = Column(Float, nullable=False, default=0.0)
+    relevance_count = Column(Integer, nullable=False, default=0)
+
+
+class TopicKeywordCounter(Base):
+    """Количество тем с ключевым словом по (область, уровень), поддерживается триггерами СУБД"""
+    
+    __tablename__ = "vkr_topic_keywords"
+    __table_args__ = (
+        # Top-K внутри области/уровня без просмотра остальных счетчиков
+        Index("ix_vkr_topic_keywords_field_level", "field", "level", "topic_count"),
+    )
+    
+    keyword = Column(String(200), primary_key=True)
+    field = Column(String(100), primary_key=True)
+    level = Column(Enum(EducationLevel), primary_key=True)
+    
+    topic_count = Column(Integer, nullable=False, default=0)
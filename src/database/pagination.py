@@ -0,0 +1,105 @@
+"""
+Пагинация результатов поиска: курсоры (keyset) и оценка общего количества
+"""
+
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+from typing import List, Optional, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.orm import Query, Session
+
+from .models import TopicDB
+from ..models import VKRTopic
+
+
+class TotalMode(str, Enum):
+    """Способ подсчета общего количества результатов"""
+    EXACT = "exact"              # COUNT(*) по всем совпадениям
+    APPROXIMATE = "approximate"  # оценка планировщика / ограниченный подсчет
+    NONE = "none"                # только has_next
+
+
+# Предел ограниченного подсчета для СУБД без оценки планировщика
+APPROXIMATE_COUNT_LIMIT = 10_000
+
+
+@dataclass
+class TopicPage:
+    """Страница результатов поиска"""
+    topics: List[VKRTopic]
+    has_next: bool
+    next_cursor: Optional[str] = None
+    total_count: Optional[int] = None
+    total_is_exact: bool = False
+
+
+def encode_cursor(created_at: datetime, topic_id: int) -> str:
+    """
+    Кодирование позиции (created_at, id) в непрозрачный курсор
+
+    Args:
+        created_at: Дата создания последней темы страницы
+        topic_id: ID последней темы страницы
+
+    Returns:
+        Курсор для запроса следующей страницы
+    """
+    payload = json.dumps([created_at.isoformat(), topic_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Декодирование курсора
+
+    Args:
+        cursor: Курсор из предыдущего ответа
+
+    Returns:
+        Позиция (created_at, id)
+
+    Raises:
+        ValueError: Если курсор поврежден
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, topic_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(topic_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Некорректный курсор: {cursor}") from e
+
+
+def count_results(session: Session, query: Query, mode: TotalMode) -> Tuple[Optional[int], bool]:
+    """
+    Подсчет общего количества результатов выбранным способом
+
+    Args:
+        session: Сессия базы данных
+        query: Запрос без сортировки и пагинации
+        mode: Способ подсчета
+
+    Returns:
+        (количество или None, точное ли количество)
+    """
+    if mode == TotalMode.NONE:
+        return None, False
+
+    if mode == TotalMode.EXACT:
+        return query.count(), True
+
+    bind = session.get_bind()
+    if bind.dialect.name == "postgresql":
+        # Оценка планировщика: EXPLAIN не выполняет запрос
+        statement = query.statement.compile(bind, compile_kwargs={"literal_binds": True})
+        plan = session.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}").scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"]), False
+
+    # Ограниченный подсчет: точен для небольших выборок, иначе "не менее N"
+    limited = query.with_entities(TopicDB.id).limit(APPROXIMATE_COUNT_LIMIT)
+    count = session.execute(select(func.count()).select_from(limited.subquery())).scalar()
+    return count, count < APPROXIMATE_COUNT_LIMIT
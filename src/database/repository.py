@@ -2,31 +2,51 @@
 Репозиторий для работы с темами ВКР
 """
 
+import asyncio
+from contextlib import asynccontextmanager
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc, func
-from typing import List, Tuple, Optional, Dict, Any
+from sqlalchemy import and_, desc, insert, tuple_
+from typing import List, Tuple, Optional, Dict, Any, AsyncIterator, Union, TYPE_CHECKING
 from loguru import logger
 
 from .models import TopicDB
+from .connection import session_scope, async_session_scope
+from .search import get_search_backend
+from .pagination import TopicPage, TotalMode, count_results, encode_cursor, decode_cursor
+from .stats import stats_cache, read_stats_rows, build_stats
+from .keywords import top_keywords
 from ..models import (
     VKRTopic, TopicSearchRequest, TopicUpdateRequest, 
     TopicStats, EducationLevel, TopicStatus
 )
+from ..config import settings
+
+if TYPE_CHECKING:
+    from .async_repository import AsyncTopicRepository
 
 
 class TopicRepository:
-    """Репозиторий для работы с темами ВКР"""
+    """
+    Репозиторий для работы с темами ВКР
+
+    Запросы выполняются синхронной сессией в методах с префиксом "_".
+    Асинхронные методы - общий интерфейс с AsyncTopicRepository.
+    """
     
     def __init__(self, db: Session):
         self.db = db
     
     async def create_topic(self, topic: VKRTopic) -> VKRTopic:
         """Создание новой темы"""
+        return self._create_topic(topic)
+    
+    def _create_topic(self, topic: VKRTopic) -> VKRTopic:
         try:
             db_topic = TopicDB.from_pydantic(topic)
             self.db.add(db_topic)
             self.db.commit()
             self.db.refresh(db_topic)
+            self._invalidate_stats()
             
             logger.info(f"Создана тема: {db_topic.title}")
             return db_topic.to_pydantic()
@@ -36,8 +56,39 @@ class TopicRepository:
             logger.error(f"Ошибка создания темы: {e}")
             raise
     
+    async def create_topics_bulk(self, topics: List[VKRTopic]) -> List[VKRTopic]:
+        """Создание пакета тем в одной транзакции"""
+        return self._create_topics_bulk(topics)
+    
+    def _create_topics_bulk(self, topics: List[VKRTopic]) -> List[VKRTopic]:
+        if not topics:
+            return []
+        
+        try:
+            rows = [TopicDB.from_pydantic(topic).to_row() for topic in topics]
+            
+            # Один INSERT ... VALUES (...), (...) RETURNING вместо запроса на каждую тему;
+            # строки RETURNING - в порядке переданных тем, а не по возрастанию ID
+            db_topics = self.db.scalars(
+                insert(TopicDB).returning(TopicDB, sort_by_parameter_order=True), rows
+            ).all()
+            created_topics = [db_topic.to_pydantic() for db_topic in db_topics]
+            self.db.commit()
+            self._invalidate_stats()
+            
+            logger.info(f"Создано тем пакетом: {len(created_topics)}")
+            return created_topics
+            
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Ошибка пакетного создания тем: {e}")
+            raise
+    
     async def get_topic(self, topic_id: int) -> Optional[VKRTopic]:
         """Получение темы по ID"""
+        return self._get_topic(topic_id)
+    
+    def _get_topic(self, topic_id: int) -> Optional[VKRTopic]:
         try:
             db_topic = self.db.query(TopicDB).filter(TopicDB.id == topic_id).first()
             return db_topic.to_pydantic() if db_topic else None
@@ -46,8 +97,26 @@ class TopicRepository:
             logger.error(f"Ошибка получения темы {topic_id}: {e}")
             raise
     
+    async def get_topics_by_ids(self, topic_ids: List[int]) -> Dict[int, VKRTopic]:
+        """Темы с указанными ID (отсутствующих в базе нет в результате)"""
+        return self._get_topics_by_ids(topic_ids)
+    
+    def _get_topics_by_ids(self, topic_ids: List[int]) -> Dict[int, VKRTopic]:
+        if not topic_ids:
+            return {}
+        try:
+            db_topics = self.db.query(TopicDB).filter(TopicDB.id.in_(topic_ids)).all()
+            return {db_topic.id: db_topic.to_pydantic() for db_topic in db_topics}
+            
+        except Exception as e:
+            logger.error(f"Ошибка получения тем {topic_ids}: {e}")
+            raise
+    
     async def update_topic(self, topic_id: int, update_data: TopicUpdateRequest) -> Optional[VKRTopic]:
         """Обновление темы"""
+        return self._update_topic(topic_id, update_data)
+    
+    def _update_topic(self, topic_id: int, update_data: TopicUpdateRequest) -> Optional[VKRTopic]:
         try:
             db_topic = self.db.query(TopicDB).filter(TopicDB.id == topic_id).first()
             if not db_topic:
@@ -60,6 +129,7 @@ class TopicRepository:
             
             self.db.commit()
             self.db.refresh(db_topic)
+            self._invalidate_stats()
             
             logger.info(f"Обновлена тема {topic_id}")
             return db_topic.to_pydantic()
@@ -71,6 +141,9 @@ class TopicRepository:
     
     async def delete_topic(self, topic_id: int) -> bool:
         """Удаление темы"""
+        return self._delete_topic(topic_id)
+    
+    def _delete_topic(self, topic_id: int) -> bool:
         try:
             db_topic = self.db.query(TopicDB).filter(TopicDB.id == topic_id).first()
             if not db_topic:
@@ -78,6 +151,7 @@ class TopicRepository:
             
             self.db.delete(db_topic)
             self.db.commit()
+            self._invalidate_stats()
             
             logger.info(f"Удалена тема {topic_id}")
             return True
@@ -89,29 +163,11 @@ class TopicRepository:
     
     async def search_topics(self, search_request: TopicSearchRequest) -> Tuple[List[VKRTopic], int]:
         """Поиск тем по запросу"""
+        return self._search_topics(search_request)
+    
+    def _search_topics(self, search_request: TopicSearchRequest) -> Tuple[List[VKRTopic], int]:
         try:
-            query = self.db.query(TopicDB)
-            
-            # Поиск по тексту
-            if search_request.query:
-                search_term = f"%{search_request.query}%"
-                query = query.filter(
-                    or_(
-                        TopicDB.title.ilike(search_term),
-                        TopicDB.description.ilike(search_term),
-                        TopicDB.methodology.ilike(search_term)
-                    )
-                )
-            
-            # Фильтры
-            if search_request.field:
-                query = query.filter(TopicDB.field == search_request.field)
-            
-            if search_request.level:
-                query = query.filter(TopicDB.level == search_request.level)
-            
-            if search_request.status:
-                query = query.filter(TopicDB.status == search_request.status)
+            query = self._build_search_query(search_request)
             
             # Подсчет общего количества
             total_count = query.count()
@@ -129,80 +185,290 @@ class TopicRepository:
             logger.error(f"Ошибка поиска тем: {e}")
             raise
     
+    async def search_topics_page(self, search_request: TopicSearchRequest,
+                                 cursor: Optional[str] = None,
+                                 total_mode: TotalMode = TotalMode.EXACT,
+                                 use_cursor: bool = False) -> TopicPage:
+        """
+        Поиск тем с выбором способа пагинации и подсчета
+        
+        Args:
+            search_request: Параметры поиска (offset используется без курсора)
+            cursor: Курсор следующей страницы из предыдущего ответа
+            total_mode: Способ подсчета общего количества
+            use_cursor: Keyset-пагинация по (created_at, id) для первой страницы
+            
+        Returns:
+            Страница результатов
+        """
+        return self._search_topics_page(search_request, cursor, total_mode, use_cursor)
+    
+    def _search_topics_page(self, search_request: TopicSearchRequest,
+                            cursor: Optional[str] = None,
+                            total_mode: TotalMode = TotalMode.EXACT,
+                            use_cursor: bool = False) -> TopicPage:
+        try:
+            query = self._build_search_query(search_request)
+            total_count, total_is_exact = count_results(self.db, query, total_mode)
+            
+            if cursor is not None or use_cursor:
+                # Keyset: сортировка по составному индексу (created_at, id), без OFFSET
+                page_query = query.order_by(None).order_by(
+                    TopicDB.created_at.desc(), TopicDB.id.desc()
+                )
+                if cursor is not None:
+                    created_at, topic_id = decode_cursor(cursor)
+                    page_query = page_query.filter(
+                        tuple_(TopicDB.created_at, TopicDB.id) < tuple_(created_at, topic_id)
+                    )
+            else:
+                page_query = query.offset(search_request.offset)
+            
+            # Лишняя строка показывает, есть ли следующая страница
+            rows = page_query.limit(search_request.limit + 1).all()
+            has_next = len(rows) > search_request.limit
+            rows = rows[:search_request.limit]
+            
+            next_cursor = None
+            if has_next and (cursor is not None or use_cursor):
+                next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+            
+            return TopicPage(
+                topics=[topic.to_pydantic() for topic in rows],
+                has_next=has_next,
+                next_cursor=next_cursor,
+                total_count=total_count,
+                total_is_exact=total_is_exact
+            )
+            
+        except Exception as e:
+            logger.error(f"Ошибка поиска тем: {e}")
+            raise
+    
+    def _build_search_query(self, search_request: TopicSearchRequest):
+        """Запрос с фильтрами поиска (без пагинации)"""
+        query = self.db.query(TopicDB)
+        
+        # Поиск по тексту (полнотекстовый индекс, результаты по релевантности)
+        if search_request.query:
+            search_backend = get_search_backend(self.db.get_bind().dialect.name)
+            query = search_backend.apply(query, search_request.query)
+        
+        # Фильтры
+        if search_request.field:
+            query = query.filter(TopicDB.field == search_request.field)
+        
+        if search_request.level:
+            query = query.filter(TopicDB.level == search_request.level)
+        
+        if search_request.status:
+            query = query.filter(TopicDB.status == search_request.status)
+        
+        return query
+    
     async def get_stats(self) -> TopicStats:
         """Получение статистики по темам"""
+        return self._get_stats()
+    
+    def _get_stats(self) -> TopicStats:
         try:
-            # Общее количество тем
-            total_topics = self.db.query(TopicDB).count()
-            
-            # По областям знаний
-            by_field = {}
-            field_stats = self.db.query(
-                TopicDB.field, 
-                func.count(TopicDB.id).label('count')
-            ).group_by(TopicDB.field).all()
-            
-            for field, count in field_stats:
-                by_field[field] = count
-            
-            # По уровням образования
-            by_level = {}
-            level_stats = self.db.query(
-                TopicDB.level,
-                func.count(TopicDB.id).label('count')
-            ).group_by(TopicDB.level).all()
-            
-            for level, count in level_stats:
-                by_level[level] = count
-            
-            # По статусам
-            by_status = {}
-            status_stats = self.db.query(
-                TopicDB.status,
-                func.count(TopicDB.id).label('count')
-            ).group_by(TopicDB.status).all()
-            
-            for status, count in status_stats:
-                by_status[status] = count
-            
-            # Средняя оценка релевантности
-            avg_relevance = self.db.query(
-                func.avg(TopicDB.relevance_score)
-            ).filter(TopicDB.relevance_score.isnot(None)).scalar()
-            
-            # Популярные ключевые слова
-            # Это упрощенная версия - в реальности нужен более сложный анализ
-            popular_keywords = []
-            
-            stats = TopicStats(
-                total_topics=total_topics,
-                by_field=by_field,
-                by_level=by_level,
-                by_status=by_status,
-                avg_relevance_score=float(avg_relevance) if avg_relevance else None,
-                most_popular_keywords=popular_keywords
+            engine = self.db.get_bind()
+            
+            cached_stats = stats_cache.get(engine)
+            if cached_stats is not None:
+                return cached_stats
+            
+            # Счетчики по (область, уровень, статус) - один запрос вместо пяти
+            popular_keywords = top_keywords(self.db, settings.stats_top_keywords)
+            stats = build_stats(
+                read_stats_rows(self.db),
+                most_popular_keywords=[keyword for keyword, _ in popular_keywords]
             )
+            stats_cache.set(engine, stats)
             
-            logger.info(f"Получена статистика: {total_topics} тем")
+            logger.info(f"Получена статистика: {stats.total_topics} тем")
             return stats
             
         except Exception as e:
             logger.error(f"Ошибка получения статистики: {e}")
             raise
+    
+    async def get_top_keywords(self, limit: int = 10,
+                               field: Optional[str] = None,
+                               level: Optional[EducationLevel] = None) -> List[Tuple[str, int]]:
+        """
+        Популярные ключевые слова
+        
+        Args:
+            limit: Количество ключевых слов
+            field: Фильтр по области знаний
+            level: Фильтр по уровню образования
+            
+        Returns:
+            Пары (ключевое слово, количество тем)
+        """
+        return self._get_top_keywords(limit, field, level)
+    
+    def _get_top_keywords(self, limit: int = 10,
+                          field: Optional[str] = None,
+                          level: Optional[EducationLevel] = None) -> List[Tuple[str, int]]:
+        try:
+            return top_keywords(self.db, limit, field=field, level=level)
+            
+        except Exception as e:
+            logger.error(f"Ошибка получения ключевых слов: {e}")
+            raise
+    
+    async def get_titles_after(
+        self, after_id: int = 0, limit: int = 10000
+    ) -> List[Tuple[int, str]]:
+        """Пары (ID, название) тем с ID больше after_id в порядке ID"""
+        return self._get_titles_after(after_id, limit)
+    
+    def _get_titles_after(self, after_id: int = 0, limit: int = 10000) -> List[Tuple[int, str]]:
+        try:
+            rows = self.db.query(TopicDB.id, TopicDB.title).filter(
+                TopicDB.id > after_id
+            ).order_by(TopicDB.id).limit(limit).all()
+            return [(topic_id, title) for topic_id, title in rows]
+            
+        except Exception as e:
+            logger.error(f"Ошибка загрузки названий тем после ID {after_id}: {e}")
+            raise
+    
+    async def get_topic_texts_after(self, after_id: int = 0,
+                                    limit: int = 10000) -> List[Tuple[int, str, Optional[str]]]:
+        """Тройки (ID, название, описание) тем с ID больше after_id в порядке ID"""
+        return self._get_topic_texts_after(after_id, limit)
+    
+    def _get_topic_texts_after(self, after_id: int = 0,
+                               limit: int = 10000) -> List[Tuple[int, str, Optional[str]]]:
+        try:
+            rows = self.db.query(TopicDB.id, TopicDB.title, TopicDB.description).filter(
+                TopicDB.id > after_id
+            ).order_by(TopicDB.id).limit(limit).all()
+            return [(topic_id, title, description) for topic_id, title, description in rows]
+            
+        except Exception as e:
+            logger.error(f"Ошибка загрузки текстов тем после ID {after_id}: {e}")
+            raise
+    
+    def _invalidate_stats(self) -> None:
+        """Сброс кэша статистики после изменения тем"""
+        stats_cache.invalidate(self.db.get_bind())
+
+
+class BufferedTopicWriter:
+    """
+    Групповая запись тем из параллельных задач
+
+    Интерфейс create_topics_bulk совместим с репозиторием: вызов
+    возвращается, когда темы сохранены, и возвращает их с ID. Записи
+    выполняются по одной (сессию репозитория нельзя использовать из
+    нескольких задач одновременно); темы, пришедшие во время записи,
+    сохраняются следующей записью одним INSERT (не больше flush_size тем,
+    но пакет вызова не делится). Синхронный репозиторий пишет в отдельном
+    потоке, чтобы во время записи другие задачи могли пополнять очередь.
+    """
+
+    def __init__(self, repository: Union["TopicRepository", "AsyncTopicRepository"],
+                 flush_size: int = 200):
+        self.repository = repository
+        self.flush_size = flush_size
+        self.written = 0
+        self.flushes = 0
+        self._pending: List[Tuple[List[VKRTopic], asyncio.Future]] = []
+        self._lock = asyncio.Lock()
+
+    async def create_topics_bulk(self, topics: List[VKRTopic]) -> List[VKRTopic]:
+        """
+        Сохранение тем вместе с темами других задач
+
+        Raises:
+            Exception: Ошибка записи именно этих тем
+        """
+        if not topics:
+            return []
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((topics, future))
+        async with self._lock:
+            while not future.done():
+                await self._write()
+        return future.result()
+
+    async def flush(self) -> None:
+        """Сохранение тем, оставшихся в очереди"""
+        async with self._lock:
+            while self._pending:
+                await self._write()
+
+    async def _write(self) -> None:
+        """
+        Запись начала очереди одним INSERT
+
+        Если пакет не записался, темы каждой задачи записываются отдельно:
+        исключение получает только задача, чьи темы не удалось сохранить.
+        """
+        batch = []
+        size = 0
+        while self._pending and (not batch or size + len(self._pending[0][0]) <= self.flush_size):
+            entry = self._pending.pop(0)
+            batch.append(entry)
+            size += len(entry[0])
+        try:
+            created = await self._insert([topic for topics, _ in batch for topic in topics])
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            logger.warning(
+                f"Пакет из {len(batch)} записей не сохранен ({e}), записи сохраняются по одной"
+            )
+            for topics, future in batch:
+                try:
+                    future.set_result(await self._insert(topics))
+                except Exception as error:
+                    future.set_exception(error)
+            return
+
+        position = 0
+        for topics, future in batch:
+            future.set_result(created[position:position + len(topics)])
+            position += len(topics)
+
+    async def _insert(self, topics: List[VKRTopic]) -> List[VKRTopic]:
+        if isinstance(self.repository, TopicRepository):
+            created = await asyncio.to_thread(self.repository._create_topics_bulk, topics)
+        else:
+            created = await self.repository.create_topics_bulk(topics)
+        self.written += len(created)
+        self.flushes += 1
+        return created
+
+
+@asynccontextmanager
+async def repository_scope() -> AsyncIterator[Union["TopicRepository", "AsyncTopicRepository"]]:
+    """
+    Репозиторий на время блока (для фоновых задач вне запроса)
+
+    При settings.db_async используется AsyncSession и асинхронный драйвер.
+    """
+    if settings.db_async:
+        from .async_repository import AsyncTopicRepository
+
+        async with async_session_scope() as db:
+            yield AsyncTopicRepository(db)
+    else:
+        with session_scope() as db:
+            yield TopicRepository(db)
 
 
 # Зависимость для получения репозитория
-def get_db() -> TopicRepository:
-    """Получение экземпляра репозитория"""
-    from sqlalchemy import create_engine
-    from sqlalchemy.orm import sessionmaker
-    from ..config import settings
-    
-    engine = create_engine(settings.database_url)
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    
-    db = SessionLocal()
-    try:
-        return TopicRepository(db)
-    finally:
-        db.close()
+async def get_db() -> AsyncIterator[Union["TopicRepository", "AsyncTopicRepository"]]:
+    """
+    Получение экземпляра репозитория на время запроса
+
+    Сессия берется из общего пула и закрывается после отправки ответа.
+    """
+    async with repository_scope() as repository:
+        yield repository
@@ -0,0 +1,216 @@
+"""
+Полнотекстовый поиск тем ВКР
+
+Бэкенды:
+- SQLite: виртуальная таблица FTS5, синхронизируемая триггерами;
+- PostgreSQL: tsvector с русской морфологией и GIN-индексом;
+- LIKE: прежний поиск подстроки (для остальных СУБД или по настройке).
+"""
+
+import re
+from typing import Optional
+from sqlalchemy import event, inspect, literal_column, or_, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Query
+from loguru import logger
+
+from .models import TopicDB
+from ..config import settings
+
+
+TOPICS_TABLE = TopicDB.__tablename__
+FTS_TABLE = f"{TOPICS_TABLE}_fts"
+
+# Слова запроса (буквы и цифры любого алфавита)
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class SearchBackend:
+    """Базовый бэкенд поиска: подстрока без ранжирования"""
+
+    name = "like"
+
+    def install(self, connection: Connection) -> None:
+        """Создание индексов поиска (идемпотентно)"""
+
+    def uninstall(self, connection: Connection) -> None:
+        """Удаление индексов поиска"""
+
+    def apply(self, query: Query, search_text: str) -> Query:
+        """
+        Добавление условия поиска и сортировки по релевантности
+
+        Args:
+            query: Запрос к TopicDB
+            search_text: Поисковая строка пользователя
+
+        Returns:
+            Запрос с фильтром
+        """
+        search_term = f"%{search_text}%"
+        return query.filter(
+            or_(
+                TopicDB.title.ilike(search_term),
+                TopicDB.description.ilike(search_term),
+                TopicDB.methodology.ilike(search_term)
+            )
+        )
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """Поиск через SQLite FTS5 с ранжированием bm25"""
+
+    name = "sqlite_fts5"
+
+    DDL = [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+            title, description, methodology,
+            content='{TOPICS_TABLE}', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )""",
+        f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {TOPICS_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, title, description, methodology)
+            VALUES (new.id, new.title, new.description, new.methodology);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {TOPICS_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description, methodology)
+            VALUES ('delete', old.id, old.title, old.description, old.methodology);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+        AFTER UPDATE OF title, description, methodology ON {TOPICS_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description, methodology)
+            VALUES ('delete', old.id, old.title, old.description, old.methodology);
+            INSERT INTO {FTS_TABLE}(rowid, title, description, methodology)
+            VALUES (new.id, new.title, new.description, new.methodology);
+        END""",
+    ]
+
+    def install(self, connection: Connection) -> None:
+        existed = inspect(connection).has_table(FTS_TABLE)
+        for statement in self.DDL:
+            connection.exec_driver_sql(statement)
+
+        if not existed:
+            # Индексация тем, созданных до появления FTS-таблицы
+            connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+    def uninstall(self, connection: Connection) -> None:
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+    @staticmethod
+    def build_match_query(search_text: str) -> Optional[str]:
+        """
+        Построение выражения MATCH из пользовательской строки
+
+        В SQLite нет русского стеммера, поэтому окончания длинных слов
+        отбрасываются и используется префиксный поиск ("обучение" -> "обучен"*).
+        """
+        terms = []
+        for token in _TOKEN_RE.findall(search_text.lower()):
+            if not token.isalpha():
+                pass
+            elif len(token) >= 6:
+                token = token[:-2]
+            elif len(token) == 5:
+                token = token[:-1]
+            terms.append(f'"{token}"*')
+
+        return " ".join(terms) if terms else None
+
+    def apply(self, query: Query, search_text: str) -> Query:
+        match_query = self.build_match_query(search_text)
+        if match_query is None:
+            return query
+
+        matches = (
+            select(
+                literal_column("rowid").label("topic_id"),
+                literal_column("rank").label("rank")
+            )
+            .select_from(text(FTS_TABLE))
+            .where(text(f"{FTS_TABLE} MATCH :fts_query").bindparams(fts_query=match_query))
+            .subquery()
+        )
+        return query.join(matches, TopicDB.id == matches.c.topic_id).order_by(matches.c.rank)
+
+
+class PostgresFullTextBackend(SearchBackend):
+    """Поиск через tsvector (русская морфология) с GIN-индексом и ts_rank"""
+
+    name = "postgres_tsvector"
+
+    # Выражение должно совпадать с индексным, чтобы планировщик использовал GIN
+    VECTOR_SQL = (
+        "to_tsvector('russian'::regconfig, "
+        "coalesce(title, '') || ' ' || coalesce(description, '') || ' ' || "
+        "coalesce(methodology, ''))"
+    )
+    INDEX_NAME = f"ix_{TOPICS_TABLE}_fts"
+
+    def install(self, connection: Connection) -> None:
+        connection.exec_driver_sql(
+            f"CREATE INDEX IF NOT EXISTS {self.INDEX_NAME} ON {TOPICS_TABLE} "
+            f"USING gin ({self.VECTOR_SQL})"
+        )
+
+    def uninstall(self, connection: Connection) -> None:
+        connection.exec_driver_sql(f"DROP INDEX IF EXISTS {self.INDEX_NAME}")
+
+    def apply(self, query: Query, search_text: str) -> Query:
+        if not _TOKEN_RE.search(search_text):
+            return query
+
+        ts_query = "websearch_to_tsquery('russian'::regconfig, :ts_query)"
+        return (
+            query.filter(text(f"{self.VECTOR_SQL} @@ {ts_query}"))
+            .order_by(text(f"ts_rank({self.VECTOR_SQL}, {ts_query}) DESC"))
+            .params(ts_query=search_text)
+        )
+
+
+_BACKENDS = {
+    "sqlite": SQLiteFTS5Backend,
+    "postgresql": PostgresFullTextBackend,
+}
+
+
+def get_search_backend(dialect_name: str) -> SearchBackend:
+    """
+    Выбор бэкенда поиска для СУБД
+
+    Args:
+        dialect_name: Имя диалекта SQLAlchemy (sqlite, postgresql, ...)
+
+    Returns:
+        Бэкенд поиска (LIKE, если полнотекстовый не поддерживается или отключен)
+    """
+    if settings.search_backend == "like":
+        return SearchBackend()
+
+    backend_cls = _BACKENDS.get(dialect_name, SearchBackend)
+    return backend_cls()
+
+
+def ensure_search_index(connection: Connection) -> None:
+    """
+    Создание индексов поиска для уже существующей базы данных
+
+    Args:
+        connection: Соединение (для AsyncConnection - через run_sync)
+    """
+    if inspect(connection).has_table(TOPICS_TABLE):
+        backend = get_search_backend(connection.dialect.name)
+        backend.install(connection)
+        logger.info(f"Индекс поиска готов: {backend.name}")
+
+
+@event.listens_for(TopicDB.__table__, "after_create")
+def _install_search_index(target, connection: Connection, **kw) -> None:
+    """Создание индексов поиска вместе с таблицей тем"""
+    get_search_backend(connection.dialect.name).install(connection)
+
+
+@event.listens_for(TopicDB.__table__, "before_drop")
+def _uninstall_search_index(target, connection: Connection, **kw) -> None:
+    """Удаление индексов поиска вместе с таблицей тем"""
+    get_search_backend(connection.dialect.name).uninstall(connection)
@@ -0,0 +1,218 @@
+"""
+Статистика по темам: счетчики, поддерживаемые триггерами, и TTL-кэш
+
+Триггеры на vkr_topics обновляют vkr_topic_stats при вставке, изменении
+и удалении тем, поэтому /stats читает десятки строк счетчиков вместо
+агрегации всей таблицы. Для СУБД без триггеров используется один
+сгруппированный запрос по таблице тем.
+"""
+
+import time
+import threading
+import weakref
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+from sqlalchemy import event, func, inspect
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from loguru import logger
+
+from .models import Base, TopicDB, TopicStatsCounter
+from ..models import TopicStats
+from ..config import settings
+
+
+TOPICS_TABLE = TopicDB.__tablename__
+STATS_TABLE = TopicStatsCounter.__tablename__
+
+# Изменение счетчиков для строки темы (new/old - псевдозаписи триггера)
+_UPSERT_SQL = f"""INSERT INTO {STATS_TABLE}(
+                field, level, status, topic_count, relevance_sum, relevance_count
+            )
+            VALUES ({{row}}.field, {{row}}.level, {{row}}.status, 1,
+                    coalesce({{row}}.relevance_score, 0), {{has_relevance}})
+            ON CONFLICT(field, level, status) DO UPDATE SET
+                topic_count = {STATS_TABLE}.topic_count + 1,
+                relevance_sum = {STATS_TABLE}.relevance_sum + excluded.relevance_sum,
+                relevance_count = {STATS_TABLE}.relevance_count + excluded.relevance_count"""
+
+_DECREMENT_SQL = f"""UPDATE {STATS_TABLE} SET
+                topic_count = topic_count - 1,
+                relevance_sum = relevance_sum - coalesce({{row}}.relevance_score, 0),
+                relevance_count = relevance_count - {{has_relevance}}
+            WHERE field = {{row}}.field AND level = {{row}}.level AND status = {{row}}.status"""
+
+_TRIGGER_COLUMNS = "field, level, status, relevance_score"
+
+_SQLITE_DDL = [
+    f"""CREATE TRIGGER IF NOT EXISTS {STATS_TABLE}_ai AFTER INSERT ON {TOPICS_TABLE} BEGIN
+        {_UPSERT_SQL.format(row="new", has_relevance="new.relevance_score IS NOT NULL")};
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {STATS_TABLE}_ad AFTER DELETE ON {TOPICS_TABLE} BEGIN
+        {_DECREMENT_SQL.format(row="old", has_relevance="(old.relevance_score IS NOT NULL)")};
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {STATS_TABLE}_au
+    AFTER UPDATE OF {_TRIGGER_COLUMNS} ON {TOPICS_TABLE} BEGIN
+        {_DECREMENT_SQL.format(row="old", has_relevance="(old.relevance_score IS NOT NULL)")};
+        {_UPSERT_SQL.format(row="new", has_relevance="new.relevance_score IS NOT NULL")};
+    END""",
+]
+
+_POSTGRES_DDL = [
+    f"""CREATE OR REPLACE FUNCTION {STATS_TABLE}_apply() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            {_DECREMENT_SQL.format(
+                row="OLD", has_relevance="(OLD.relevance_score IS NOT NULL)::int"
+            )};
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            {_UPSERT_SQL.format(row="NEW", has_relevance="(NEW.relevance_score IS NOT NULL)::int")};
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    f"DROP TRIGGER IF EXISTS {STATS_TABLE}_trigger ON {TOPICS_TABLE}",
+    f"""CREATE TRIGGER {STATS_TABLE}_trigger
+    AFTER INSERT OR DELETE OR UPDATE OF {_TRIGGER_COLUMNS} ON {TOPICS_TABLE}
+    FOR EACH ROW EXECUTE FUNCTION {STATS_TABLE}_apply()""",
+]
+
+_COUNTER_DDL = {
+    "sqlite": _SQLITE_DDL,
+    "postgresql": _POSTGRES_DDL,
+}
+
+# Строка агрегата: (field, level, status, count, relevance_sum, relevance_count)
+StatsRow = Tuple[str, object, object, int, Optional[float], int]
+
+
+def counters_supported(dialect_name: str) -> bool:
+    """Поддерживаются ли триггеры счетчиков для СУБД"""
+    return dialect_name in _COUNTER_DDL
+
+
+def install_stats_counters(connection: Connection) -> None:
+    """
+    Создание таблицы счетчиков и триггеров (идемпотентно)
+
+    Если таблица счетчиков пуста, а темы уже есть, счетчики
+    заполняются одним сгруппированным запросом.
+
+    Args:
+        connection: Соединение (для AsyncConnection - через run_sync)
+    """
+    dialect_name = connection.dialect.name
+    if not counters_supported(dialect_name) or not inspect(connection).has_table(TOPICS_TABLE):
+        return
+
+    TopicStatsCounter.__table__.create(connection, checkfirst=True)
+    for statement in _COUNTER_DDL[dialect_name]:
+        connection.exec_driver_sql(statement)
+
+    has_counters = connection.execute(TopicStatsCounter.__table__.select().limit(1)).first()
+    if has_counters is None:
+        connection.exec_driver_sql(
+            f"""INSERT INTO {STATS_TABLE}(
+                field, level, status, topic_count, relevance_sum, relevance_count
+            )
+            SELECT field, level, status, count(*),
+                coalesce(sum(relevance_score), 0), count(relevance_score)
+            FROM {TOPICS_TABLE} GROUP BY field, level, status"""
+        )
+        logger.info("Счетчики статистики заполнены по таблице тем")
+
+
+def read_stats_rows(session: Session) -> Iterable[StatsRow]:
+    """
+    Чтение агрегатов по (область, уровень, статус)
+
+    Args:
+        session: Сессия базы данных
+
+    Returns:
+        Строки агрегатов из счетчиков или одного сгруппированного запроса
+    """
+    if counters_supported(session.get_bind().dialect.name):
+        return session.query(
+            TopicStatsCounter.field,
+            TopicStatsCounter.level,
+            TopicStatsCounter.status,
+            TopicStatsCounter.topic_count,
+            TopicStatsCounter.relevance_sum,
+            TopicStatsCounter.relevance_count
+        ).filter(TopicStatsCounter.topic_count > 0).all()
+
+    return session.query(
+        TopicDB.field,
+        TopicDB.level,
+        TopicDB.status,
+        func.count(TopicDB.id),
+        func.sum(TopicDB.relevance_score),
+        func.count(TopicDB.relevance_score)
+    ).group_by(TopicDB.field, TopicDB.level, TopicDB.status).all()
+
+
+def build_stats(rows: Iterable[StatsRow], most_popular_keywords: Sequence[str] = ()) -> TopicStats:
+    """Сборка TopicStats из строк агрегатов за один проход"""
+    total_topics = 0
+    by_field: Dict[str, int] = {}
+    by_level: Dict[object, int] = {}
+    by_status: Dict[object, int] = {}
+    relevance_sum = 0.0
+    relevance_count = 0
+
+    for field, level, status, count, group_relevance_sum, group_relevance_count in rows:
+        total_topics += count
+        by_field[field] = by_field.get(field, 0) + count
+        by_level[level] = by_level.get(level, 0) + count
+        by_status[status] = by_status.get(status, 0) + count
+        relevance_sum += group_relevance_sum or 0.0
+        relevance_count += group_relevance_count or 0
+
+    return TopicStats(
+        total_topics=total_topics,
+        by_field=by_field,
+        by_level=by_level,
+        by_status=by_status,
+        avg_relevance_score=relevance_sum / relevance_count if relevance_count else None,
+        most_popular_keywords=list(most_popular_keywords)
+    )
+
+
+class StatsCache:
+    """TTL-кэш статистики для каждого движка, сбрасывается при записи"""
+
+    def __init__(self):
+        self._entries: "weakref.WeakKeyDictionary[Engine, Tuple[float, TopicStats]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+
+    def get(self, engine: Engine) -> Optional[TopicStats]:
+        """Статистика из кэша, если она еще не устарела"""
+        with self._lock:
+            entry = self._entries.get(engine)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, engine: Engine, stats: TopicStats) -> None:
+        """Сохранение статистики на settings.stats_cache_ttl секунд"""
+        if settings.stats_cache_ttl <= 0:
+            return
+        with self._lock:
+            self._entries[engine] = (time.monotonic() + settings.stats_cache_ttl, stats)
+
+    def invalidate(self, engine: Engine) -> None:
+        """Сброс кэша после изменения тем"""
+        with self._lock:
+            self._entries.pop(engine, None)
+
+
+stats_cache = StatsCache()
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _install_on_create(target, connection: Connection, **kw) -> None:
+    """Создание триггеров счетчиков после всех таблиц (триггеры ссылаются на обе)"""
+    install_stats_counters(connection)
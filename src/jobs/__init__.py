@@ -0,0 +1,10 @@
+"""
+Фоновые задачи генерации тем и фоновое пополнение запаса тем
+"""
+
+from .manager import Job, JobStatus, JobManager, JobQueueFullError
+from .batch import run_bounded
+from .topic_pool import TopicPool, create_topic_pool
+
+__all__ = ["Job", "JobStatus", "JobManager", "JobQueueFullError", "run_bounded",
+           "TopicPool", "create_topic_pool"]
@@ -0,0 +1,48 @@
+"""
+Выполнение пакета операций с ограничением параллельности
+"""
+
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Sequence, Tuple, TypeVar, Union
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+async def run_bounded(
+    items: Sequence[T],
+    operation: Callable[[T], Awaitable[R]],
+    concurrency: int
+) -> AsyncIterator[Tuple[int, Union[R, Exception]]]:
+    """
+    Выполнение операции для каждого элемента, не более concurrency одновременно
+
+    Результаты выдаются по мере готовности (не в порядке элементов).
+    Ошибка одного элемента не прерывает остальные.
+
+    Args:
+        items: Элементы пакета
+        operation: Операция над элементом
+        concurrency: Максимум одновременно выполняемых операций
+
+    Yields:
+        (индекс элемента, результат или исключение)
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(index: int, item: T) -> Tuple[int, Union[R, Exception]]:
+        async with semaphore:
+            try:
+                return index, await operation(item)
+            except Exception as e:
+                return index, e
+
+    tasks = [asyncio.create_task(run(index, item)) for index, item in enumerate(items)]
+    try:
+        for completed in asyncio.as_completed(tasks):
+            yield await completed
+    finally:
+        # Клиент отключился - оставшиеся операции не нужны
+        for task in tasks:
+            task.cancel()
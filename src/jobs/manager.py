@@ -0,0 +1,217 @@
+"""
+Фоновые задачи генерации с ограниченным пулом обработчиков
+
+Задача ставится в очередь и сразу получает идентификатор; фиксированное
+число asyncio-обработчиков выполняет задачи по очереди. Завершенные
+задачи хранятся в памяти ограниченное время для опроса статуса.
+"""
+
+import asyncio
+import statistics
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from loguru import logger
+
+
+class JobStatus(str, Enum):
+    """Статус фоновой задачи"""
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class JobQueueFullError(Exception):
+    """Очередь задач заполнена"""
+
+
+@dataclass
+class Job:
+    """Фоновая задача"""
+    id: str
+    kind: str
+    operation: Callable[[], Awaitable[Any]] = field(repr=False)
+    status: JobStatus = JobStatus.QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+    done: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def wait_time(self) -> Optional[float]:
+        """Время ожидания в очереди (секунды)"""
+        if self.started_at is None:
+            return None
+        return self.started_at - self.created_at
+
+    @property
+    def run_time(self) -> Optional[float]:
+        """Время выполнения (секунды)"""
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+
+def _percentile(samples: List[float], percent: int) -> Optional[float]:
+    if not samples:
+        return None
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method="inclusive")[percent - 1]
+
+
+class JobManager:
+    """Очередь фоновых задач и пул обработчиков"""
+
+    def __init__(self, workers: int = 4, queue_size: int = 100, retention: int = 1000):
+        """
+        Args:
+            workers: Количество одновременно выполняемых задач
+            queue_size: Максимум задач в очереди (сверх - JobQueueFullError)
+            retention: Сколько последних завершенных задач хранить для опроса
+        """
+        self.workers = workers
+        self.retention = retention
+
+        self._queue: "asyncio.Queue[Job]" = asyncio.Queue(maxsize=queue_size)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._worker_tasks: List[asyncio.Task] = []
+        self._running = 0
+
+        self._submitted = 0
+        self._succeeded = 0
+        self._failed = 0
+        self._rejected = 0
+        self._wait_times: Deque[float] = deque(maxlen=1000)
+        self._run_times: Deque[float] = deque(maxlen=1000)
+
+    def start(self) -> None:
+        """Запуск обработчиков в текущем event loop (идемпотентно)"""
+        if self._worker_tasks:
+            return
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(), name=f"job-worker-{number}")
+            for number in range(self.workers)
+        ]
+        logger.info(f"Запущено обработчиков фоновых задач: {self.workers}")
+
+    async def stop(self) -> None:
+        """Остановка обработчиков (незавершенные задачи прерываются)"""
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    def submit(self, kind: str, operation: Callable[[], Awaitable[Any]]) -> Job:
+        """
+        Постановка задачи в очередь
+
+        Args:
+            kind: Тип задачи (для журнала и метрик)
+            operation: Фабрика корутины, результат которой станет результатом задачи
+
+        Returns:
+            Задача в статусе queued
+
+        Raises:
+            JobQueueFullError: Если очередь заполнена
+        """
+        self.start()
+
+        job = Job(id=str(uuid.uuid4()), kind=kind, operation=operation)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._rejected += 1
+            raise JobQueueFullError(f"Очередь задач заполнена ({self._queue.maxsize})")
+
+        self._jobs[job.id] = job
+        self._submitted += 1
+        self._forget_finished()
+        logger.info(f"Задача {job.id} ({kind}) поставлена в очередь, глубина {self._queue.qsize()}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Задача по идентификатору"""
+        return self._jobs.get(job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        """
+        Ожидание завершения задачи (long-poll)
+
+        Args:
+            job_id: Идентификатор задачи
+            timeout: Максимальное время ожидания (секунды)
+
+        Returns:
+            Задача в текущем статусе или None, если задача не найдена
+        """
+        job = self.get(job_id)
+        if job is None or timeout <= 0:
+            return job
+
+        try:
+            await asyncio.wait_for(job.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            job.status = JobStatus.RUNNING
+            job.started_at = time.time()
+            self._running += 1
+            self._wait_times.append(job.wait_time)
+
+            try:
+                job.result = await job.operation()
+                job.status = JobStatus.SUCCEEDED
+                self._succeeded += 1
+            except asyncio.CancelledError:
+                job.status = JobStatus.FAILED
+                job.error = "Задача прервана при остановке сервиса"
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка фоновой задачи {job.id}: {e}")
+                job.status = JobStatus.FAILED
+                job.error = str(e)
+                self._failed += 1
+            finally:
+                job.finished_at = time.time()
+                self._running -= 1
+                self._run_times.append(job.run_time)
+                job.done.set()
+                self._queue.task_done()
+
+    def _forget_finished(self) -> None:
+        """Удаление самых старых завершенных задач сверх retention"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.done.is_set()]
+        for job_id in finished[:max(0, len(finished) - self.retention)]:
+            del self._jobs[job_id]
+
+    def metrics(self) -> Dict[str, Any]:
+        """Метрики очереди: глубина, время ожидания и выполнения"""
+        wait_times = list(self._wait_times)
+        run_times = list(self._run_times)
+        return {
+            "workers": self.workers,
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "running": self._running,
+            "submitted": self._submitted,
+            "succeeded": self._succeeded,
+            "failed": self._failed,
+            "rejected": self._rejected,
+            "wait_time_p50": _percentile(wait_times, 50),
+            "wait_time_p95": _percentile(wait_times, 95),
+            "run_time_p50": _percentile(run_times, 50),
+            "run_time_p95": _percentile(run_times, 95)
+        }
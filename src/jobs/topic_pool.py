@@ -0,0 +1,282 @@
+"""
+Запас заранее сгенерированных тем для популярных сочетаний области и уровня
+
+Запросы генерации без персонального контекста (специализации,
+предпочтений студента, контекста кафедры) для популярных сочетаний
+(область, уровень) обслуживаются из запаса без вызова модели.
+Популярность - число таких запросов с экспоненциальным затуханием;
+в запас попадают только области из settings.supported_fields.
+
+Фоновый планировщик пополняет запас сочетания до capacity тем, когда
+в нем остается меньше low_watermark. Темы проверяются на дубликаты
+при пополнении и еще раз при выдаче (за это время в базе могли
+появиться похожие), выдаются один раз и хранятся не дольше ttl.
+"""
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from ..agents import TopicGenerationConfig
+from ..config import settings
+from ..models import VKRTopic
+
+
+# (область, уровень образования)
+PoolKey = Tuple[str, str]
+
+# Генерация тем для запаса: конфигурация и названия тем, уже лежащих в запасе
+GenerateTopics = Callable[[TopicGenerationConfig, List[str]], Awaitable[List[VKRTopic]]]
+# Проверка тем перед выдачей: True - тема все еще не совпадает с сохраненными
+CheckTopics = Callable[[List[VKRTopic]], Awaitable[List[bool]]]
+
+
+@dataclass
+class _PooledTopic:
+    topic: VKRTopic
+    created_at: float
+
+
+class TopicPool:
+    """Запас тем по сочетаниям (область, уровень) с фоновым пополнением"""
+
+    def __init__(
+        self,
+        generate: GenerateTopics,
+        fields: Sequence[str],
+        check: Optional[CheckTopics] = None,
+        capacity: int = 30,
+        low_watermark: int = 10,
+        batch_size: int = 10,
+        hot_combos: int = 5,
+        min_requests: float = 3.0,
+        ttl: float = 86400.0,
+        interval: float = 60.0,
+        demand_half_life: float = 3600.0
+    ):
+        """
+        Args:
+            generate: Генерация тем для запаса (без дубликатов)
+            fields: Области, для которых ведется запас
+            check: Проверка тем перед выдачей (None - без проверки)
+            capacity: До скольких тем пополняется запас сочетания
+            low_watermark: Меньше скольких тем запас пополняется
+            batch_size: Тем за один вызов модели при пополнении
+            hot_combos: Для скольких самых популярных сочетаний ведется запас
+            min_requests: Минимальная популярность сочетания для запаса
+            ttl: Сколько секунд тема хранится в запасе
+            interval: Период проверки запаса планировщиком (секунды)
+            demand_half_life: За сколько секунд популярность уменьшается вдвое
+        """
+        self.generate = generate
+        self.fields = frozenset(fields)
+        self.check = check
+        self.capacity = capacity
+        self.low_watermark = low_watermark
+        self.batch_size = batch_size
+        self.hot_combos = hot_combos
+        self.min_requests = min_requests
+        self.ttl = ttl
+        self.interval = interval
+        self.demand_half_life = demand_half_life
+
+        self._pools: Dict[PoolKey, Deque[_PooledTopic]] = {}
+        self._demand: Dict[PoolKey, float] = {}
+        self._demand_time = time.monotonic()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self._hits = 0
+        self._misses = 0
+        self._served_topics = 0
+        self._discarded = 0
+        self._expired = 0
+        self._refill_calls = 0
+        self._refill_errors = 0
+        self._refill_time = 0.0
+        self._generated = 0
+
+    def key(self, config: TopicGenerationConfig) -> Optional[PoolKey]:
+        """Сочетание запроса или None, если запрос нельзя обслужить из запаса"""
+        if (config.field not in self.fields or config.specialization
+                or config.student_preferences is not None or config.department_context is not None
+                or config.language != "ru"
+                or not config.include_trends or not config.include_methodology
+                or config.count > self.capacity):
+            return None
+        return config.field, getattr(config.level, "value", config.level)
+
+    async def take(self, config: TopicGenerationConfig) -> Optional[List[VKRTopic]]:
+        """
+        Выдача тем из запаса
+
+        Args:
+            config: Конфигурация генерации
+
+        Returns:
+            config.count тем или None (запрос нельзя обслужить из запаса или тем не хватает)
+        """
+        key = self.key(config)
+        if key is None:
+            return None
+        self._decay_demand()
+        self._demand[key] = self._demand.get(key, 0.0) + 1.0
+
+        queue = self._pools.get(key)
+        while True:
+            if queue is not None:
+                self._drop_expired(queue)
+            if queue is None or len(queue) < config.count:
+                self._misses += 1
+                self._wakeup.set()
+                return None
+
+            items = [queue.popleft() for _ in range(config.count)]
+            if self.check is not None:
+                keep = await self.check([item.topic for item in items])
+                kept = [item for item, accepted in zip(items, keep) if accepted]
+                if len(kept) < len(items):
+                    # Совпавшие темы выбрасываются, остальные возвращаются в начало запаса
+                    self._discarded += len(items) - len(kept)
+                    queue.extendleft(reversed(kept))
+                    continue
+
+            self._hits += 1
+            self._served_topics += len(items)
+            if len(queue) < self.low_watermark:
+                self._wakeup.set()
+            return [item.topic for item in items]
+
+    def hot_keys(self) -> List[PoolKey]:
+        """Самые популярные сочетания (по убыванию популярности)"""
+        self._decay_demand()
+        ranked = sorted(self._demand.items(), key=lambda item: -item[1])
+        return [key for key, demand in ranked[:self.hot_combos] if demand >= self.min_requests]
+
+    async def refill(self) -> int:
+        """
+        Пополнение запаса популярных сочетаний, в которых меньше low_watermark тем
+
+        Returns:
+            Сколько тем добавлено
+        """
+        added = 0
+        for key in self.hot_keys():
+            queue = self._pools.setdefault(key, deque())
+            self._drop_expired(queue)
+            if len(queue) >= self.low_watermark:
+                continue
+
+            while len(queue) < self.capacity:
+                field, level = key
+                config = TopicGenerationConfig(
+                    field=field,
+                    level=level,
+                    count=min(self.batch_size, self.capacity - len(queue))
+                )
+                start_time = time.perf_counter()
+                try:
+                    topics = await self.generate(config, [item.topic.title for item in queue])
+                except Exception as e:
+                    self._refill_errors += 1
+                    logger.warning(f"Ошибка пополнения запаса тем {field}/{level}: {e}")
+                    break
+                finally:
+                    self._refill_calls += 1
+                    self._refill_time += time.perf_counter() - start_time
+                if not topics:
+                    break
+                topics = topics[:self.capacity - len(queue)]
+                now = time.time()
+                queue.extend(_PooledTopic(topic, now) for topic in topics)
+                self._generated += len(topics)
+                added += len(topics)
+
+        if added:
+            logger.info(f"Запас тем пополнен на {added} тем")
+        return added
+
+    def start(self) -> None:
+        """Запуск планировщика пополнения в текущем event loop (идемпотентно)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="topic-pool-refill")
+
+    async def stop(self) -> None:
+        """Остановка планировщика"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.refill()
+            except Exception as e:
+                logger.error(f"Ошибка планировщика запаса тем: {e}")
+
+    def _drop_expired(self, queue: Deque[_PooledTopic]) -> None:
+        """Удаление устаревших тем (в начале очереди - самые старые)"""
+        deadline = time.time() - self.ttl
+        while queue and queue[0].created_at < deadline:
+            queue.popleft()
+            self._expired += 1
+
+    def _decay_demand(self) -> None:
+        now = time.monotonic()
+        factor = 0.5 ** ((now - self._demand_time) / self.demand_half_life)
+        self._demand_time = now
+        for key in self._demand:
+            self._demand[key] *= factor
+
+    def metrics(self) -> Dict[str, Any]:
+        """Метрики запаса: доля попаданий, размер по сочетаниям и стоимость пополнения"""
+        requests = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_ratio": self._hits / requests if requests else 0.0,
+            "served_topics": self._served_topics,
+            "pooled": {
+                f"{field}/{level}": len(queue) for (field, level), queue in self._pools.items()
+            },
+            "hot": [f"{field}/{level}" for field, level in self.hot_keys()],
+            "discarded_duplicates": self._discarded,
+            "expired": self._expired,
+            "refill_calls": self._refill_calls,
+            "refill_errors": self._refill_errors,
+            "refill_seconds": round(self._refill_time, 3),
+            "generated_topics": self._generated,
+            "refill_seconds_per_topic": (
+                self._refill_time / self._generated if self._generated else None
+            )
+        }
+
+
+def create_topic_pool(
+    generate: GenerateTopics, check: Optional[CheckTopics] = None
+) -> Optional[TopicPool]:
+    """Запас тем по настройкам (None, если запас выключен)"""
+    if not settings.topic_pool_enabled:
+        return None
+    return TopicPool(
+        generate,
+        settings.supported_fields,
+        check=check,
+        capacity=settings.topic_pool_capacity,
+        low_watermark=settings.topic_pool_low_watermark,
+        batch_size=settings.topic_pool_batch_size,
+        hot_combos=settings.topic_pool_hot_combos,
+        min_requests=settings.topic_pool_min_requests,
+        ttl=settings.topic_pool_ttl,
+        interval=settings.topic_pool_interval
+    )
@@ -0,0 +1,16 @@
+"""
+Поиск похожих тем
+"""
+
+from .minhash import MinHashLSHIndex, normalize_title, shingles, jaccard
+from .embedding import TopicEmbedder, tokenize, cosine
+from .semantic import SemanticIndex, create_semantic_index
+from .neighbours import NeighbourGraph, create_neighbour_graph
+from .dedup import DuplicateFilter, create_duplicate_filter
+
+__all__ = [
+    "MinHashLSHIndex", "normalize_title", "shingles", "jaccard",
+    "TopicEmbedder", "tokenize", "cosine", "SemanticIndex", "create_semantic_index",
+    "NeighbourGraph", "create_neighbour_graph",
+    "DuplicateFilter", "create_duplicate_filter"
+]
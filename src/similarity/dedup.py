@@ -0,0 +1,216 @@
+"""
+Отсев сгенерированных тем, почти совпадающих с уже существующими
+
+Названия всех тем из базы хранятся в MinHashLSHIndex и догружаются по
+возрастанию ID перед каждой проверкой. Темы кафедры из запроса
+(existing_topics) и уже принятые темы того же ответа проверяются по
+отдельному индексу запроса, поэтому в промпт не нужно передавать
+историю кафедры целиком.
+
+Темы, совпадающие по смыслу, но не по словам ("Разработка
+рекомендательной системы на ML" и "Создание системы рекомендаций с
+машинным обучением"), находит SemanticIndex по названию и описанию.
+Он хранится в файле и догружает из базы только темы новее сохраненных;
+когда индекс вырастает вдвое, он пересчитывается в отдельном потоке.
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from ..config import settings
+from .embedding import cosine
+from .minhash import MinHashLSHIndex
+from .semantic import SemanticIndex, create_semantic_index
+
+
+class DuplicateFilter:
+    """Проверка названий тем на почти полное совпадение с существующими"""
+
+    def __init__(self, index: MinHashLSHIndex, page_size: int = 10000,
+                 semantic: Optional[SemanticIndex] = None):
+        """
+        Args:
+            index: Индекс названий сохраненных тем
+            page_size: Сколько тем загружать из базы за один запрос
+            semantic: Индекс тем, похожих по смыслу (None - только совпадения слов)
+        """
+        self.index = index
+        self.page_size = page_size
+        self.semantic = semantic
+        self._last_id = 0
+        self._lock = asyncio.Lock()
+        self._rebuild_task: Optional[asyncio.Future] = None
+        self._checks = 0
+        self._duplicates = 0
+        self._semantic_duplicates = 0
+        self._check_time = 0.0
+
+    async def refresh(self, repository) -> int:
+        """
+        Загрузка тем, появившихся в базе после прошлой загрузки
+
+        Args:
+            repository: Репозиторий с методами get_titles_after и get_topic_texts_after
+
+        Returns:
+            Сколько названий добавлено в индекс
+        """
+        async with self._lock:
+            added = 0
+            while True:
+                rows = await repository.get_titles_after(self._last_id, self.page_size)
+                if not rows:
+                    break
+                # Частями, чтобы первая загрузка большой базы не блокировала event loop
+                for start in range(0, len(rows), 1000):
+                    added += self.index.add_many(rows[start:start + 1000])
+                    await asyncio.sleep(0)
+                self._last_id = rows[-1][0]
+                if len(rows) < self.page_size:
+                    break
+            if added:
+                logger.info(
+                    f"В индекс дубликатов добавлено {added} названий (всего {len(self.index)})"
+                )
+            if self.semantic is not None:
+                await self._refresh_semantic(repository)
+            return added
+
+    async def _refresh_semantic(self, repository) -> None:
+        """Догрузка тем новее сохраненных в семантическом индексе"""
+        semantic = self.semantic
+        added = 0
+        while True:
+            rows = await repository.get_topic_texts_after(semantic.max_topic_id, self.page_size)
+            if not rows:
+                break
+            for start in range(0, len(rows), 1000):
+                for topic_id, title, description in rows[start:start + 1000]:
+                    added += semantic.add(topic_id, title, description or "")
+                await asyncio.sleep(0)
+            if len(rows) < self.page_size:
+                break
+        if added:
+            logger.info(f"В семантический индекс добавлено {added} тем (всего {len(semantic)})")
+
+        if semantic.needs_rebuild and (self._rebuild_task is None or self._rebuild_task.done()):
+            self._rebuild_task = asyncio.ensure_future(self._rebuild_semantic())
+
+    async def _rebuild_semantic(self) -> None:
+        """Пересчет семантического индекса в отдельном потоке (поиск продолжает работать)"""
+        try:
+            await asyncio.to_thread(self.semantic.rebuild)
+        except Exception as e:
+            logger.error(f"Ошибка пересчета семантического индекса: {e}")
+
+    def add(self, topic_id: int, title: str, description: str = "") -> None:
+        """Добавление (или замена) темы"""
+        self.index.add(title, topic_id)
+        if self.semantic is not None:
+            self.semantic.add(topic_id, title, description)
+
+    def remove(self, topic_id: int) -> None:
+        """Удаление темы"""
+        self.index.remove(topic_id)
+        if self.semantic is not None:
+            self.semantic.remove(topic_id)
+
+    def save(self) -> None:
+        """Сохранение семантического индекса в файл"""
+        if self.semantic is not None and self.semantic.save():
+            logger.info(f"Семантический индекс сохранен: {len(self.semantic)} тем")
+
+    def find_duplicates(self, titles: Sequence[str], existing: Sequence[str] = (),
+                        descriptions: Optional[Sequence[str]] = None) -> List[Optional[str]]:
+        """
+        Поиск совпадений для списка новых тем
+
+        Args:
+            titles: Названия сгенерированных тем
+            existing: Названия тем кафедры из запроса
+            descriptions: Описания сгенерированных тем (для сравнения по смыслу)
+
+        Returns:
+            Для каждой темы - совпавшее с ней название (сохраненной темы,
+            темы кафедры или более ранней из titles) либо None
+        """
+        start_time = time.perf_counter()
+        local = MinHashLSHIndex(
+            threshold=self.index.threshold,
+            num_perm=self.index.num_perm,
+            bands=self.index.bands,
+            ngram=self.index.ngram
+        )
+        local.add_many((None, title) for title in existing)
+        # Темы кафедры известны только по названиям: внутри запроса сравниваются названия
+        local_vectors: List[Tuple[str, Dict[int, float]]] = []
+        if self.semantic is not None:
+            local_vectors = [(title, self.semantic.embed(title)) for title in existing]
+
+        duplicates: List[Optional[str]] = []
+        for position, title in enumerate(titles):
+            match = self.index.find(title) or local.find(title)
+            duplicate = match[1] if match is not None else None
+            title_vector = None
+            if duplicate is None and self.semantic is not None:
+                description = descriptions[position] if descriptions else ""
+                duplicate, title_vector = self._find_semantic(
+                    title, description or "", local_vectors
+                )
+                self._semantic_duplicates += duplicate is not None
+
+            if duplicate is None:
+                local.add(title)
+                if title_vector is not None:
+                    local_vectors.append((title, title_vector))
+            duplicates.append(duplicate)
+
+        self._checks += len(titles)
+        self._duplicates += sum(duplicate is not None for duplicate in duplicates)
+        self._check_time += time.perf_counter() - start_time
+        return duplicates
+
+    def _find_semantic(
+        self, title: str, description: str,
+        local_vectors: List[Tuple[str, Dict[int, float]]]
+    ) -> Tuple[Optional[str], Dict[int, float]]:
+        """Совпадение по смыслу с сохраненными темами и темами запроса"""
+        semantic = self.semantic
+        match = semantic.find(title, description)
+        title_vector = semantic.embed(title)
+        if match is not None:
+            topic_id, _ = match
+            return self.index.title(topic_id) or f"тема #{topic_id}", title_vector
+        for other_title, other_vector in local_vectors:
+            if cosine(title_vector, other_vector) >= semantic.threshold:
+                return other_title, title_vector
+        return None, title_vector
+
+    def metrics(self) -> Dict[str, Any]:
+        """Размер индекса, проверки и найденные дубликаты"""
+        return {
+            "indexed_titles": len(self.index),
+            "checks": self._checks,
+            "duplicates": self._duplicates,
+            "semantic_duplicates": self._semantic_duplicates,
+            "avg_check_ms": self._check_time / self._checks * 1000 if self._checks else None,
+            "semantic": self.semantic.metrics() if self.semantic is not None else None
+        }
+
+
+def create_duplicate_filter() -> Optional[DuplicateFilter]:
+    """Фильтр дубликатов по настройкам (None, если отсев выключен)"""
+    if not settings.dedup_enabled:
+        return None
+    return DuplicateFilter(
+        MinHashLSHIndex(
+            threshold=settings.dedup_threshold,
+            num_perm=settings.dedup_num_perm,
+            bands=settings.dedup_bands,
+            ngram=settings.dedup_ngram
+        ),
+        semantic=create_semantic_index()
+    )
@@ -0,0 +1,246 @@
+"""
+Локальные эмбеддинги тем: хешированный TF-IDF и бинарный код SimHash
+
+Текст темы (название и описание) разбивается на слова, слова
+усекаются до основы из первых символов (для русского языка это
+грубый, но быстрый стемминг), распространенные сокращения
+раскрываются, синонимы приводятся к одной основе. Признак - crc32
+основы, вес - TF-IDF; вектор хранится разреженным и нормирован.
+
+Для поиска по индексу вектор сжимается в 256-битный код SimHash:
+расстояние Хэмминга между кодами оценивает угол между векторами.
+Голосование признаков по битам выполняется сложением больших целых
+чисел, в которых каждому биту кода отведено 16-битное поле.
+"""
+
+import hashlib
+import math
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Mapping, Optional
+
+from .minhash import normalize_title
+
+
+# Длина основы слова
+STEM_LENGTH = 6
+# Длина кода SimHash в битах
+CODE_BITS = 256
+
+_LANE_BITS = 16
+_LANES = sum(1 << (_LANE_BITS * lane) for lane in range(CODE_BITS))
+_SIGN_BIT = 1 << (_LANE_BITS - 1)
+_TO_BINARY = bytes.maketrans(b"\x00\x01", b"01")
+_FROM_BINARY = bytes.maketrans(b"01", b"\x00\x01")
+_PATTERN_CACHE_SIZE = 50000
+
+_STOPWORDS = frozenset(
+    "а в во для до его ее за и из или их к как на над не о об от по под при про "
+    "с со среди у через что это также путем основе помощью рамках".split()
+)
+
+_ABBREVIATIONS = {
+    "ml": "машинное обучение",
+    "мо": "машинное обучение",
+    "ai": "искусственный интеллект",
+    "ии": "искусственный интеллект",
+    "nlp": "обработка естественного языка",
+    "cv": "компьютерное зрение",
+    "iot": "интернет вещей",
+    "бд": "база данных",
+    "субд": "система управления базами данных",
+    "нс": "нейронная сеть",
+    "инс": "искусственная нейронная сеть",
+}
+
+# Основы-синонимы приводятся к первой основе группы
+_SYNONYM_GROUPS = [
+    ("создан", "разраб", "постро", "реализ"),
+    ("исполь", "примен"),
+    ("исслед", "изучен", "анализ"),
+    ("прогно", "предск"),
+    ("оптими", "улучше"),
+]
+_SYNONYMS = {stem: group[0] for group in _SYNONYM_GROUPS for stem in group}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Основы значимых слов текста
+
+    Args:
+        text: Название или описание темы
+
+    Returns:
+        Основы в порядке появления (с повторами)
+    """
+    stems = []
+    for word in normalize_title(text).split():
+        words = _ABBREVIATIONS.get(word, word).split()
+        for part in words:
+            if part in _STOPWORDS or (len(part) < 3 and not part.isdigit()):
+                continue
+            stem = part[:STEM_LENGTH]
+            stems.append(_SYNONYMS.get(stem, stem))
+    return stems
+
+
+def feature_hash(stem: str) -> int:
+    """Признак основы (постоянный между запусками, в отличие от hash())"""
+    return zlib.crc32(stem.encode("utf-8"))
+
+
+def cosine(first: Mapping[int, float], second: Mapping[int, float]) -> float:
+    """Косинусное сходство нормированных разреженных векторов"""
+    if len(first) > len(second):
+        first, second = second, first
+    return sum(weight * second.get(feature, 0.0) for feature, weight in first.items())
+
+
+def hamming_to_cosine(distance: int, bits: int = CODE_BITS) -> float:
+    """Оценка косинусного сходства по расстоянию Хэмминга кодов SimHash"""
+    return math.cos(math.pi * distance / bits)
+
+
+def cosine_to_hamming(similarity: float, bits: int = CODE_BITS) -> int:
+    """Расстояние Хэмминга, соответствующее косинусному сходству"""
+    similarity = max(-1.0, min(1.0, similarity))
+    return int(bits * math.acos(similarity) / math.pi)
+
+
+def spread_bits(code: int) -> int:
+    """Биты кода, разнесенные по 16-битным полям (для сложения по битам)"""
+    binary = format(code, f"0{CODE_BITS}b").encode("ascii").translate(_FROM_BINARY)
+    lanes = bytearray(CODE_BITS * _LANE_BITS // 8)
+    lanes[::_LANE_BITS // 8] = binary[::-1]
+    return int.from_bytes(lanes, "little")
+
+
+def majority_bits(votes: int, total: int) -> int:
+    """
+    Код из сумм голосов по битам
+
+    Args:
+        votes: Суммы голосов за единицу в 16-битных полях (не больше total)
+        total: Сумма всех голосов (меньше 2^15)
+
+    Returns:
+        Код, бит которого равен 1, если за единицу больше половины голосов
+    """
+    # Поле 2*v + 2^15 - total - 1 не меньше 2^15, только если 2*v > total
+    lanes = ((2 * votes + (_SIGN_BIT - total - 1) * _LANES) >> (_LANE_BITS - 1)) & _LANES
+    binary = lanes.to_bytes(CODE_BITS * _LANE_BITS // 8, "little")[::_LANE_BITS // 8]
+    return int(binary[::-1].translate(_TO_BINARY), 2)
+
+
+def _normalize(vector: Dict[int, float]) -> Dict[int, float]:
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    if not norm:
+        return {}
+    return {feature: weight / norm for feature, weight in vector.items()}
+
+
+class TopicEmbedder:
+    """Векторизация тем по TF-IDF с хешированием основ"""
+
+    def __init__(
+        self,
+        idf: Optional[Dict[int, float]] = None,
+        documents: int = 0,
+        description_weight: float = 0.5
+    ):
+        """
+        Args:
+            idf: IDF признаков (пустой - у всех признаков одинаковый вес)
+            documents: Число документов, по которым посчитан IDF
+            description_weight: Вес слов описания относительно слов названия
+        """
+        self.idf = idf or {}
+        self.documents = documents
+        self.description_weight = description_weight
+        self._patterns: Dict[int, int] = {}
+
+    @property
+    def default_idf(self) -> float:
+        """IDF признака, не встречавшегося при подсчете"""
+        return math.log(self.documents + 1) + 1.0
+
+    def fit(self, documents: Iterable[Iterable[int]]) -> None:
+        """
+        Подсчет IDF по признакам документов
+
+        Args:
+            documents: Множества признаков каждого документа
+        """
+        frequencies: Counter = Counter()
+        count = 0
+        for features in documents:
+            frequencies.update(set(features))
+            count += 1
+        self.documents = count
+        self.idf = {
+            feature: math.log((count + 1) / (frequency + 1)) + 1.0
+            for feature, frequency in frequencies.items()
+        }
+
+    def term_frequencies(self, title: str, description: str = "") -> Dict[int, float]:
+        """Частоты признаков названия и (с меньшим весом) описания"""
+        frequencies: Dict[int, float] = {}
+        for text, weight in ((title, 1.0), (description or "", self.description_weight)):
+            for stem in tokenize(text):
+                feature = feature_hash(stem)
+                frequencies[feature] = frequencies.get(feature, 0.0) + weight
+        return frequencies
+
+    def weigh(self, frequencies: Mapping[int, float]) -> Dict[int, float]:
+        """Нормированный вектор TF-IDF (логарифмическая частота)"""
+        default_idf = self.default_idf
+        vector = {
+            feature: (1.0 + math.log(frequency)) * self.idf.get(feature, default_idf)
+            if frequency >= 1.0 else frequency * self.idf.get(feature, default_idf)
+            for feature, frequency in frequencies.items()
+        }
+        return _normalize(vector)
+
+    def reweigh(self, vector: Mapping[int, float], previous: "TopicEmbedder") -> Dict[int, float]:
+        """Вектор, посчитанный с IDF previous, с IDF этого векторизатора"""
+        previous_idf, previous_default = previous.idf, previous.default_idf
+        idf, default_idf = self.idf, self.default_idf
+        return _normalize({
+            feature: (
+                weight / previous_idf.get(feature, previous_default)
+                * idf.get(feature, default_idf)
+            )
+            for feature, weight in vector.items()
+        })
+
+    def embed(self, title: str, description: str = "") -> Dict[int, float]:
+        """
+        Вектор темы
+
+        Returns:
+            Нормированный разреженный вектор {признак: вес} (пустой, если значимых слов нет)
+        """
+        return self.weigh(self.term_frequencies(title, description))
+
+    def code(self, vector: Mapping[int, float]) -> int:
+        """Код SimHash вектора: голосование признаков с весами по битам"""
+        votes = 0
+        total = 0
+        for feature, weight in vector.items():
+            quantized = max(1, round(weight * 255))
+            votes += quantized * self._pattern(feature)
+            total += quantized
+        return majority_bits(votes, total) if total else 0
+
+    def _pattern(self, feature: int) -> int:
+        """Случайные биты признака, разнесенные по полям"""
+        pattern = self._patterns.get(feature)
+        if pattern is None:
+            if len(self._patterns) >= _PATTERN_CACHE_SIZE:
+                self._patterns.clear()
+            digest = hashlib.blake2b(
+                feature.to_bytes(4, "little"), digest_size=CODE_BITS // 8
+            ).digest()
+            pattern = self._patterns[feature] = spread_bits(int.from_bytes(digest, "little"))
+        return pattern
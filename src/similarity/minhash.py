@@ -0,0 +1,262 @@
+"""
+Индекс почти совпадающих названий: MinHash и LSH по символьным n-граммам
+
+Название нормализуется (регистр, ё, пунктуация) и разбивается на
+символьные n-граммы. Сигнатура строится однопроходным MinHash: каждая
+n-грамма хешируется один раз и попадает в одну из num_perm корзин,
+пустые корзины заполняются из других по фиксированной случайной
+последовательности. Сигнатура делится на bands
+полос; названия с совпавшей полосой становятся кандидатами, для них
+по сохраненным младшим байтам сигнатур оценивается сходство, и только
+для близких по оценке считается точное сходство Жаккара.
+
+Полосы хранятся в отсортированных массивах упакованных 64-битных чисел
+(ключ полосы и позиция названия), новые названия - в небольшом словаре,
+который периодически сливается с массивами. Поиск кандидатов - двоичный
+поиск в каждой полосе, поэтому проверка занимает доли миллисекунды и
+при миллионе названий.
+"""
+
+import random
+import re
+from array import array
+from bisect import bisect_left
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+_POSITION_BITS = 24
+_POSITION_MASK = (1 << _POSITION_BITS) - 1
+_KEY_MASK = (1 << (63 - _POSITION_BITS)) - 1
+_HASH_MASK = (1 << 64) - 1
+_EMPTY = 1 << 64
+# Запас ниже порога для оценки сходства по байтам сигнатур (~3 стандартных отклонения)
+_ESTIMATE_MARGIN = 0.15
+
+
+def normalize_title(title: str) -> str:
+    """Название без регистра, пунктуации и лишних пробелов (ё -> е)"""
+    return " ".join(_NON_WORD.sub(" ", title.lower().replace("ё", "е")).split())
+
+
+def shingles(title: str, ngram: int = 3) -> FrozenSet[str]:
+    """Символьные n-граммы нормализованного названия (с границами слов)"""
+    text = f" {normalize_title(title)} "
+    if len(text) <= ngram:
+        return frozenset([text]) if text.strip() else frozenset()
+    return frozenset(text[i:i + ngram] for i in range(len(text) - ngram + 1))
+
+
+def jaccard(first: FrozenSet[str], second: FrozenSet[str]) -> float:
+    """Сходство Жаккара двух множеств n-грамм"""
+    if not first or not second:
+        return 0.0
+    intersection = len(first & second)
+    return intersection / (len(first) + len(second) - intersection)
+
+
+class MinHashLSHIndex:
+    """Индекс названий для поиска почти совпадающих"""
+
+    def __init__(
+        self,
+        threshold: float = 0.7,
+        num_perm: int = 96,
+        bands: int = 16,
+        ngram: int = 3,
+        merge_size: int = 50000
+    ):
+        """
+        Args:
+            threshold: Сходство Жаккара, начиная с которого названия совпадают
+            num_perm: Длина сигнатуры MinHash
+            bands: Число полос LSH (num_perm должно делиться на bands)
+            ngram: Длина символьной n-граммы
+            merge_size: Сколько новых названий копить перед слиянием с массивами полос
+        """
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) должно делиться на bands ({bands})")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.ngram = ngram
+        self.merge_size = merge_size
+
+        rng = random.Random(num_perm)
+        self._probes = [rng.sample(range(num_perm), num_perm) for _ in range(num_perm)]
+
+        self._titles: List[Optional[str]] = []
+        self._topic_ids: List[Optional[int]] = []
+        self._positions: Dict[int, int] = {}
+        self._sketches = bytearray()  # младший байт каждого значения сигнатуры
+        self._size = 0
+        self._tables: List[array] = [array("q") for _ in range(bands)]
+        self._pending: List[Dict[int, List[int]]] = [{} for _ in range(bands)]
+        self._pending_count = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def signature(self, title_shingles: Iterable[str]) -> Optional[List[int]]:
+        """
+        Однопроходная сигнатура MinHash с заполнением пустых корзин
+
+        Используется встроенный хеш строк: он постоянен в пределах
+        процесса, а индекс строится заново при каждом запуске.
+
+        Returns:
+            num_perm значений или None для пустого множества n-грамм
+        """
+        num_perm = self.num_perm
+        bins = [_EMPTY] * num_perm
+        for value in map(hash, title_shingles):
+            value &= _HASH_MASK
+            bucket = value % num_perm
+            if value < bins[bucket]:
+                bins[bucket] = value
+
+        if min(bins) == _EMPTY:
+            return None
+
+        # Пустая корзина берет значение первой непустой из своей случайной
+        # последовательности корзин: совпадение корзин двух названий остается
+        # независимым событием с вероятностью, равной сходству Жаккара
+        signature = bins[:]
+        for position in range(num_perm):
+            if bins[position] == _EMPTY:
+                for other in self._probes[position]:
+                    if bins[other] != _EMPTY:
+                        signature[position] = bins[other]
+                        break
+        return signature
+
+    @staticmethod
+    def _sketch(signature: List[int]) -> bytes:
+        return bytes(value & 0xFF for value in signature)
+
+    def _band_keys(self, signature: List[int]) -> List[int]:
+        rows = self.rows
+        return [
+            hash((band, *signature[band * rows:(band + 1) * rows])) & _KEY_MASK
+            for band in range(self.bands)
+        ]
+
+    def add(self, title: str, topic_id: Optional[int] = None) -> bool:
+        """
+        Добавление названия
+
+        Args:
+            title: Название темы
+            topic_id: ID темы в базе (для удаления и ответа find)
+
+        Returns:
+            False, если в названии нет ни одной n-граммы
+        """
+        signature = self.signature(shingles(title, self.ngram))
+        if signature is None:
+            return False
+
+        position = len(self._titles)
+        if position > _POSITION_MASK:
+            raise ValueError(f"Индекс вмещает не более {_POSITION_MASK + 1} названий")
+        if topic_id is not None:
+            self.remove(topic_id)
+            self._positions[topic_id] = position
+        self._titles.append(title)
+        self._topic_ids.append(topic_id)
+        self._size += 1
+
+        self._sketches += self._sketch(signature)
+        for band, key in enumerate(self._band_keys(signature)):
+            self._pending[band].setdefault(key, []).append(position)
+        self._pending_count += 1
+        if self._pending_count >= max(self.merge_size, self._size // 4):
+            self._merge()
+        return True
+
+    def add_many(self, items: Iterable[Tuple[Optional[int], str]]) -> int:
+        """
+        Добавление пар (ID темы, название)
+
+        Returns:
+            Сколько названий добавлено
+        """
+        return sum(self.add(title, topic_id) for topic_id, title in items)
+
+    def remove(self, topic_id: int) -> bool:
+        """Удаление названия темы (позиция в полосах остается, но не возвращается)"""
+        position = self._positions.pop(topic_id, None)
+        if position is None:
+            return False
+        self._titles[position] = None
+        self._topic_ids[position] = None
+        self._size -= 1
+        return True
+
+    def title(self, topic_id: int) -> Optional[str]:
+        """Название темы по ID (None, если темы нет в индексе)"""
+        position = self._positions.get(topic_id)
+        return None if position is None else self._titles[position]
+
+    def _merge(self) -> None:
+        """Слияние новых названий с отсортированными массивами полос"""
+        for band in range(self.bands):
+            packed = [
+                (key << _POSITION_BITS) | position
+                for key, positions in self._pending[band].items()
+                for position in positions
+            ]
+            packed.sort()
+            # Два отсортированных участка: sort сливает их за линейное время
+            merged = self._tables[band].tolist() + packed
+            merged.sort()
+            self._tables[band] = array("q", merged)
+            self._pending[band] = {}
+        self._pending_count = 0
+
+    def _candidates(self, signature: List[int]) -> Set[int]:
+        candidates: Set[int] = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            table = self._tables[band]
+            index = bisect_left(table, key << _POSITION_BITS)
+            while index < len(table) and table[index] >> _POSITION_BITS == key:
+                candidates.add(table[index] & _POSITION_MASK)
+                index += 1
+            candidates.update(self._pending[band].get(key, ()))
+        return candidates
+
+    def find(self, title: str) -> Optional[Tuple[Optional[int], str, float]]:
+        """
+        Поиск самого похожего названия не ниже порога
+
+        Args:
+            title: Проверяемое название
+
+        Returns:
+            (ID темы, название, сходство) или None, если совпадений нет
+        """
+        title_shingles = shingles(title, self.ngram)
+        signature = self.signature(title_shingles)
+        if signature is None:
+            return None
+
+        sketch = int.from_bytes(self._sketch(signature), "big")
+        num_perm = self.num_perm
+        min_matches = (self.threshold - _ESTIMATE_MARGIN) * num_perm
+
+        best: Optional[Tuple[Optional[int], str, float]] = None
+        for position in self._candidates(signature):
+            candidate = self._titles[position]
+            if candidate is None:
+                continue
+            # Совпавшие значения сигнатур - нулевые байты XOR
+            start = position * num_perm
+            other = int.from_bytes(self._sketches[start:start + num_perm], "big")
+            if (sketch ^ other).to_bytes(num_perm, "big").count(0) < min_matches:
+                continue
+            similarity = jaccard(title_shingles, shingles(candidate, self.ngram))
+            if similarity >= self.threshold and (best is None or similarity > best[2]):
+                best = (self._topic_ids[position], candidate, similarity)
+        return best
@@ -0,0 +1,324 @@
+"""
+Граф ближайших соседей: заранее посчитанные похожие темы
+
+Для каждой темы хранится до k самых похожих тем (ID и косинусное
+сходство по SemanticIndex), поэтому выдача похожих тем - это двоичный
+поиск по ID и срез массива, а не поиск по индексу.
+
+Граф дополняется по мере появления тем в семантическом индексе: для
+новой темы соседи ищутся в индексе, а сама она вставляется в списки
+своих соседей, если похожа на них сильнее их последнего соседа.
+Измененные списки держатся в памяти и, когда их становится много,
+сливаются с основой - массивами фиксированной ширины k, которые
+сохраняются в файл (в формате семантического индекса) и при запуске
+отображаются в память. Для тем, которых в графе еще нет, соседи
+ищутся по индексу напрямую.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from itertools import islice
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from ..config import settings
+from .semantic import SemanticIndex, _map_file, _write_file
+
+
+_MAGIC = b"VKRKNN1\n"
+_FORMAT_VERSION = 1
+# Сколько тем добавляется за один вызов update (столько держится блокировка потока)
+_UPDATE_BATCH = 200
+# Меньше измененных списков с основой не сливается
+_MIN_MERGE_SIZE = 10000
+
+_SECTIONS = [
+    ("topic_ids", "q"),
+    ("neighbour_ids", "q"),
+    ("scores", "f"),
+]
+
+Neighbour = Tuple[int, float]
+
+
+class NeighbourGraph:
+    """Похожие темы для каждой темы семантического индекса"""
+
+    def __init__(self, semantic: SemanticIndex, k: int = 20, path: Optional[str] = None):
+        """
+        Args:
+            semantic: Индекс, по которому ищутся соседи
+            k: Сколько соседей хранится для темы
+            path: Файл графа (None - граф только в памяти)
+        """
+        self.semantic = semantic
+        self.k = k
+        self.path = path
+        self.max_topic_id = 0
+        # Основа: ID тем по возрастанию, по k соседей и сходств на тему (-1 - нет соседа)
+        self._base: Tuple[Any, Any, Any, Any] = (array("q"), array("q"), array("f"), None)
+        self._updated: Dict[int, List[Neighbour]] = {}
+        self._removed: Set[int] = set()
+        self._stale: Set[int] = set()
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._dirty = False
+        self._lookups = 0
+        self._fallbacks = 0
+        self._lookup_time = 0.0
+        self._updates = 0
+        self._update_time = 0.0
+
+    def neighbours(self, topic_id: int, k: Optional[int] = None) -> Optional[List[Neighbour]]:
+        """
+        Похожие темы
+
+        Args:
+            topic_id: ID темы
+            k: Сколько тем вернуть (не больше self.k)
+
+        Returns:
+            Пары (ID темы, косинусное сходство) по убыванию сходства;
+            None, если темы нет в семантическом индексе
+        """
+        start_time = time.perf_counter()
+        k = min(k or self.k, self.k)
+        entries = None if topic_id in self._removed else self._entries(topic_id)
+        if entries is None:
+            vector = self.semantic.vector(topic_id)
+            if vector is None:
+                return None
+            # Тема еще не добавлена в граф
+            self._fallbacks += 1
+            entries = self.semantic.search_vector(vector, self.k, exclude=topic_id)
+        removed = self._removed
+        result = [entry for entry in entries if entry[0] not in removed][:k]
+        self._lookups += 1
+        self._lookup_time += time.perf_counter() - start_time
+        return result
+
+    def _entries(self, topic_id: int) -> Optional[List[Neighbour]]:
+        """Список соседей темы (измененный или из основы), None - темы нет в графе"""
+        entries = self._updated.get(topic_id)
+        if entries is not None:
+            return entries
+        topic_ids, neighbour_ids, scores, _ = self._base
+        index = bisect_left(topic_ids, topic_id)
+        if index == len(topic_ids) or topic_ids[index] != topic_id:
+            return None
+        start, end = index * self.k, (index + 1) * self.k
+        return [
+            (neighbour_id, score)
+            for neighbour_id, score in zip(neighbour_ids[start:end], scores[start:end])
+            if neighbour_id >= 0
+        ]
+
+    def update(self, limit: int = _UPDATE_BATCH) -> int:
+        """
+        Добавление в граф тем индекса новее max_topic_id и пересчет устаревших списков
+
+        Args:
+            limit: Сколько тем обработать за вызов
+
+        Returns:
+            Сколько тем обработано (меньше limit - граф догнал индекс)
+        """
+        start_time = time.perf_counter()
+        processed = 0
+        with self._lock:
+            while self._stale and processed < limit:
+                topic_id = self._stale.pop()
+                vector = self.semantic.vector(topic_id)
+                if vector is not None:
+                    self._insert(topic_id, vector)
+                processed += 1
+            new_items = islice(self.semantic.items(self.max_topic_id), limit - processed)
+            for topic_id, vector in new_items:
+                self._insert(topic_id, vector)
+                self.max_topic_id = topic_id
+                processed += 1
+            self._dirty = self._dirty or processed > 0
+        self._updates += processed
+        self._update_time += time.perf_counter() - start_time
+        return processed
+
+    def _insert(self, topic_id: int, vector: Dict[int, float]) -> None:
+        """Поиск соседей темы и вставка темы в списки соседей"""
+        entries = self.semantic.search_vector(vector, self.k, exclude=topic_id)
+        self._updated[topic_id] = entries
+        self._removed.discard(topic_id)
+        for neighbour_id, similarity in entries:
+            current = self._entries(neighbour_id)
+            if current is None:
+                continue
+            # Списки не меняются на месте: их могут читать параллельно
+            current = [entry for entry in current if entry[0] != topic_id]
+            if len(current) >= self.k and similarity <= current[-1][1]:
+                continue
+            position = next(
+                (index for index, (_, score) in enumerate(current) if similarity > score),
+                len(current)
+            )
+            current.insert(position, (topic_id, similarity))
+            self._updated[neighbour_id] = current[:self.k]
+
+    def invalidate(self, topic_id: int) -> None:
+        """
+        Пересчет темы после изменения ее текста при следующем update
+
+        Как при удалении и повторном добавлении: пересчитываются список темы
+        и списки ее прежних соседей, где она записана со старым сходством.
+        """
+        entries = self._entries(topic_id)
+        self._stale.add(topic_id)
+        if entries:
+            self._stale.update(neighbour_id for neighbour_id, _ in entries)
+
+    def remove(self, topic_id: int) -> None:
+        """Удаление темы: она пропадает из выдачи, списки ее соседей пересчитываются"""
+        entries = self._entries(topic_id)
+        self._removed.add(topic_id)
+        if entries:
+            self._stale.update(neighbour_id for neighbour_id, _ in entries)
+        self._dirty = True
+
+    async def refresh(self) -> int:
+        """
+        Добавление в граф новых тем индекса (частями в отдельном потоке)
+
+        Returns:
+            Сколько тем обработано (0, если граф уже обновляется)
+        """
+        if self._refreshing:
+            return 0
+        self._refreshing = True
+        try:
+            total = 0
+            while True:
+                processed = await asyncio.to_thread(self.update)
+                total += processed
+                if len(self._updated) >= max(_MIN_MERGE_SIZE, len(self._base[0]) // 2):
+                    await asyncio.to_thread(self.save)
+                if processed < _UPDATE_BATCH:
+                    break
+            if total:
+                logger.info(f"В граф похожих тем добавлено {total} тем")
+            return total
+        finally:
+            self._refreshing = False
+
+    def save(self) -> bool:
+        """
+        Слияние измененных списков с основой и запись в файл (если задан path)
+
+        Returns:
+            True, если граф изменился с прошлого сохранения
+        """
+        with self._lock:
+            if not self._dirty:
+                return False
+            self._merge()
+            self._dirty = False
+        return True
+
+    def _merge(self) -> None:
+        topic_ids, neighbour_ids, scores, _ = self._base
+        updated = self._updated
+        removed = set(self._removed)
+        k = self.k
+        sections = {name: array(code) for name, code in _SECTIONS}
+        new_ids, new_neighbours, new_scores = (sections[name] for name, _ in _SECTIONS)
+
+        index = 0
+        for topic_id in sorted(set(topic_ids).union(updated)):
+            if topic_id in removed:
+                continue
+            entries = updated.get(topic_id)
+            if entries is None:
+                index = bisect_left(topic_ids, topic_id, index)
+                start, end = index * k, (index + 1) * k
+                row = neighbour_ids[start:end]
+                if not removed.intersection(row):
+                    new_ids.append(topic_id)
+                    new_neighbours.extend(row)
+                    new_scores.extend(scores[start:end])
+                    continue
+                entries = self._entries(topic_id)
+            entries = [entry for entry in entries if entry[0] not in removed][:k]
+            new_ids.append(topic_id)
+            new_neighbours.extend(
+                [neighbour_id for neighbour_id, _ in entries] + [-1] * (k - len(entries))
+            )
+            new_scores.extend([score for _, score in entries] + [0.0] * (k - len(entries)))
+
+        if self.path is None:
+            base = (new_ids, new_neighbours, new_scores, None)
+        else:
+            _write_file(self.path, {
+                "version": _FORMAT_VERSION,
+                "k": k,
+                "max_topic_id": self.max_topic_id,
+            }, sections, _MAGIC, _SECTIONS)
+            base = _load_base(self.path)[0]
+        # Сначала новая основа, затем пустые изменения: читатель всегда видит полный список
+        self._base = base
+        self._updated = {}
+        self._removed.difference_update(removed)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Размер графа, выдачи и обновления"""
+        return {
+            "topics": len(self._base[0]),
+            "updated_lists": len(self._updated),
+            "max_topic_id": self.max_topic_id,
+            "lookups": self._lookups,
+            "fallbacks": self._fallbacks,
+            "avg_lookup_ms": self._lookup_time / self._lookups * 1000 if self._lookups else None,
+            "updates": self._updates,
+            "avg_update_ms": self._update_time / self._updates * 1000 if self._updates else None,
+        }
+
+    @classmethod
+    def load(cls, semantic: SemanticIndex, path: str, k: int = 20) -> "NeighbourGraph":
+        """
+        Граф из файла (отображается в память)
+
+        Raises:
+            ValueError: Если файл поврежден, записан в другом формате или с другим k
+        """
+        base, header = _load_base(path)
+        if header["k"] != k:
+            raise ValueError(f"Граф {path} посчитан для {header['k']} соседей, а не {k}")
+        graph = cls(semantic, k=k, path=path)
+        graph._base = base
+        graph.max_topic_id = header["max_topic_id"]
+        return graph
+
+
+def _load_base(path: str) -> Tuple[Tuple[Any, Any, Any, Any], Dict[str, Any]]:
+    header, sections, mapping = _map_file(path, _MAGIC, _FORMAT_VERSION, _SECTIONS)
+    return (sections["topic_ids"], sections["neighbour_ids"], sections["scores"], mapping), header
+
+
+def create_neighbour_graph(semantic: Optional[SemanticIndex]) -> Optional[NeighbourGraph]:
+    """
+    Граф похожих тем по настройкам
+
+    None, если выдача похожих тем или семантический индекс выключены.
+    """
+    if semantic is None or not settings.similar_topics_enabled:
+        return None
+    path = settings.similar_graph_path or None
+    if path is not None and os.path.exists(path):
+        try:
+            graph = NeighbourGraph.load(semantic, path, settings.similar_topics_k)
+            logger.info(f"Граф похожих тем загружен: {graph.metrics()['topics']} тем из {path}")
+            return graph
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Граф похожих тем {path} не загружен, будет построен заново: {e}")
+    return NeighbourGraph(semantic, k=settings.similar_topics_k, path=path)
@@ -0,0 +1,623 @@
+"""
+Индекс семантически похожих тем: инвертированный файл (IVF) по признакам
+
+Темы хранятся как разреженные векторы TF-IDF (см. embedding) и их
+256-битные коды SimHash. Каждая тема попадает в списки своих postings
+признаков с наибольшим весом (самых редких основ названия). Поиск
+просматривает списки nprobe главных признаков запроса, отбирает
+кандидатов по расстоянию Хэмминга кодов и уточняет их точным
+косинусным сходством. Почти совпадающие по смыслу темы практически
+всегда делят хотя бы один главный признак, поэтому просматриваются
+десятки-сотни тем, а не весь индекс.
+
+Индекс сохраняется в один файл (заголовок JSON и массивы в машинном
+порядке байт) и при запуске отображается в память через mmap: коды
+списка декодируются при первом обращении к нему, векторы читаются
+прямо из отображения. Новые темы добавляются в память и попадают в
+файл при следующем сохранении; когда индекс вырастает вдвое с
+последнего пересчета, IDF, коды и списки пересчитываются заново
+(rebuild можно вызывать в отдельном потоке - поиск работает по
+старому состоянию до замены).
+"""
+
+import json
+import mmap
+import os
+import sys
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from heapq import merge, nlargest, nsmallest
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Set, Tuple
+
+from loguru import logger
+
+from ..config import settings
+from .embedding import CODE_BITS, TopicEmbedder, cosine, cosine_to_hamming
+
+
+_MAGIC = b"VKRSEM1\n"
+_FORMAT_VERSION = 1
+_CODE_BYTES = CODE_BITS // 8
+# Запас ниже порога при отборе кандидатов по расстоянию Хэмминга
+_ESTIMATE_MARGIN = 0.1
+# Сколько кандидатов по коду уточняется точным сходством на один результат
+_RERANK_FACTOR = 16
+# Предел просмотренных тем на запрос (списки самых частых признаков длинные)
+_MAX_SCANNED = 50000
+# Меньше тем IDF не пересчитывается
+_MIN_REBUILD_SIZE = 1000
+
+_SECTIONS = [
+    ("codes", "B"),
+    ("topic_ids", "q"),
+    ("vector_offsets", "q"),
+    ("features", "I"),
+    ("weights", "f"),
+    ("sorted_ids", "q"),
+    ("sorted_rows", "q"),
+    ("list_features", "I"),
+    ("list_offsets", "q"),
+    ("list_rows", "q"),
+    ("list_codes", "B"),
+    ("idf_features", "I"),
+    ("idf_values", "f"),
+]
+
+
+def _decode_codes(buffer, start: int, end: int) -> List[int]:
+    """Коды с номерами [start, end) из массива байт"""
+    data = bytes(buffer[start * _CODE_BYTES:end * _CODE_BYTES])
+    return [
+        int.from_bytes(data[offset:offset + _CODE_BYTES], "little")
+        for offset in range(0, len(data), _CODE_BYTES)
+    ]
+
+
+def _top_features(features: Iterable[int], weights: Iterable[float], count: int) -> List[int]:
+    """count признаков с наибольшим весом"""
+    return [feature for _, feature in nlargest(count, zip(weights, features))]
+
+
+class _Columns:
+    """Строки индекса в порядке добавления (для записи в файл)"""
+
+    def __init__(self):
+        self.topic_ids = array("q")
+        self.codes: List[int] = []
+        self.vector_offsets = array("q", [0])
+        self.features = array("I")
+        self.weights = array("f")
+
+    def append(self, topic_id: int, code: int, features, weights) -> None:
+        self.topic_ids.append(topic_id)
+        self.codes.append(code)
+        self.features.extend(features)
+        self.weights.extend(weights)
+        self.vector_offsets.append(len(self.features))
+
+
+class _State:
+    """Состояние индекса: неизменяемая основа (файл) и добавленные после нее темы"""
+
+    def __init__(self, embedder: TopicEmbedder, sections: Mapping[str, Any], postings: int,
+                 trained_size: int = 0, max_topic_id: int = 0, mapping: Optional[mmap.mmap] = None):
+        self.embedder = embedder
+        self.postings = postings
+        self.codes = sections["codes"]
+        self.topic_ids = sections["topic_ids"]
+        self.vector_offsets = sections["vector_offsets"]
+        self.features = sections["features"]
+        self.weights = sections["weights"]
+        self.sorted_ids = sections["sorted_ids"]
+        self.sorted_rows = sections["sorted_rows"]
+        self.list_features = sections["list_features"]
+        self.list_offsets = sections["list_offsets"]
+        self.list_rows = sections["list_rows"]
+        self.list_codes = sections["list_codes"]
+        self.trained_size = trained_size
+        self.max_topic_id = max_topic_id
+        self.mapping = mapping  # держит отображение файла, пока состояние используется
+
+        self.decoded: Dict[int, List[int]] = {}
+        self.removed: Set[int] = set()
+        self.pending_ids: List[Optional[int]] = []
+        self.pending_codes: List[int] = []
+        self.pending_vectors: List[Dict[int, float]] = []
+        self.pending_lists: Dict[int, List[int]] = {}
+        self.pending_positions: Dict[int, int] = {}
+        self.size = len(self.topic_ids)
+
+    def base_row(self, topic_id: int) -> Optional[int]:
+        """Строка основы с темой topic_id (если тема не удалена)"""
+        if topic_id in self.removed:
+            return None
+        index = bisect_left(self.sorted_ids, topic_id)
+        if index < len(self.sorted_ids) and self.sorted_ids[index] == topic_id:
+            return self.sorted_rows[index]
+        return None
+
+    def list_entries(self, feature: int) -> Tuple[List[int], List[int]]:
+        """Коды и строки списка признака (темы основы и добавленные)"""
+        codes: List[int] = []
+        rows: List[int] = []
+        index = bisect_left(self.list_features, feature)
+        if index < len(self.list_features) and self.list_features[index] == feature:
+            start, end = self.list_offsets[index], self.list_offsets[index + 1]
+            codes = self.decoded.get(index)
+            if codes is None:
+                codes = self.decoded[index] = _decode_codes(self.list_codes, start, end)
+            rows = self.list_rows[start:end].tolist()
+        pending = self.pending_lists.get(feature)
+        if pending:
+            codes = codes + [self.pending_codes[position] for position in pending]
+            rows = rows + [~position for position in pending]
+        return codes, rows
+
+    def row_topic_id(self, row: int) -> Optional[int]:
+        if row >= 0:
+            topic_id = self.topic_ids[row]
+            return None if topic_id in self.removed else topic_id
+        return self.pending_ids[~row]
+
+    def row_vector(self, row: int) -> Dict[int, float]:
+        if row >= 0:
+            start, end = self.vector_offsets[row], self.vector_offsets[row + 1]
+            return dict(zip(self.features[start:end], self.weights[start:end]))
+        return self.pending_vectors[~row]
+
+    def row_code(self, row: int) -> int:
+        if row >= 0:
+            return _decode_codes(self.codes, row, row + 1)[0]
+        return self.pending_codes[~row]
+
+    def rows(self) -> Iterator[int]:
+        """Строки всех тем (включая удаленные): основа, затем добавленные"""
+        yield from range(len(self.topic_ids))
+        for position in range(len(self.pending_ids)):
+            yield ~position
+
+    def add(self, topic_id: int, vector: Dict[int, float]) -> None:
+        position = len(self.pending_ids)
+        self.pending_ids.append(topic_id)
+        self.pending_codes.append(self.embedder.code(vector))
+        self.pending_vectors.append(vector)
+        for feature in _top_features(vector.keys(), vector.values(), self.postings):
+            self.pending_lists.setdefault(feature, []).append(position)
+        self.pending_positions[topic_id] = position
+        self.size += 1
+
+    def remove(self, topic_id: int) -> bool:
+        position = self.pending_positions.pop(topic_id, None)
+        if position is not None:
+            self.pending_ids[position] = None
+            self.pending_vectors[position] = {}
+            self.size -= 1
+        # Строка основы с тем же ID скрывается, даже если тема заменена новой версией
+        if self.base_row(topic_id) is not None:
+            self.removed.add(topic_id)
+            self.size -= 1
+            return True
+        return position is not None
+
+
+def _empty_sections() -> Dict[str, Any]:
+    sections = {name: array(code) for name, code in _SECTIONS}
+    sections["vector_offsets"] = array("q", [0])
+    sections["list_offsets"] = array("q", [0])
+    return sections
+
+
+class SemanticIndex:
+    """Поиск тем, близких по смыслу названия и описания"""
+
+    def __init__(self, threshold: float = 0.88, nprobe: int = 2, postings: int = 3,
+                 path: Optional[str] = None):
+        """
+        Args:
+            threshold: Косинусное сходство, начиная с которого темы совпадают
+            nprobe: Сколько списков главных признаков запроса просматривать
+            postings: В списки скольких главных признаков попадает тема
+            path: Файл индекса (None - индекс только в памяти)
+        """
+        self.threshold = threshold
+        self.nprobe = nprobe
+        self.path = path
+        self._state = _State(TopicEmbedder(), _empty_sections(), postings)
+        self._lock = threading.Lock()
+        self._journal: Optional[List[Tuple[Any, ...]]] = None
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return self._state.size
+
+    @property
+    def max_topic_id(self) -> int:
+        """Наибольший ID добавленной темы (для догрузки новых тем из базы)"""
+        return self._state.max_topic_id
+
+    @property
+    def needs_rebuild(self) -> bool:
+        """Индекс вырос вдвое с последнего пересчета IDF"""
+        state = self._state
+        return (
+            self._journal is None
+            and state.size >= max(_MIN_REBUILD_SIZE, 2 * state.trained_size)
+        )
+
+    def embed(self, title: str, description: str = "") -> Dict[int, float]:
+        """Вектор темы с текущим IDF индекса"""
+        return self._state.embedder.embed(title, description)
+
+    def add(self, topic_id: int, title: str, description: str = "") -> bool:
+        """
+        Добавление (или замена) темы
+
+        Returns:
+            False, если в тексте темы нет значимых слов
+        """
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((topic_id, title, description))
+            return self._add(self._state, topic_id, title, description)
+
+    def _add(self, state: _State, topic_id: int, title: str, description: str) -> bool:
+        state.remove(topic_id)
+        state.max_topic_id = max(state.max_topic_id, topic_id)
+        self._dirty = True
+        vector = state.embedder.embed(title, description)
+        if not vector:
+            return False
+        state.add(topic_id, vector)
+        return True
+
+    def remove(self, topic_id: int) -> bool:
+        """Удаление темы"""
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((topic_id,))
+            removed = self._state.remove(topic_id)
+            self._dirty = self._dirty or removed
+            return removed
+
+    def vector(self, topic_id: int) -> Optional[Dict[int, float]]:
+        """Сохраненный вектор темы"""
+        state = self._state
+        position = state.pending_positions.get(topic_id)
+        if position is not None:
+            return state.pending_vectors[position]
+        row = state.base_row(topic_id)
+        return None if row is None else state.row_vector(row)
+
+    def items(self, after_id: int = 0) -> Iterator[Tuple[int, Dict[int, float]]]:
+        """Темы с ID больше after_id по возрастанию ID: пары (ID, вектор)"""
+        state = self._state
+        pending = sorted(
+            (topic_id, ~position)
+            for topic_id, position in list(state.pending_positions.items())
+            if topic_id > after_id
+        )
+        sorted_ids, sorted_rows = state.sorted_ids, state.sorted_rows
+        base = (
+            (sorted_ids[index], sorted_rows[index])
+            for index in range(bisect_right(sorted_ids, after_id), len(sorted_ids))
+        )
+        for topic_id, row in merge(base, pending):
+            # Замененные и удаленные строки основы пропускаются
+            if state.row_topic_id(row) == topic_id:
+                yield topic_id, state.row_vector(row)
+
+    def find(self, title: str, description: str = "") -> Optional[Tuple[int, float]]:
+        """
+        Самая похожая тема не ниже порога
+
+        Returns:
+            (ID темы, косинусное сходство) или None
+        """
+        return self.find_vector(self.embed(title, description))
+
+    def find_vector(self, vector: Mapping[int, float]) -> Optional[Tuple[int, float]]:
+        """Самая похожая тема не ниже порога для готового вектора"""
+        if not vector:
+            return None
+        state = self._state
+        max_distance = cosine_to_hamming(self.threshold - _ESTIMATE_MARGIN)
+        best: Optional[Tuple[int, float]] = None
+        for row in self._candidates(state, vector, self.nprobe, max_distance=max_distance):
+            topic_id = state.row_topic_id(row)
+            if topic_id is None:
+                continue
+            similarity = cosine(vector, state.row_vector(row))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (topic_id, similarity)
+        return best
+
+    def search(self, title: str, description: str = "", k: int = 10,
+               nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        k самых похожих тем
+
+        Returns:
+            Пары (ID темы, косинусное сходство) по убыванию сходства
+        """
+        return self.search_vector(self.embed(title, description), k, nprobe)
+
+    def search_vector(self, vector: Mapping[int, float], k: int = 10, nprobe: Optional[int] = None,
+                      exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+        """k самых похожих тем для готового вектора (exclude - ID исключаемой темы)"""
+        if not vector:
+            return []
+        state = self._state
+        rows = self._candidates(state, vector, nprobe or self.nprobe, pool=(k + 1) * _RERANK_FACTOR)
+        results = []
+        for row in rows:
+            topic_id = state.row_topic_id(row)
+            if topic_id is None or topic_id == exclude:
+                continue
+            results.append((topic_id, cosine(vector, state.row_vector(row))))
+        results.sort(key=lambda result: -result[1])
+        return results[:k]
+
+    def _candidates(self, state: _State, vector: Mapping[int, float], nprobe: int,
+                    max_distance: Optional[int] = None, pool: Optional[int] = None) -> Set[int]:
+        """
+        Строки из списков главных признаков, отобранные по расстоянию Хэмминга
+
+        Args:
+            max_distance: Отбирать строки не дальше этого расстояния
+            pool: Отбирать столько ближайших строк
+        """
+        code = state.embedder.code(vector)
+        scanned: List[Tuple[List[int], List[int]]] = []
+        total = 0
+        for feature in _top_features(vector.keys(), vector.values(), nprobe):
+            codes, rows = state.list_entries(feature)
+            if not rows:
+                continue
+            scanned.append(([(code ^ other).bit_count() for other in codes], rows))
+            total += len(rows)
+            if total >= _MAX_SCANNED:
+                break
+
+        if pool is not None and total > pool:
+            max_distance = nsmallest(pool, (d for distances, _ in scanned for d in distances))[-1]
+        if max_distance is None:
+            return {row for _, rows in scanned for row in rows}
+        return {
+            row
+            for distances, rows in scanned
+            for distance, row in zip(distances, rows)
+            if distance <= max_distance
+        }
+
+    def rebuild(self) -> None:
+        """
+        Пересчет IDF, векторов, кодов и списков по всем темам индекса
+
+        Темы, добавленные или удаленные во время пересчета, переносятся
+        в новое состояние; результат сохраняется в файл (если задан path).
+        """
+        with self._lock:
+            if self._journal is not None:
+                return
+            self._journal = []
+            state = self._state
+            # Изменения во время пересчета попадут в журнал и будут применены к новому состоянию
+            rows = [row for row in state.rows() if state.row_topic_id(row) is not None]
+            topic_ids = [state.row_topic_id(row) for row in rows]
+            vectors = [state.row_vector(row) for row in rows]
+        try:
+            # Векторы хранят tf * idf; частоты восстанавливаются делением на старый IDF
+            previous = state.embedder
+            embedder = TopicEmbedder(description_weight=previous.description_weight)
+            embedder.fit(vectors)
+            columns = _Columns()
+            for topic_id, vector in zip(topic_ids, vectors):
+                vector = embedder.reweigh(vector, previous)
+                columns.append(topic_id, embedder.code(vector), vector.keys(), vector.values())
+            del vectors
+            new_state = self._write(
+                columns, embedder, state.postings, len(topic_ids), state.max_topic_id
+            )
+        except BaseException:
+            with self._lock:
+                self._journal = None
+            raise
+
+        with self._lock:
+            for entry in self._journal:
+                if len(entry) == 1:
+                    new_state.remove(entry[0])
+                else:
+                    self._add(new_state, *entry)
+            self._journal = None
+            self._state = new_state
+            self._dirty = bool(new_state.pending_ids or new_state.removed)
+        logger.info(f"Семантический индекс перестроен: {len(topic_ids)} тем, "
+                    f"{len(new_state.list_features)} списков")
+
+    def save(self) -> bool:
+        """
+        Запись добавленных тем в файл без пересчета IDF
+
+        Returns:
+            True, если файл записан
+        """
+        if self.path is None or not self._dirty or self._journal is not None:
+            return False
+        with self._lock:
+            state = self._state
+            columns = _Columns()
+            for row in state.rows():
+                topic_id = state.row_topic_id(row)
+                if topic_id is None:
+                    continue
+                if row >= 0:
+                    start, end = state.vector_offsets[row], state.vector_offsets[row + 1]
+                    features, weights = state.features[start:end], state.weights[start:end]
+                else:
+                    vector = state.pending_vectors[~row]
+                    features, weights = vector.keys(), vector.values()
+                columns.append(topic_id, state.row_code(row), features, weights)
+            self._state = self._write(columns, state.embedder, state.postings,
+                                      state.trained_size, state.max_topic_id)
+            self._dirty = False
+        return True
+
+    def _write(self, columns: _Columns, embedder: TopicEmbedder, postings: int,
+               trained_size: int, max_topic_id: int) -> _State:
+        """Построение списков признаков и запись в файл (или в память без path)"""
+        sections = _empty_sections()
+        sections["topic_ids"] = columns.topic_ids
+        sections["vector_offsets"] = columns.vector_offsets
+        sections["features"] = columns.features
+        sections["weights"] = columns.weights
+        sections["codes"] = bytearray(b"".join(
+            code.to_bytes(_CODE_BYTES, "little") for code in columns.codes
+        ))
+
+        lists: Dict[int, List[int]] = {}
+        offsets = columns.vector_offsets
+        for row in range(len(columns.codes)):
+            start, end = offsets[row], offsets[row + 1]
+            top = _top_features(columns.features[start:end], columns.weights[start:end], postings)
+            for feature in top:
+                lists.setdefault(feature, []).append(row)
+
+        list_features = sorted(lists)
+        list_offsets = sections["list_offsets"]
+        list_rows = sections["list_rows"]
+        list_codes = bytearray()
+        for feature in list_features:
+            rows = lists[feature]
+            list_rows.extend(rows)
+            list_offsets.append(len(list_rows))
+            list_codes += b"".join(
+                columns.codes[row].to_bytes(_CODE_BYTES, "little") for row in rows
+            )
+        sections["list_features"] = array("I", list_features)
+        sections["list_codes"] = list_codes
+
+        by_id = sorted(range(len(columns.topic_ids)), key=columns.topic_ids.__getitem__)
+        sections["sorted_ids"] = array("q", (columns.topic_ids[row] for row in by_id))
+        sections["sorted_rows"] = array("q", by_id)
+        sections["idf_features"] = array("I", embedder.idf.keys())
+        sections["idf_values"] = array("f", embedder.idf.values())
+
+        if self.path is None:
+            return _State(embedder, sections, postings, trained_size, max_topic_id)
+
+        _write_file(self.path, {
+            "version": _FORMAT_VERSION,
+            "documents": embedder.documents,
+            "description_weight": embedder.description_weight,
+            "postings": postings,
+            "trained_size": trained_size,
+            "max_topic_id": max_topic_id,
+        }, sections)
+        return _load_state(self.path)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Размер индекса, списки признаков и темы вне файла"""
+        state = self._state
+        return {
+            "indexed_topics": state.size,
+            "lists": len(state.list_features),
+            "pending": len(state.pending_positions),
+            "trained_size": state.trained_size,
+            "rebuilding": self._journal is not None,
+        }
+
+    @classmethod
+    def load(cls, path: str, threshold: float = 0.88, nprobe: int = 2) -> "SemanticIndex":
+        """
+        Индекс из файла (отображается в память)
+
+        Raises:
+            ValueError: Если файл поврежден или записан в другом формате
+        """
+        index = cls(threshold=threshold, nprobe=nprobe, path=path)
+        index._state = _load_state(path)
+        return index
+
+
+def _write_file(path: str, header: Dict[str, Any], sections: Mapping[str, Any],
+                magic: bytes = _MAGIC, layout: Sequence[Tuple[str, str]] = _SECTIONS) -> None:
+    """Запись заголовка и массивов с выравниванием по 8 байт (через временный файл)"""
+    offsets = {}
+    offset = 0
+    for name, _ in layout:
+        size = memoryview(sections[name]).nbytes
+        offsets[name] = [offset, size]
+        offset += (size + 7) // 8 * 8
+    header_bytes = json.dumps(
+        {**header, "byteorder": sys.byteorder, "sections": offsets}
+    ).encode("utf-8")
+    header_bytes += b" " * (-len(header_bytes) % 8)
+
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(magic)
+        file.write(len(header_bytes).to_bytes(8, "little"))
+        file.write(header_bytes)
+        for name, _ in layout:
+            data = memoryview(sections[name])
+            file.write(data)
+            file.write(b"\0" * (-data.nbytes % 8))
+    os.replace(temporary, path)
+
+
+def _map_file(
+    path: str, magic: bytes, version: int, layout: Sequence[Tuple[str, str]]
+) -> Tuple[Dict[str, Any], Dict[str, memoryview], mmap.mmap]:
+    """
+    Отображение файла, записанного _write_file, в память
+
+    Returns:
+        Заголовок, массивы (представления отображения) и само отображение
+
+    Raises:
+        ValueError: Если файл поврежден или записан в другом формате
+    """
+    with open(path, "rb") as file:
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapping[:len(magic)] != magic:
+        raise ValueError(f"{path} записан не в формате {magic.strip().decode()}")
+    header_size = int.from_bytes(mapping[len(magic):len(magic) + 8], "little")
+    data_start = len(magic) + 8 + header_size
+    header = json.loads(mapping[len(magic) + 8:data_start])
+    if header.get("version") != version or header.get("byteorder") != sys.byteorder:
+        raise ValueError(f"Файл {path} записан в другом формате")
+
+    data = memoryview(mapping)[data_start:]
+    sections = {}
+    for name, code in layout:
+        offset, size = header["sections"][name]
+        sections[name] = data[offset:offset + size].cast(code)
+    return header, sections, mapping
+
+
+def _load_state(path: str) -> _State:
+    header, sections, mapping = _map_file(path, _MAGIC, _FORMAT_VERSION, _SECTIONS)
+    embedder = TopicEmbedder(
+        idf=dict(zip(sections["idf_features"], sections["idf_values"])),
+        documents=header["documents"],
+        description_weight=header["description_weight"]
+    )
+    return _State(embedder, sections, header["postings"], header["trained_size"],
+                  header["max_topic_id"], mapping)
+
+
+def create_semantic_index() -> Optional[SemanticIndex]:
+    """Семантический индекс по настройкам (None, если семантический отсев выключен)"""
+    if not settings.semantic_dedup_enabled:
+        return None
+    path = settings.semantic_index_path or None
+    if path is not None and os.path.exists(path):
+        try:
+            index = SemanticIndex.load(path, settings.semantic_threshold, settings.semantic_nprobe)
+            logger.info(f"Семантический индекс загружен: {len(index)} тем из {path}")
+            return index
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Семантический индекс {path} не загружен, будет построен заново: {e}")
+    return SemanticIndex(settings.semantic_threshold, settings.semantic_nprobe, path=path)
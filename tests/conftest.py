@@ -3,15 +3,18 @@
 """
 
 import pytest
+import pytest_asyncio
 import asyncio
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from fastapi.testclient import TestClient
 from unittest.mock import AsyncMock, MagicMock
 
 from src.api.server import app
+from src.agents import reset_provider_limiters
 from src.database.models import Base
 from src.database.repository import TopicRepository
+from src.database.async_repository import AsyncTopicRepository
+from src.database.connection import create_db_engine, create_async_db_engine
 from src.config import settings
 
 
@@ -23,11 +26,19 @@ def event_loop():
     loop.close()
 
 
+@pytest.fixture(autouse=True)
+def provider_limiters():
+    """Лимитеры провайдеров по настройкам теста (event loop у тестов общий)"""
+    reset_provider_limiters()
+    yield
+    reset_provider_limiters()
+
+
 @pytest.fixture
 def test_db():
     """Создание тестовой базы данных"""
-    # Используем in-memory SQLite для тестов
-    engine = create_engine("sqlite:///:memory:")
+    # Используем in-memory SQLite для тестов (одно соединение, доступное из потоков TestClient)
+    engine = create_db_engine("sqlite:///:memory:")
     Base.metadata.create_all(bind=engine)
     
     TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -45,6 +56,28 @@ def topic_repository(test_db):
     return TopicRepository(test_db)
 
 
+@pytest_asyncio.fixture
+async def async_test_engine(tmp_path):
+    """Асинхронный движок (aiosqlite) для тестовой базы данных"""
+    engine = create_async_db_engine(f"sqlite:///{tmp_path / 'async_test.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    
+    try:
+        yield engine
+    finally:
+        await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def async_topic_repository(async_test_engine):
+    """Создание асинхронного репозитория для тестов"""
+    from sqlalchemy.ext.asyncio import AsyncSession
+    
+    async with AsyncSession(async_test_engine, expire_on_commit=False) as session:
+        yield AsyncTopicRepository(session)
+
+
 @pytest.fixture
 def test_client():
     """Создание тестового клиента FastAPI"""
@@ -72,6 +105,276 @@ def mock_llm():
     return mock
 
 
+class FakeStreamingLLM:
+    """Модель, отдающая заданный ответ частями с задержкой между ними"""
+    
+    def __init__(self, text: str, chunk_size: int = 16, delay: float = 0.0):
+        self.text = text
+        self.chunk_size = chunk_size
+        self.delay = delay
+        self.calls = 0
+        self.sent = 0  # отдано символов ответа
+    
+    async def astream(self, prompt):
+        from langchain_core.messages import AIMessageChunk
+        
+        self.calls += 1
+        for start in range(0, len(self.text), self.chunk_size):
+            await asyncio.sleep(self.delay)
+            self.sent = min(start + self.chunk_size, len(self.text))
+            yield AIMessageChunk(content=self.text[start:start + self.chunk_size])
+
+
+@pytest.fixture
+def fake_streaming_llm():
+    """Фабрика потоковой мок-модели"""
+    return FakeStreamingLLM
+
+
+class FakePackingLLM:
+    """
+    Модель, отвечающая темами на каждый запрос промпта
+
+    Время ответа - base_delay плюс char_delay на символ промпта.
+    Пропущенные в пакетном ответе запросы задаются номерами в skip.
+    """
+
+    def __init__(self, base_delay: float = 0.0, char_delay: float = 0.0, skip=()):
+        self.base_delay = base_delay
+        self.char_delay = char_delay
+        self.skip = set(skip)
+        self.calls = 0
+        self.prompt_chars = 0
+
+    @staticmethod
+    def _topics(request_text: str):
+        import re
+        match = re.search(r'Сгенерируй (\d+) тем ВКР по направлению "(.*?)"', request_text)
+        count, field = match.groups()
+        return [
+            {
+                "title": f"Тема {i} по направлению {field}",
+                "keywords": [field.lower()],
+                "difficulty": "Средняя",
+            }
+            for i in range(1, int(count) + 1)
+        ]
+
+    async def ainvoke(self, prompt):
+        import json
+        import re
+
+        chars = sum(len(message.content) for message in prompt)
+        self.calls += 1
+        self.prompt_chars += chars
+        await asyncio.sleep(self.base_delay + self.char_delay * chars)
+
+        text = prompt[-1].content
+        sections = re.split(r'^### Запрос (\d+)$', text, flags=re.MULTILINE)
+        if len(sections) > 1:
+            data = {"requests": [
+                {"request": int(number), "topics": self._topics(section)}
+                for number, section in zip(sections[1::2], sections[2::2])
+                if int(number) not in self.skip
+            ]}
+        else:
+            data = {"topics": self._topics(text)}
+        return MagicMock(content=json.dumps(data, ensure_ascii=False), usage_metadata=None)
+
+
+@pytest.fixture
+def fake_packing_llm():
+    """Фабрика мок-модели, поддерживающей пакетные промпты"""
+    return FakePackingLLM
+
+
+class FakeLLMServer:
+    """
+    Локальный OpenAI-совместимый сервер с ограничением одновременных запросов
+
+    Запрос сверх max_concurrency получает 429, как у бесплатных моделей
+    OpenRouter. Ответ отдается через delay секунд. plan задает ответы на
+    первые запросы: (код ответа, задержка, заголовки). Если в запросе
+    переданы инструменты, темы возвращаются вызовом первого из них.
+    """
+
+    def __init__(self, max_concurrency: int = 2, delay: float = 0.05, plan=()):
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        self.max_concurrency = max_concurrency
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.plan = list(plan)
+        self.last_request = None
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keepalive-соединения
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                import json
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                payload = json.loads(body or b"{}")
+                server.last_request = payload
+                with server._lock:
+                    if server.in_flight >= server.max_concurrency:
+                        server.rejected += 1
+                        return self._reply(
+                            429, {"error": {"message": "Rate limit exceeded", "code": 429}}
+                        )
+                    server.in_flight += 1
+                    server.accepted += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                    if server.plan:
+                        status, delay, headers = server.plan.pop(0)
+                    else:
+                        status, delay, headers = 200, server.delay, {}
+                try:
+                    import time
+                    time.sleep(delay)
+                    if status != 200:
+                        error = {"error": {"message": "Upstream error", "code": status}}
+                        return self._reply(status, error, headers)
+                    content = '{"topics": [{"title": "Тема исследования с локального сервера"}]}'
+                    message = {"role": "assistant", "content": content}
+                    if payload.get("tools"):
+                        function = payload["tools"][0]["function"]["name"]
+                        message = {"role": "assistant", "content": None, "tool_calls": [{
+                            "id": "call_test", "type": "function",
+                            "function": {"name": function, "arguments": content}
+                        }]}
+                    self._reply(200, {
+                        "id": "chatcmpl-test", "object": "chat.completion",
+                        "created": 0, "model": "test",
+                        "choices": [{"index": 0, "finish_reason": "stop", "message": message}],
+                        "usage": {
+                            "prompt_tokens": 500, "completion_tokens": 20, "total_tokens": 520
+                        }
+                    })
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+            def _reply(self, status, payload, headers=None):
+                import json
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self.url = f"http://127.0.0.1:{self._httpd.server_address[1]}/v1"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+@pytest.fixture
+def fake_llm_server():
+    """Локальный сервер модели с ограничением одновременных запросов"""
+    with FakeLLMServer() as server:
+        yield server
+
+
+@pytest.fixture
+def fake_llm_server_factory():
+    """Фабрика локальных серверов модели (plan - ответы на первые запросы)"""
+    servers = []
+
+    def create(**kwargs):
+        server = FakeLLMServer(**kwargs).__enter__()
+        servers.append(server)
+        return server
+
+    yield create
+    for server in servers:
+        server.__exit__(None, None, None)
+
+
+@pytest.fixture
+def streaming_response_text():
+    """Ответ модели в формате JSON внутри блока кода"""
+    topics = [
+        {
+            "title": f"Тема исследования номер {i} о {{фигурных}} скобках",
+            "description": f"Описание \"темы\" {i}",
+            "keywords": ["анализ", f"ключ {i}"],
+            "methodology": "Эксперимент",
+            "expected_results": "Результаты",
+            "difficulty": "Средняя"
+        }
+        for i in range(1, 6)
+    ]
+    import json
+    payload = json.dumps({"topics": topics}, ensure_ascii=False, indent=2)
+    return "Вот темы:\n```json\n" + payload + "\n```"
+
+
+@pytest.fixture
+def recorded_model_outputs():
+    """
+    Ответы моделей с типичными ошибками формата и ожидаемые названия тем
+
+    Пары (ответ, названия тем, которые должен извлечь парсер).
+    """
+    return [
+        (
+            'Конечно! Вот темы в формате {"topics": [...]}:\n```json\n{\n  "topics": [\n'
+            '    {"title": "Прогнозирование спроса методами градиентного бустинга", '
+            '"keywords": ["прогнозирование", "бустинг"], "difficulty": "Средняя"},\n'
+            '    {"title": "Анализ тональности отзывов с {фигурными} скобками", '
+            '"description": "Строка с \\"кавычками\\" и \\\\ обратной чертой", '
+            '"difficulty": "Высокая"}\n'
+            '  ]\n}\n```\nЕсли нужно, могу предложить {еще} темы.',
+            ["Прогнозирование спроса методами градиентного бустинга",
+             "Анализ тональности отзывов с {фигурными} скобками"]
+        ),
+        (
+            '{"topics": [\n  {"title": "Оптимизация маршрутов доставки", '
+            '"keywords": ["логистика", "графы",],},\n'
+            '  {"title": "Распознавание рукописного текста", '
+            '"keywords": ["OCR"], "difficulty": "Высокая",},\n]}',
+            ["Оптимизация маршрутов доставки", "Распознавание рукописного текста"]
+        ),
+        (
+            '```json\n{"topics": [{"title": "Цифровой двойник производственной линии", '
+            '"methodology": "Имитационное моделирование"}, '
+            '{"title": "Обнаружение аномалий в логах", '
+            '"description": "Использование автоэнкодеров для поиска аномал',
+            ["Цифровой двойник производственной линии", "Обнаружение аномалий в логах"]
+        ),
+        (
+            '{"topics": [{"title": "Рекомендательная система для библиотеки", '
+            '"keywords": ["коллаборативная'
+            ' фильтрация"]}, {"title": "Классификация медицинских изображе',
+            ["Рекомендательная система для библиотеки"]
+        ),
+        (
+            'Темы: {"topics":\n[{"title": "Эмодзи 🎓 и юникод \\u00e9 в названии"}, '
+            '{"title": "Вложенные [скобки] в строке", "extra": {"level": [1, 2, {"x": "}"}]}}]}',
+            ["Эмодзи 🎓 и юникод é в названии", "Вложенные [скобки] в строке"]
+        ),
+    ]
+
+
 @pytest.fixture
 def sample_topic_data():
     """Тестовые данные для тем"""
@@ -6,7 +6,7 @@ import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
 
 from src.agents import VKRTopicAgent, TopicGenerationConfig
-from src.models import EducationLevel, VKRTopic
+from src.models import DepartmentContext, EducationLevel, StudentPreferences, VKRTopic
 
 
 class TestVKRTopicAgent:
@@ -120,7 +120,252 @@ class TestVKRTopicAgent:
                 field="Информатика",
                 count=1
             )
-    
+
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_requests_coalesced(self, agent, mock_llm):
+        """Тест объединения 100 одновременных одинаковых запросов в один вызов модели"""
+        import asyncio
+
+        response = mock_llm.ainvoke.return_value
+
+        async def slow_ainvoke(prompt):
+            await asyncio.sleep(0.05)
+            return response
+
+        mock_llm.ainvoke.side_effect = slow_ainvoke
+        config = TopicGenerationConfig(field="Информатика", level=EducationLevel.BACHELOR, count=2)
+
+        results = await asyncio.gather(*[agent.generate_topics(config) for _ in range(100)])
+
+        assert mock_llm.ainvoke.await_count == 1
+        assert all(len(topics) == 2 for topics in results)
+        # Каждый вызывающий получает собственные копии тем
+        results[0][0].title = "Измененное название темы"
+        assert results[1][0].title != results[0][0].title
+
+        # После завершения следующий запрос снова обращается к модели
+        await agent.generate_topics(config)
+        assert mock_llm.ainvoke.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_share_errors(self, agent, mock_llm):
+        """Тест передачи ошибки всем объединенным запросам"""
+        import asyncio
+
+        async def failing_ainvoke(prompt):
+            await asyncio.sleep(0.01)
+            raise Exception("API Error")
+
+        mock_llm.ainvoke.side_effect = failing_ainvoke
+        config = TopicGenerationConfig(field="Информатика", count=1)
+
+        results = await asyncio.gather(
+            *[agent.generate_topics(config) for _ in range(5)], return_exceptions=True
+        )
+
+        assert mock_llm.ainvoke.await_count == 1
+        assert all(isinstance(result, Exception) for result in results)
+
+    def test_prompt_rendered_with_config(self, agent):
+        """Тест подстановки параметров конфигурации в промпт"""
+        config = TopicGenerationConfig(field="Экономика", level=EducationLevel.MASTER, count=3)
+
+        system_message, human_message = agent._build_prompt(config)
+
+        assert '"topics"' in system_message.content
+        assert 'Сгенерируй 3 тем ВКР по направлению "Экономика"' in human_message.content
+        assert "{count}" not in human_message.content
+
+    def test_prompt_matches_template(self, agent):
+        """Собранный промпт совпадает с шаблоном; блоки контекста кафедры кэшируются"""
+        from src.agents.prompts import (
+            METHODOLOGY_TEXT, TRENDS_TEXT, format_department_context, format_duplicate_avoidance,
+            format_personalization, format_student_context
+        )
+
+        context = DepartmentContext(
+            research_directions=["Машинное обучение"], existing_topics=["Тема кафедры"]
+        )
+        preferences = StudentPreferences(interests=["NLP"], skills=["Python"])
+        configs = [
+            TopicGenerationConfig(field="Экономика", level=EducationLevel.MASTER, count=3),
+            TopicGenerationConfig(field="Информатика", specialization="ИИ", count=2,
+                                  include_trends=False, student_preferences=preferences,
+                                  department_context=context),
+            TopicGenerationConfig(field="Информатика", count=2, avoid_duplicates=False,
+                                  department_context=DepartmentContext(**context.dict())),
+        ]
+
+        for config in configs:
+            expected = agent.prompt_template.format_messages(
+                count=config.count,
+                field=config.field,
+                specialization_text=(
+                    f"специализация: {config.specialization}" if config.specialization else ""
+                ),
+                level=config.level,
+                trends_text=TRENDS_TEXT if config.include_trends else "",
+                methodology_text=METHODOLOGY_TEXT if config.include_methodology else "",
+                student_context_text=format_student_context(config.student_preferences),
+                department_context_text=format_department_context(config.department_context),
+                duplicate_avoidance_text=format_duplicate_avoidance(
+                    config.avoid_duplicates, config.department_context
+                ),
+                personalization_text=format_personalization(config.student_preferences)
+            )
+            assert agent._prompts.render_request(config) == expected[1].content
+
+        # Одинаковый по содержимому контекст кафедры форматируется один раз
+        assert agent.metrics()["prompts"] == {
+            "department_blocks": 1, "hits": 1, "misses": 1, "hit_ratio": 0.5
+        }
+
+    def test_prompt_shared_prefix(self, agent):
+        """Системное сообщение и контекст кафедры - общие объекты перед запросом студента"""
+        context = DepartmentContext(
+            research_directions=["Машинное обучение"], existing_topics=["Тема кафедры"]
+        )
+        first = agent._build_prompt(TopicGenerationConfig(
+            field="Информатика", count=2,
+            student_preferences=StudentPreferences(interests=["NLP"]),
+            department_context=context
+        ))
+        second = agent._build_prompt(TopicGenerationConfig(
+            field="Информатика", count=3, department_context=DepartmentContext(**context.dict())
+        ))
+
+        assert len(first) == len(second) == 3
+        assert first[0] is second[0] is agent._prompts.system_message
+        assert first[1] is second[1]
+        assert "Машинное обучение" in first[1].content and "- Тема кафедры" in first[1].content
+        assert "Машинное обучение" not in first[2].content and "NLP" in first[2].content
+
+        without_avoidance = agent._build_prompt(TopicGenerationConfig(
+            field="Информатика", count=2, avoid_duplicates=False, department_context=context
+        ))
+        assert "Тема кафедры" not in without_avoidance[1].content
+
+    def test_anthropic_prompt_marked_for_caching(self, agent, monkeypatch):
+        """Для Anthropic системные сообщения объединяются в одно с отметками cache_control"""
+        from src.config import settings
+
+        context = DepartmentContext(research_directions=["Машинное обучение"])
+        prompt = agent._build_prompt(
+            TopicGenerationConfig(field="Информатика", department_context=context)
+        )
+
+        anthropic_prompt = agent._provider_prompt(prompt, "anthropic:claude-sonnet-4-5")
+        system_message, human_message = anthropic_prompt
+        blocks = system_message.content
+        assert [block["text"] for block in blocks] == [prompt[0].content, prompt[1].content]
+        assert all(block["cache_control"] == {"type": "ephemeral"} for block in blocks)
+        assert human_message is prompt[2]
+
+        assert agent._provider_prompt(prompt, "openai:gpt-4.1") is prompt
+        monkeypatch.setattr(settings, "prompt_caching", False)
+        assert agent._provider_prompt(prompt, "anthropic:claude-sonnet-4-5") is prompt
+
+    @pytest.mark.asyncio
+    async def test_cached_tokens_recorded(self, agent, mock_llm):
+        """Токены, прочитанные из кэша префиксов и записанные в него, учитываются по usage"""
+        response = MagicMock()
+        response.content = (
+            '{"topics": [{"title": "Рекомендательная система для библиотеки", '
+            '"keywords": [], "difficulty": "Средняя"}]}'
+        )
+        response.usage_metadata = {
+            "input_tokens": 1200, "output_tokens": 100, "total_tokens": 1300,
+            "input_token_details": {"cache_read": 900, "cache_creation": 0}
+        }
+        mock_llm.ainvoke.return_value = response
+
+        await agent.generate_topics(TopicGenerationConfig(field="Информатика", count=1))
+
+        metrics = agent.metrics()
+        assert metrics["cache_read_tokens"] == 900
+        assert metrics["cache_creation_tokens"] == 0
+        assert metrics["cache_read_ratio"] == 0.75
+
+    @pytest.mark.asyncio
+    async def test_small_requests_packed_into_one_call(self, mock_llm, fake_packing_llm,
+                                                       monkeypatch):
+        """Тест упаковки одновременных небольших запросов в один вызов модели"""
+        import asyncio
+        from src.config import settings
+
+        monkeypatch.setattr(settings, "micro_batch_window", 0.01)
+        with patch('src.agents.vkr_topic_agent.ChatOpenAI') as mock_openai:
+            mock_openai.return_value = mock_llm
+            agent = VKRTopicAgent(model_name="openai:gpt-4.1")
+        agent.llm = fake_packing_llm()
+
+        fields = ["Информатика", "Экономика", "Право"]
+        results = await asyncio.gather(*[
+            agent.generate_topics(TopicGenerationConfig(field=field, count=count))
+            for field, count in zip(fields, [1, 2, 3])
+        ])
+
+        assert agent.llm.calls == 1
+        for field, count, topics in zip(fields, [1, 2, 3], results):
+            assert len(topics) == count
+            assert all(topic.field == field and field in topic.title for topic in topics)
+
+        # Большой запрос выполняется отдельным вызовом
+        await agent.generate_topics(TopicGenerationConfig(field="Физика", count=5))
+        assert agent.llm.calls == 2
+
+        metrics = agent.metrics()
+        assert metrics["llm_calls"] == 2
+        assert metrics["packing"]["batches"] == 1
+        assert metrics["packing"]["avg_batch_size"] == 3
+        # Пакетный ответ учитывается в разборе один раз
+        assert metrics["parsing"]["openai:gpt-4.1"]["responses"] == 2
+        assert metrics["parsing"]["openai:gpt-4.1"]["failures"] == 0
+
+    @pytest.mark.asyncio
+    async def test_packed_missing_section_generated_separately(self, mock_llm, fake_packing_llm,
+                                                               monkeypatch):
+        """Тест отдельной генерации для запроса, пропущенного в пакетном ответе"""
+        import asyncio
+        from src.config import settings
+
+        monkeypatch.setattr(settings, "micro_batch_window", 0.01)
+        with patch('src.agents.vkr_topic_agent.ChatOpenAI') as mock_openai:
+            mock_openai.return_value = mock_llm
+            agent = VKRTopicAgent(model_name="openai:gpt-4.1")
+        agent.llm = fake_packing_llm(skip=[2])
+
+        results = await asyncio.gather(*[
+            agent.generate_topics(TopicGenerationConfig(field=field, count=1))
+            for field in ["Информатика", "Экономика"]
+        ])
+
+        assert agent.llm.calls == 2
+        assert results[1][0].title == "Тема 1 по направлению Экономика"
+        parsing = agent.metrics()["parsing"]["openai:gpt-4.1"]
+        assert parsing["responses"] == 2 and parsing["failures"] == 1
+
+    def test_parse_packed_response_text_sections(self, agent):
+        """Тест разделения текстового пакетного ответа по заголовкам запросов"""
+        configs = [
+            TopicGenerationConfig(field="Информатика", count=1),
+            TopicGenerationConfig(field="Экономика", count=2)
+        ]
+        response_text = """
+        ### Запрос 1
+        1. Первая тема
+        ### Запрос 2
+        1. Вторая тема
+        2. Третья тема
+        """
+
+        (first, second), json_sections = agent._parse_packed_response(response_text, configs)
+
+        assert [topic.title for topic in first] == ["Первая тема"]
+        assert [topic.title for topic in second] == ["Вторая тема", "Третья тема"]
+        assert second[0].field == "Экономика"
+        assert not json_sections
+
     def test_parse_response_simple(self, agent):
         """Тест парсинга простого ответа"""
         response_text = """
@@ -173,6 +418,578 @@ class TestVKRTopicAgent:
         assert topics[1].title == "Вторая тема"
         assert all(topic.field == "Экономика" for topic in topics)
         assert all(topic.level == EducationLevel.MASTER for topic in topics)
+    
+    def test_parse_response_tolerates_model_errors(self, agent, recorded_model_outputs):
+        """Тест парсинга JSON со скобками в пояснениях, висячими запятыми и обрывом"""
+        config = TopicGenerationConfig(field="Информатика", count=5)
+        
+        for text, titles in recorded_model_outputs:
+            topics = agent._parse_response(text, config)
+            assert [topic.title for topic in topics] == titles
+            assert all(topic.field == "Информатика" for topic in topics)
+
+    @pytest.mark.asyncio
+    async def test_stream_topics(self, agent, fake_streaming_llm, streaming_response_text):
+        """Тест потоковой генерации: темы выдаются до окончания ответа"""
+        agent.llm = fake_streaming_llm(streaming_response_text, chunk_size=7)
+        config = TopicGenerationConfig(field="Информатика", level=EducationLevel.BACHELOR, count=3)
+
+        topics = []
+        async for topic in agent.stream_topics(config):
+            topics.append((topic, agent.llm.sent))
+
+        assert [topic.title for topic, _ in topics] == [
+            f"Тема исследования номер {i} о {{фигурных}} скобках" for i in range(1, 4)
+        ]
+        assert topics[0][0].description == 'Описание "темы" 1'
+        # Первая тема получена, когда модель отдала лишь часть ответа
+        assert topics[0][1] < len(streaming_response_text) / 3
+        assert topics[0][0].field == "Информатика"
+
+    @pytest.mark.asyncio
+    async def test_stream_topics_text_fallback(self, agent, fake_streaming_llm):
+        """Тест потоковой генерации при ответе без JSON"""
+        agent.llm = fake_streaming_llm("1. Первая тема исследования\n2. Вторая тема исследования\n")
+        config = TopicGenerationConfig(field="Экономика", count=2)
+
+        topics = [topic async for topic in agent.stream_topics(config)]
+
+        assert [topic.title for topic in topics] == [
+            "Первая тема исследования", "Вторая тема исследования"
+        ]
+
+
+class TestIncrementalTopicParser:
+    """Тесты потокового парсера ответа модели"""
+
+    def test_emits_topic_when_object_closes(self, streaming_response_text):
+        """Тема выдается сразу после закрывающей скобки ее объекта"""
+        from src.agents import IncrementalTopicParser
+
+        parser = IncrementalTopicParser()
+        difficulty_at = streaming_response_text.index('"difficulty"')
+        first_topic_end = streaming_response_text.index("}", difficulty_at)
+        emitted_at = []
+
+        for position, char in enumerate(streaming_response_text):
+            for topic in parser.feed(char):
+                emitted_at.append((position, topic["title"]))
+
+        assert len(emitted_at) == 5
+        assert emitted_at[0][0] == first_topic_end
+        assert parser.topics_emitted == 5
+
+    def test_ignores_text_after_array(self):
+        """Текст после массива topics не разбирается как темы"""
+        from src.agents import IncrementalTopicParser
+
+        parser = IncrementalTopicParser()
+        topics = parser.feed(
+            '{"topics": [{"title": "А"}, {"title": "Б"}], "extra": {"title": "В"}}'
+        )
+
+        assert [topic["title"] for topic in topics] == ["А", "Б"]
+
+    def test_recorded_outputs(self, recorded_model_outputs):
+        """Темы извлекаются из ответов с пояснениями, висячими запятыми и обрывом"""
+        from src.agents import IncrementalTopicParser
+
+        for text, titles in recorded_model_outputs:
+            parser = IncrementalTopicParser()
+            topics = parser.feed(text) + parser.finish()
+            assert [topic["title"] for topic in topics] == titles
+
+    def test_fuzz_chunk_boundaries(self, recorded_model_outputs):
+        """Результат не зависит от того, как ответ разбит на фрагменты"""
+        import random
+        from src.agents import IncrementalTopicParser
+
+        rng = random.Random(7)
+        for text, titles in recorded_model_outputs:
+            for _ in range(200):
+                parser = IncrementalTopicParser()
+                topics = []
+                position = 0
+                while position < len(text):
+                    size = rng.randint(1, 12)
+                    topics += parser.feed(text[position:position + size])
+                    position += size
+                topics += parser.finish()
+                assert [topic["title"] for topic in topics] == titles
+                assert parser.text == text
+
+    def test_fuzz_truncation(self, recorded_model_outputs):
+        """Оборванный в любом месте ответ дает начало списка тем без недописанных названий"""
+        import json
+        from src.agents import IncrementalTopicParser
+        from src.agents.streaming_parser import loads_tolerant
+
+        for text, titles in recorded_model_outputs:
+            for cut in range(len(text) + 1):
+                parser = IncrementalTopicParser()
+                topics = parser.feed(text[:cut]) + parser.finish()
+                found = [topic["title"] for topic in topics]
+                assert found == titles[:len(found)]
+
+        complete = json.dumps(
+            {"topics": [{"title": "Тема", "keywords": ["а", "б"]}]}, ensure_ascii=False
+        )
+        for cut in range(complete.index(",") + 1, len(complete) + 1):
+            data = loads_tolerant(complete[:cut])
+            assert isinstance(data, dict)
+
+    def test_repair_json(self):
+        """Исправление висячих запятых и оборванного текста"""
+        import json
+        from src.agents.streaming_parser import repair_json
+
+        repaired = json.loads(repair_json('{"a": [1, 2,], "b": {"c": 3,},}'))
+        assert repaired == {"a": [1, 2], "b": {"c": 3}}
+        assert json.loads(repair_json('{"a": "x, y", "b": [1, 2')) == {"a": "x, y", "b": [1, 2]}
+        assert json.loads(repair_json('{"a": 1, "b": "недопис')) == {"a": 1}
+        assert json.loads(repair_json('{"a": 1, "b":')) == {"a": 1}
+        assert json.loads(repair_json('{"a": ",]}"')) == {"a": ",]}"}
+
+
+class TestProviderLimiter:
+    """Тесты ограничения вызовов провайдера"""
+
+    @pytest.mark.asyncio
+    async def test_fair_queue_and_concurrency(self):
+        """Вызовы ждут свободного слота в порядке поступления"""
+        import asyncio
+        from src.agents import ProviderLimiter
+
+        limiter = ProviderLimiter("test", max_concurrency=2)
+        running = 0
+        max_running = 0
+        order = []
+
+        async def call(number):
+            nonlocal running, max_running
+            async with limiter.limit():
+                order.append(number)
+                running += 1
+                max_running = max(max_running, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*[call(number) for number in range(8)])
+
+        assert max_running == 2
+        assert order == list(range(8))
+        metrics = limiter.metrics()
+        assert metrics["calls"] == 8
+        assert metrics["throttled"] == 6
+        assert metrics["wait_time_p95"] > 0.02
+
+    @pytest.mark.asyncio
+    async def test_requests_per_minute(self):
+        """Ведро токенов пропускает не больше заданной скорости"""
+        import time
+        from src.agents import TokenBucket
+
+        bucket = TokenBucket(rate_per_minute=600, capacity=2)  # 10 в секунду
+        start_time = time.perf_counter()
+        for _ in range(5):
+            await bucket.acquire()
+
+        # 2 из запаса, еще 3 - по 0.1 с
+        assert time.perf_counter() - start_time >= 0.25
+
+    async def _generate_concurrently(self, server_url, mock_llm):
+        import asyncio
+        from langchain_openai import ChatOpenAI
+
+        with patch('src.agents.vkr_topic_agent.ChatOpenAI') as mock_openai:
+            mock_openai.return_value = mock_llm
+            agent = VKRTopicAgent(model_name="openai:gpt-4.1")
+        agent.llm = ChatOpenAI(model="gpt-4.1", api_key="test", base_url=server_url, max_retries=0)
+
+        results = await asyncio.gather(*[
+            agent.generate_topics(TopicGenerationConfig(field=f"Область {number}", count=1))
+            for number in range(6)
+        ], return_exceptions=True)
+        return agent, results
+
+    @pytest.mark.asyncio
+    async def test_burst_without_limit_gets_429(self, fake_llm_server, mock_llm, monkeypatch):
+        """Без ограничения всплеск запросов получает 429 от сервера"""
+        from src.config import settings
+
+        monkeypatch.setattr(settings, "llm_max_attempts", 1)
+        _, results = await self._generate_concurrently(fake_llm_server.url, mock_llm)
+
+        assert fake_llm_server.rejected > 0
+        assert any(isinstance(result, Exception) for result in results)
+
+    @pytest.mark.asyncio
+    async def test_burst_with_limit_succeeds(self, fake_llm_server, mock_llm, monkeypatch):
+        """С ограничением одновременных вызовов все запросы проходят без 429"""
+        from src.config import settings
+
+        monkeypatch.setattr(settings, "openai_max_concurrency", fake_llm_server.max_concurrency)
+        agent, results = await self._generate_concurrently(fake_llm_server.url, mock_llm)
+
+        assert fake_llm_server.rejected == 0
+        assert fake_llm_server.max_in_flight == 2
+        assert all(len(topics) == 1 for topics in results)
+
+        metrics = agent.metrics()
+        assert metrics["input_tokens"] == 6 * 500
+        assert metrics["rate_limits"]["openai"]["calls"] == 6
+        assert metrics["rate_limits"]["openai"]["throttled"] >= 4
+
+
+class TestResilientCalls:
+    """Тесты повторов и хеджирования вызовов модели"""
+
+    def _agent(self, mock_llm, server_url):
+        from langchain_openai import ChatOpenAI
+
+        with patch('src.agents.vkr_topic_agent.ChatOpenAI') as mock_openai:
+            mock_openai.return_value = mock_llm
+            agent = VKRTopicAgent(model_name="openai:gpt-4.1")
+        agent.llm = ChatOpenAI(model="gpt-4.1", api_key="test", base_url=server_url, max_retries=0)
+        return agent
+
+    def test_retry_delay_honours_retry_after(self):
+        """Retry-After сервера важнее экспоненциальной задержки"""
+        import httpx
+        import openai
+        from src.agents.retry import RetryPolicy, is_transient_error
+
+        def status_error(status, headers):
+            request = httpx.Request("POST", "http://test/v1/chat/completions")
+            response = httpx.Response(status, headers=headers, request=request)
+            return openai.APIStatusError("error", response=response, body=None)
+
+        policy = RetryPolicy(max_attempts=5, base_delay=0.5, max_delay=10)
+
+        assert policy.delay(1, status_error(429, {"Retry-After": "3"})) == 3
+        assert policy.delay(1, status_error(429, {"retry-after-ms": "250"})) == 0.25
+        assert policy.delay(1, status_error(503, {"Retry-After": "600"})) == 10
+        assert all(0 <= policy.delay(3, Exception()) <= 2 for _ in range(100))
+        assert is_transient_error(status_error(503, {}))
+        assert not is_transient_error(status_error(400, {}))
+
+    @pytest.mark.asyncio
+    async def test_transient_errors_retried(self, fake_llm_server_factory, mock_llm, monkeypatch):
+        """Ошибки 503 и 500 повторяются, Retry-After соблюдается"""
+        import time
+        from src.config import settings
+
+        monkeypatch.setattr(settings, "llm_retry_base_delay", 0.01)
+        server = fake_llm_server_factory(plan=[(503, 0, {"Retry-After": "0.2"}), (500, 0, {})])
+        agent = self._agent(mock_llm, server.url)
+
+        start_time = time.perf_counter()
+        topics = await agent.generate_topics(TopicGenerationConfig(field="Информатика", count=1))
+
+        assert len(topics) == 1
+        assert time.perf_counter() - start_time >= 0.2
+        assert server.accepted == 3
+        assert agent.metrics()["resilience"]["openai:gpt-4.1"]["retries"] == 2
+
+    @pytest.mark.asyncio
+    async def test_client_error_not_retried(self, fake_llm_server_factory, mock_llm):
+        """Ошибка запроса (400) не повторяется"""
+        server = fake_llm_server_factory(plan=[(400, 0, {})])
+        agent = self._agent(mock_llm, server.url)
+
+        with pytest.raises(Exception):
+            await agent.generate_topics(TopicGenerationConfig(field="Информатика", count=1))
+
+        assert server.accepted == 1
+        assert agent.metrics()["resilience"]["openai:gpt-4.1"]["failures"] == 1
+
+    @pytest.mark.asyncio
+    async def test_stream_open_retried(self, mock_llm, fake_streaming_llm, streaming_response_text):
+        """Ошибка 429 до первой части потока повторяется с Retry-After, вызов учитывается"""
+        import httpx
+        import openai
+
+        request = httpx.Request("POST", "http://test/v1/chat/completions")
+        rate_limited = openai.APIStatusError(
+            "rate limited",
+            response=httpx.Response(429, headers={"Retry-After": "0"}, request=request),
+            body=None,
+        )
+
+        class RateLimitedLLM(fake_streaming_llm):
+            async def astream(self, prompt):
+                if self.calls == 0:
+                    self.calls += 1
+                    raise rate_limited
+                async for chunk in super().astream(prompt):
+                    yield chunk
+
+        with patch('src.agents.vkr_topic_agent.ChatOpenAI') as mock_openai:
+            mock_openai.return_value = mock_llm
+            agent = VKRTopicAgent(model_name="openai:gpt-4.1")
+        agent.llm = RateLimitedLLM(streaming_response_text)
+
+        config = TopicGenerationConfig(field="Информатика", count=2)
+        topics = [topic async for topic in agent.stream_topics(config)]
+
+        assert len(topics) == 2
+        assert agent.llm.calls == 2
+        metrics = agent.metrics()
+        assert metrics["resilience"]["openai:gpt-4.1"]["retries"] == 1
+        assert metrics["llm_calls"] == 1
+        assert metrics["prompt_chars"] > 0
+
+    @pytest.mark.asyncio
+    async def test_hedged_request_cuts_latency_spike(self, fake_llm_server_factory, mock_llm,
+                                                     monkeypatch):
+        """Медленный запрос дублируется после p95, берется первый ответ"""
+        import time
+        from src.config import settings
+
+        monkeypatch.setattr(settings, "llm_hedging", True)
+        server = fake_llm_server_factory(max_concurrency=4, delay=0.02, plan=[(200, 2.0, {})])
+        agent = self._agent(mock_llm, server.url)
+        agent._callers[agent.model_name]._latencies.extend([0.05] * settings.llm_hedge_min_samples)
+
+        start_time = time.perf_counter()
+        topics = await agent.generate_topics(TopicGenerationConfig(field="Информатика", count=1))
+
+        assert len(topics) == 1
+        assert time.perf_counter() - start_time < 1.0
+        metrics = agent.metrics()["resilience"]["openai:gpt-4.1"]
+        assert metrics["hedges"] == 1
+        assert metrics["hedge_wins"] == 1
+
+
+class TestModelRouting:
+    """Тесты выбора модели из цепочки"""
+
+    def test_router_prefers_fast_healthy_model(self, monkeypatch):
+        """Быстрая исправная модель идет первой, неисправная - последней до паузы"""
+        from src.agents.routing import ModelRouter
+
+        router = ModelRouter(["a", "b", "c"], alpha=0.5, max_error_rate=0.5, cooldown=30)
+        assert router.order() == ["a", "b", "c"]
+
+        router.record_success("a", 0.5)
+        router.record_success("b", 0.1)
+        assert router.order() == ["c", "b", "a"]  # c еще не вызывалась
+
+        router.record_failure("c", failover=True)
+        assert router.order() == ["b", "a", "c"]  # c без успешных ответов
+
+        router.record_failure("b", failover=True)
+        router.record_failure("b", failover=True)
+        assert not router.is_healthy("b")
+        assert router.order() == ["a", "c", "b"]
+
+        monkeypatch.setattr("src.agents.routing.time.monotonic", lambda: 10 ** 9)
+        assert router.is_healthy("b")
+
+    def _agent(self, models):
+        with patch('src.agents.vkr_topic_agent.ChatOpenAI'), \
+             patch('src.agents.vkr_topic_agent.ChatAnthropic'):
+            return VKRTopicAgent(models=models)
+
+    @staticmethod
+    def _llm(delay=0.0, error=None):
+        import asyncio
+
+        response = MagicMock()
+        response.content = '{"topics": [{"title": "Тема исследования из ответа модели"}]}'
+        response.usage_metadata = None
+
+        async def ainvoke(prompt):
+            await asyncio.sleep(delay)
+            if error is not None:
+                raise error
+            return response
+
+        llm = MagicMock()
+        llm.ainvoke = AsyncMock(side_effect=ainvoke)
+        return llm
+
+    @pytest.mark.asyncio
+    async def test_failover_to_next_model(self):
+        """Ошибка модели передает запрос следующей; model_used - ответившая модель"""
+        agent = self._agent(["openrouter:free-model", "anthropic:claude-sonnet-4"])
+        agent._llms["openrouter:free-model"] = self._llm(error=Exception("Model unavailable"))
+        agent._llms["anthropic:claude-sonnet-4"] = self._llm()
+
+        topics = await agent.generate_topics(TopicGenerationConfig(field="Информатика", count=1))
+        assert topics[0].model_used == "anthropic:claude-sonnet-4"
+
+        # Следующий запрос сразу уходит исправной модели
+        await agent.generate_topics(TopicGenerationConfig(field="Экономика", count=1))
+        assert agent._llms["openrouter:free-model"].ainvoke.await_count == 1
+        assert agent._llms["anthropic:claude-sonnet-4"].ainvoke.await_count == 2
+
+        routing = agent.metrics()["routing"]
+        assert routing["openrouter:free-model"]["failovers"] == 1
+        assert routing["anthropic:claude-sonnet-4"]["routed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_routes_to_fastest_model(self):
+        """После оценки задержек запросы идут самой быстрой модели"""
+        agent = self._agent(["openai:gpt-4.1", "openrouter:free-model"])
+        agent._llms["openai:gpt-4.1"] = self._llm(delay=0.05)
+        agent._llms["openrouter:free-model"] = self._llm(delay=0.001)
+
+        used = []
+        for number in range(5):
+            topics = await agent.generate_topics(
+                TopicGenerationConfig(field=f"Область {number}", count=1)
+            )
+            used.append(topics[0].model_used)
+
+        assert used == ["openai:gpt-4.1"] + ["openrouter:free-model"] * 4
+
+    @pytest.mark.asyncio
+    async def test_all_models_failed(self):
+        """Если все модели цепочки недоступны, пробрасывается последняя ошибка"""
+        agent = self._agent(["openai:gpt-4.1", "openrouter:free-model"])
+        agent._llms["openai:gpt-4.1"] = self._llm(error=Exception("First error"))
+        agent._llms["openrouter:free-model"] = self._llm(error=Exception("Second error"))
+
+        with pytest.raises(Exception, match="Second error"):
+            await agent.generate_topics(TopicGenerationConfig(field="Информатика", count=1))
+
+    @pytest.mark.asyncio
+    async def test_stream_failover_before_first_topic(self, fake_streaming_llm,
+                                                      streaming_response_text):
+        """Поток переходит на следующую модель, если первая упала до первой темы"""
+        agent = self._agent(["openrouter:free-model", "openai:gpt-4.1"])
+        failing = MagicMock()
+        failing.astream = MagicMock(side_effect=Exception("Model unavailable"))
+        agent._llms["openrouter:free-model"] = failing
+        agent._llms["openai:gpt-4.1"] = fake_streaming_llm(streaming_response_text)
+
+        config = TopicGenerationConfig(field="Информатика", count=2)
+        topics = [topic async for topic in agent.stream_topics(config)]
+
+        assert len(topics) == 2
+        assert all(topic.model_used == "openai:gpt-4.1" for topic in topics)
+
+
+class TestSharedHttpClient:
+    """Тесты общего пула HTTP-соединений"""
+
+    def test_client_per_event_loop(self):
+        """Каждый event loop получает свой пул соединений, общий для вызовов внутри loop"""
+        import asyncio
+        from src.agents.http_client import close_http_client, loop_http_client
+
+        async def clients():
+            first, second = loop_http_client(), loop_http_client()
+            await close_http_client()
+            return first, second
+
+        first, second = asyncio.run(clients())
+        other, _ = asyncio.run(clients())
+
+        assert first is second
+        assert other is not first
+        assert first.is_closed and other.is_closed
+
+    @pytest.mark.asyncio
+    async def test_agents_reuse_pooled_connections(self, fake_llm_server_factory, monkeypatch):
+        """Агенты используют один клиент, соединения переиспользуются под нагрузкой"""
+        import asyncio
+        from src.agents import get_http_client
+        from src.agents.http_client import connection_stats
+        from src.config import settings
+
+        server = fake_llm_server_factory(max_concurrency=8, delay=0.01)
+        monkeypatch.setenv("OPENAI_BASE_URL", server.url)
+        monkeypatch.setattr(settings, "openai_api_key", "test")
+        monkeypatch.setattr(settings, "openai_max_concurrency", 4)
+
+        agents = [VKRTopicAgent(model_name="openai:gpt-4.1") for _ in range(3)]
+        assert all(agent.llm.http_async_client is get_http_client() for agent in agents)
+
+        before = connection_stats.metrics()
+        results = await asyncio.gather(*[
+            agents[number % 3].generate_topics(
+                TopicGenerationConfig(field=f"Область {number}", count=1)
+            )
+            for number in range(30)
+        ])
+        after = connection_stats.metrics()
+
+        assert all(len(topics) == 1 for topics in results)
+        assert server.rejected == 0
+        requests = after["requests"] - before["requests"]
+        connections = after["connections"] - before["connections"]
+        assert requests == 30
+        assert connections <= 4
+        assert 1 - connections / requests >= 0.85
+
+
+class TestStructuredOutput:
+    """Тесты генерации со структурированным выводом"""
+
+    @pytest.fixture
+    def agent(self, mock_llm):
+        """Создание агента с мок-моделью"""
+        with patch('src.agents.vkr_topic_agent.ChatOpenAI') as mock_openai:
+            mock_openai.return_value = mock_llm
+            return VKRTopicAgent(model_name="openai:gpt-4.1")
+
+    @pytest.mark.asyncio
+    async def test_topics_from_tool_call(self, fake_llm_server_factory, monkeypatch):
+        """Темы приходят вызовом инструмента по схеме и разбираются без эвристик"""
+        from src.config import settings
+
+        server = fake_llm_server_factory(max_concurrency=4, delay=0.0)
+        monkeypatch.setenv("OPENAI_BASE_URL", server.url)
+        monkeypatch.setattr(settings, "openai_api_key", "test")
+        monkeypatch.setattr(settings, "structured_output", True)
+
+        agent = VKRTopicAgent(model_name="openai:gpt-4.1")
+        topics = await agent.generate_topics(TopicGenerationConfig(field="Информатика", count=1))
+
+        assert [topic.title for topic in topics] == ["Тема исследования с локального сервера"]
+        assert topics[0].model_used == "openai:gpt-4.1"
+        assert server.last_request["tools"][0]["function"]["name"] == "GeneratedTopics"
+        parsing = agent.metrics()["parsing"]["openai:gpt-4.1"]
+        assert parsing["responses"] == 1
+        assert parsing["failure_rate"] == 0
+
+    @pytest.mark.asyncio
+    async def test_schema_violation_counted_as_parse_failure(self, agent):
+        """Ответ не по схеме учитывается как ошибка разбора, темы берутся из аргументов"""
+        from langchain_core.messages import AIMessage
+
+        # Аргументы вызова оборваны (ответ уперся в max_tokens)
+        raw = AIMessage(content="", invalid_tool_calls=[{
+            "name": "GeneratedTopics", "id": "call_1", "error": None, "type": "invalid_tool_call",
+            "args": '{"topics": [{"title": "Тема исследования из аргументов"}, {"title": "Оборван'
+        }])
+        structured_llm = AsyncMock()
+        structured_llm.ainvoke.return_value = {
+            "raw": raw, "parsed": None, "parsing_error": ValueError("args")
+        }
+        agent.llm.with_structured_output = MagicMock(return_value=structured_llm)
+        agent.structured_output = True
+
+        topics = await agent.generate_topics(TopicGenerationConfig(field="Экономика", count=2))
+
+        assert [topic.title for topic in topics] == ["Тема исследования из аргументов"]
+        parsing = agent.metrics()["parsing"][agent.model_name]
+        assert parsing["failures"] == 1
+        assert parsing["failure_rate"] == 1.0
+
+    @pytest.mark.asyncio
+    async def test_text_fallback_counted_as_parse_failure(self, agent):
+        """В текстовом режиме ответ без JSON учитывается как ошибка разбора"""
+        agent.llm.ainvoke.return_value = MagicMock(
+            content="1. Тема исследования без JSON", usage_metadata=None
+        )
+
+        topics = await agent.generate_topics(TopicGenerationConfig(field="Экономика", count=1))
+
+        assert [topic.title for topic in topics] == ["Тема исследования без JSON"]
+        assert agent.metrics()["parsing"][agent.model_name]["failure_rate"] == 1.0
 
 
 class TestTopicGenerationConfig:
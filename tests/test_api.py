@@ -7,7 +7,7 @@ from fastapi.testclient import TestClient
 from unittest.mock import AsyncMock, patch, MagicMock
 import json
 
-from src.models import EducationLevel, TopicStatus, VKRTopic
+from src.models import EducationLevel, TopicStatus, VKRTopic, TopicSearchRequest
 
 
 class TestAPIEndpoints:
@@ -74,6 +74,126 @@ class TestAPIEndpoints:
         assert data["total_count"] == 2
         assert data["model_used"] == "openai:gpt-4.1"
     
+    def test_generate_topics_model_used_from_router(self, test_client, topic_repository,
+                                                    sample_topics_list):
+        """Тест model_used: модель, выбранная агентом, а не модель по умолчанию"""
+        from src.api.server import app
+        from src.database import get_db
+        
+        mock_agent = MagicMock()
+        mock_agent.generate_topics = AsyncMock(return_value=[
+            VKRTopic(**topic_data, model_used="anthropic:claude-sonnet-4")
+            for topic_data in sample_topics_list
+        ])
+        
+        app.dependency_overrides[get_db] = lambda: topic_repository
+        try:
+            with patch('src.api.server.topic_agent', mock_agent):
+                response = test_client.post(
+                    "/generate-topics", json={"field": "Информатика", "count": 2}
+                )
+        finally:
+            app.dependency_overrides.clear()
+        
+        assert response.status_code == 200
+        assert response.json()["model_used"] == "anthropic:claude-sonnet-4"
+        assert all(
+            topic["model_used"] == "anthropic:claude-sonnet-4"
+            for topic in response.json()["topics"]
+        )
+    
+    def test_generate_topics_stream(self, test_client, topic_repository, sample_topics_list):
+        """Тест потоковой генерации тем (Server-Sent Events)"""
+        from src.api.server import app
+        from src.database import get_db
+        
+        async def stream_topics(config):
+            for topic_data in sample_topics_list:
+                yield VKRTopic(**topic_data)
+        
+        mock_agent = MagicMock()
+        mock_agent.stream_topics = stream_topics
+        
+        app.dependency_overrides[get_db] = lambda: topic_repository
+        try:
+            with patch('src.api.server.topic_agent', mock_agent):
+                response = test_client.post(
+                    "/generate-topics/stream", json={"field": "Информатика", "count": 2}
+                )
+        finally:
+            app.dependency_overrides.clear()
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        
+        events = []
+        for block in response.text.strip().split("\n\n"):
+            event_line, data_line = block.split("\n")
+            payload = json.loads(data_line.removeprefix("data: "))
+            events.append((event_line.removeprefix("event: "), payload))
+        
+        assert [event for event, _ in events] == ["topic", "topic", "done"]
+        assert events[0][1]["title"] == sample_topics_list[0]["title"]
+        assert events[-1][1]["total_count"] == 2
+        
+        # Темы сохранены после окончания потока
+        import asyncio
+        stored, total_count = asyncio.run(topic_repository.search_topics(
+            TopicSearchRequest(query="", limit=10, offset=0)
+        ))
+        assert total_count == 2
+    
+    def test_generate_topics_batch(self, test_client, topic_repository, sample_topics_list):
+        """Тест пакетной генерации: результаты по мере готовности, ошибка одного запроса"""
+        import asyncio
+        from src.api.server import app
+        from src.database import get_db
+        
+        async def generate_topics(config):
+            if config.field == "Право":
+                raise Exception("API Error")
+            return [VKRTopic(**topic_data) for topic_data in sample_topics_list]
+        
+        mock_agent = MagicMock()
+        mock_agent.generate_topics = generate_topics
+        batch = {
+            "requests": [
+                {"field": field, "count": 2} for field in ["Информатика", "Право", "Экономика"]
+            ],
+            "concurrency": 2
+        }
+        
+        app.dependency_overrides[get_db] = lambda: topic_repository
+        try:
+            with patch('src.api.server.topic_agent', mock_agent):
+                response = test_client.post("/generate-topics/batch", json=batch)
+                too_large = test_client.post(
+                    "/generate-topics/batch", json={"requests": [{"field": "Информатика"}] * 101}
+                )
+        finally:
+            app.dependency_overrides.clear()
+        
+        assert response.status_code == 200
+        events = []
+        for block in response.text.strip().split("\n\n"):
+            event_line, data_line = block.split("\n")
+            payload = json.loads(data_line.removeprefix("data: "))
+            events.append((event_line.removeprefix("event: "), payload))
+        
+        items = {data["index"]: data for event, data in events if event == "item"}
+        assert items[0]["status"] == "ok"
+        assert items[1] == {"index": 1, "status": "error", "error": "API Error"}
+        assert items[2]["result"]["total_count"] == 2
+        assert events[-1][0] == "done"
+        assert events[-1][1]["succeeded"] == 2
+        assert events[-1][1]["stored_topics"] == 4
+        assert too_large.status_code == 400
+        
+        _, total_count = asyncio.run(topic_repository.search_topics(
+            TopicSearchRequest(query="", limit=10, offset=0)
+        ))
+        assert total_count == 4
+    
     def test_generate_topics_validation_error(self, test_client):
         """Тест валидации запроса генерации тем"""
         # Невалидные данные (отсутствует обязательное поле)
@@ -127,6 +247,70 @@ class TestAPIEndpoints:
         assert len(data["topics"]) == 2
         assert data["total_count"] == 2
     
+    def test_search_topics_cursor_pagination(self, test_client, topic_repository):
+        """Тест курсорной пагинации поиска тем"""
+        import asyncio
+        from src.api.server import app
+        from src.database import get_db
+        
+        for i in range(3):
+            asyncio.run(topic_repository.create_topic(VKRTopic(
+                title=f"Тема исследования {i}",
+                field="Информатика",
+                level=EducationLevel.BACHELOR
+            )))
+        
+        app.dependency_overrides[get_db] = lambda: topic_repository
+        try:
+            params = {"query": "", "limit": 2, "pagination": "cursor", "total": "none"}
+            first_page = test_client.get("/topics", params=params).json()
+            
+            params["cursor"] = first_page["next_cursor"]
+            second_page = test_client.get("/topics", params=params).json()
+            
+            invalid_response = test_client.get("/topics", params={"query": "", "cursor": "???"})
+        finally:
+            app.dependency_overrides.clear()
+        
+        assert len(first_page["topics"]) == 2
+        assert first_page["has_next"] is True
+        assert first_page["total_count"] is None
+        assert len(second_page["topics"]) == 1
+        assert second_page["has_next"] is False
+        assert second_page["has_prev"] is True
+        assert second_page["next_cursor"] is None
+        assert invalid_response.status_code == 400
+    
+    def test_get_keyword_stats(self, test_client, topic_repository):
+        """Тест популярных ключевых слов по области"""
+        import asyncio
+        from src.api.server import app
+        from src.database import get_db
+        
+        for i, field in enumerate(["Информатика", "Информатика", "Экономика"]):
+            asyncio.run(topic_repository.create_topic(VKRTopic(
+                title=f"Тема исследования {i}",
+                field=field,
+                level=EducationLevel.BACHELOR,
+                keywords=["анализ данных", f"ключ {i}"]
+            )))
+        
+        app.dependency_overrides[get_db] = lambda: topic_repository
+        try:
+            response = test_client.get(
+                "/stats/keywords", params={"field": "Информатика", "limit": 2}
+            )
+        finally:
+            app.dependency_overrides.clear()
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["field"] == "Информатика"
+        assert data["keywords"] == [
+            {"keyword": "анализ данных", "count": 2},
+            {"keyword": "ключ 0", "count": 1}
+        ]
+    
     def test_search_topics_validation_error(self, test_client):
         """Тест валидации поиска тем"""
         # Отсутствует обязательный параметр query
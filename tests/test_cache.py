@@ -0,0 +1,217 @@
+"""
+Тесты для кэша ответов генерации тем
+"""
+
+import time
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from src.agents import TopicGenerationConfig
+from src.cache import CacheEntry, MemoryCacheBackend, SQLiteCacheBackend, ResponseCache
+from src.models import EducationLevel, VKRTopic, DepartmentContext
+
+
+def _entry(value: str, ttl: float = 60.0) -> CacheEntry:
+    return CacheEntry(value=value, expires_at=time.time() + ttl, cost_seconds=1.5)
+
+
+class TestTopicGenerationConfigFingerprint:
+    """Тесты отпечатка конфигурации генерации"""
+
+    def test_fingerprint_is_canonical(self):
+        """Одинаковые по содержанию конфигурации дают одинаковый отпечаток"""
+        first = TopicGenerationConfig(
+            field="Информатика",
+            level=EducationLevel.BACHELOR,
+            department_context=DepartmentContext(research_directions=["ИИ"])
+        )
+        second = TopicGenerationConfig(
+            department_context=DepartmentContext(research_directions=["ИИ"]),
+            level="Бакалавриат",
+            field="Информатика"
+        )
+
+        assert first.fingerprint("openai:gpt-4.1") == second.fingerprint("openai:gpt-4.1")
+
+    def test_fingerprint_depends_on_config_and_model(self):
+        """Отпечаток различается для разных параметров и моделей"""
+        config = TopicGenerationConfig(field="Информатика", count=3)
+
+        assert config.fingerprint("openai:gpt-4.1") != config.fingerprint(
+            "anthropic:claude-sonnet-4"
+        )
+        assert config.fingerprint("openai:gpt-4.1") != TopicGenerationConfig(
+            field="Информатика", count=4
+        ).fingerprint("openai:gpt-4.1")
+
+
+class TestCacheBackends:
+    """Тесты хранилищ кэша"""
+
+    def test_incomplete_backend_rejected(self):
+        """Хранилище без всех методов интерфейса не создается"""
+        from src.cache.backends import CacheBackend
+
+        class GetOnlyBackend(CacheBackend):
+            def get(self, key):
+                return None
+
+        with pytest.raises(TypeError):
+            GetOnlyBackend()
+
+    @pytest.fixture(params=["memory", "sqlite"])
+    def backend(self, request, tmp_path):
+        if request.param == "memory":
+            backend = MemoryCacheBackend(max_entries=2)
+        else:
+            backend = SQLiteCacheBackend(str(tmp_path / "cache.db"), max_entries=2)
+        yield backend
+        backend.close()
+
+    def test_get_set(self, backend):
+        """Сохранение и чтение записи"""
+        assert backend.get("a") is None
+
+        backend.set("a", _entry("[1]"))
+
+        entry = backend.get("a")
+        assert entry.value == "[1]"
+        assert entry.cost_seconds == 1.5
+
+    def test_lru_eviction(self, backend):
+        """Вытесняется давно не использованная запись"""
+        backend.set("a", _entry("a"))
+        time.sleep(0.01)
+        backend.set("b", _entry("b"))
+        time.sleep(0.01)
+        backend.get("a")
+        time.sleep(0.01)
+        backend.set("c", _entry("c"))
+
+        assert len(backend) == 2
+        assert backend.get("b") is None
+        assert backend.get("a") is not None
+        assert backend.get("c") is not None
+
+    def test_ttl_expiry(self, backend):
+        """Истекшая запись не возвращается"""
+        backend.set("a", _entry("a", ttl=-1))
+
+        assert backend.get("a") is None
+        assert len(backend) == 0
+
+    def test_sqlite_survives_restart(self, tmp_path):
+        """Файловый кэш сохраняется между экземплярами"""
+        path = str(tmp_path / "cache.db")
+        backend = SQLiteCacheBackend(path)
+        backend.set("a", _entry("[1]"))
+        backend.close()
+
+        reopened = SQLiteCacheBackend(path)
+        assert reopened.get("a").value == "[1]"
+        reopened.close()
+
+
+class TestResponseCache:
+    """Тесты кэша ответов"""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("backend_name", ["memory", "sqlite"])
+    async def test_round_trip_and_metrics(self, backend_name, tmp_path, sample_topics_list):
+        """Темы из кэша совпадают с сохраненными, метрики считают попадания"""
+        if backend_name == "memory":
+            backend = MemoryCacheBackend()
+        else:
+            backend = SQLiteCacheBackend(str(tmp_path / "cache.db"))
+        cache = ResponseCache(backend, ttl=60)
+        topics = [VKRTopic(**topic_data) for topic_data in sample_topics_list]
+
+        assert await cache.get("key") is None
+        await cache.set("key", topics, generation_time=2.0)
+        cached = await cache.get("key")
+        cache.record_bypass()
+
+        assert [topic.title for topic in cached.topics] == [topic.title for topic in topics]
+        assert cached.topics[0].level == topics[0].level
+        assert cached.generation_time == 2.0
+
+        metrics = cache.metrics()
+        assert metrics["backend"] == backend_name
+        assert metrics["entries"] == 1
+        assert metrics["hits"] == 1
+        assert metrics["misses"] == 1
+        assert metrics["bypassed"] == 1
+        assert metrics["hit_ratio"] == 0.5
+        assert metrics["latency_saved_seconds"] == 2.0
+        cache.close()
+
+
+class TestGenerateTopicsCache:
+    """Тесты кэширования /generate-topics"""
+
+    def test_identical_requests_served_from_cache(self, test_client, topic_repository,
+                                                  sample_topics_list):
+        """Повторный запрос не обращается к модели, use_cache=false - обращается"""
+        from src.api.server import app
+        from src.database import get_db
+
+        mock_agent = MagicMock()
+        mock_agent.metrics.return_value = {}
+        mock_agent.model_name = "openai:gpt-4.1"
+        mock_agent.generate_topics = AsyncMock(
+            side_effect=lambda config: [VKRTopic(**topic_data) for topic_data in sample_topics_list]
+        )
+        request_data = {"field": "Информатика", "count": 2, "level": "Бакалавриат"}
+
+        app.dependency_overrides[get_db] = lambda: topic_repository
+        try:
+            cache = ResponseCache(MemoryCacheBackend(), ttl=60)
+            with patch("src.api.server.topic_agent", mock_agent), \
+                 patch("src.api.server.response_cache", cache):
+                first = test_client.post("/generate-topics", json=request_data)
+                second = test_client.post("/generate-topics", json=request_data)
+                bypass = test_client.post(
+                    "/generate-topics", params={"use_cache": "false"}, json=request_data
+                )
+                other = test_client.post("/generate-topics", json={**request_data, "count": 1})
+                metrics = test_client.get("/metrics").json()["response_cache"]
+        finally:
+            app.dependency_overrides.clear()
+
+        assert [response.headers["X-Cache"] for response in (first, second, bypass, other)] == [
+            "MISS", "HIT", "BYPASS", "MISS"
+        ]
+        assert second.json()["topics"] == first.json()["topics"]
+        assert mock_agent.generate_topics.await_count == 3
+        assert metrics["hits"] == 1
+        assert metrics["misses"] == 2
+        assert metrics["bypassed"] == 1
+
+
+class TestSingleFlight:
+    """Тесты объединения одновременных вызовов"""
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_does_not_cancel_operation(self):
+        """Отмена одного ожидающего не прерывает общую операцию"""
+        import asyncio
+        from src.cache import SingleFlight
+
+        group = SingleFlight()
+        calls = []
+
+        async def operation():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "готово"
+
+        first = asyncio.ensure_future(group.run("key", operation))
+        second = asyncio.ensure_future(group.run("key", operation))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        assert await second == "готово"
+        assert first.cancelled()
+        assert calls == [1]
+        assert group.coalesced == 1
+        assert group.in_flight == 0
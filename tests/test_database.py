@@ -6,7 +6,8 @@ import pytest
 from datetime import datetime
 from unittest.mock import AsyncMock
 
-from src.database.repository import TopicRepository
+from src.database.repository import TopicRepository, BufferedTopicWriter
+from src.database.async_repository import AsyncTopicRepository
 from src.database.models import TopicDB
 from src.models import VKRTopic, TopicSearchRequest, EducationLevel, TopicStatus, TopicUpdateRequest
 
@@ -27,6 +28,104 @@ class TestTopicRepository:
         assert created_topic.level == topic.level
         assert created_topic.status == TopicStatus.DRAFT
     
+    @pytest.mark.asyncio
+    async def test_create_topics_bulk(self, topic_repository, sample_topics_list):
+        """Тест пакетного создания тем одной транзакцией"""
+        topics = [VKRTopic(**topic_data) for topic_data in sample_topics_list]
+        
+        created_topics = await topic_repository.create_topics_bulk(topics)
+        
+        assert len(created_topics) == len(topics)
+        assert all(topic.id is not None for topic in created_topics)
+        assert len({topic.id for topic in created_topics}) == len(topics)
+        assert [topic.title for topic in created_topics] == [topic.title for topic in topics]
+        
+        retrieved_topic = await topic_repository.get_topic(created_topics[1].id)
+        assert retrieved_topic.title == topics[1].title
+    
+    @pytest.mark.asyncio
+    async def test_create_topics_bulk_empty(self, topic_repository):
+        """Тест пакетного создания пустого списка"""
+        assert await topic_repository.create_topics_bulk([]) == []
+
+    @pytest.mark.asyncio
+    async def test_buffered_writer_flushes_in_batches(self, topic_repository, sample_topics_list):
+        """Тест групповой записи тем параллельных задач"""
+        import asyncio
+
+        class SlowRepository:
+            calls = 0
+
+            async def create_topics_bulk(self, topics):
+                self.calls += 1
+                await asyncio.sleep(0.01)
+                return await topic_repository.create_topics_bulk(topics)
+
+        repository = SlowRepository()
+        writer = BufferedTopicWriter(repository, flush_size=3)
+        topics = [VKRTopic(**topic_data) for topic_data in sample_topics_list]
+
+        results = await asyncio.gather(
+            *[writer.create_topics_bulk([topic]) for topic in topics + topics]
+        )
+        await writer.flush()
+
+        assert [result[0].title for result in results] == [topic.title for topic in topics + topics]
+        assert all(result[0].id is not None for result in results)
+        assert repository.calls < len(results)
+        _, total_count = await topic_repository.search_topics(
+            TopicSearchRequest(query="", limit=10, offset=0)
+        )
+        assert writer.written == total_count == 4
+
+    @pytest.mark.asyncio
+    async def test_buffered_writer_failure_reaches_owner(self, topic_repository,
+                                                         sample_topics_list):
+        """Ошибка записи достается задаче, чьи темы не сохранились; темы других задач сохраняются"""
+        import asyncio
+
+        class RejectingRepository:
+            async def create_topics_bulk(self, topics):
+                await asyncio.sleep(0.01)
+                if any(topic.title == "Отклоняемая базой тема" for topic in topics):
+                    raise RuntimeError("constraint failed")
+                return await topic_repository.create_topics_bulk(topics)
+
+        writer = BufferedTopicWriter(RejectingRepository(), flush_size=10)
+        titles = ["Первая сохраняемая тема", "Вторая сохраняемая тема", "Отклоняемая базой тема",
+                  "Третья сохраняемая тема"]
+        topics = [VKRTopic(**{**sample_topics_list[0], "title": title}) for title in titles]
+
+        # Вторая задача записывает пакет из своей, отклоняемой и четвертой темы
+        results = await asyncio.gather(
+            *[writer.create_topics_bulk([topic]) for topic in topics], return_exceptions=True
+        )
+
+        assert isinstance(results[2], RuntimeError)
+        assert [result[0].title for index, result in enumerate(results) if index != 2] == [
+            title for index, title in enumerate(titles) if index != 2
+        ]
+        assert all(result[0].id is not None for index, result in enumerate(results) if index != 2)
+        assert writer.written == 3
+
+    @pytest.mark.asyncio
+    async def test_buffered_writer_groups_sync_repository(self, topic_repository,
+                                                          sample_topics_list):
+        """Синхронный репозиторий пишет в потоке; темы, пришедшие во время записи, группируются"""
+        import asyncio
+
+        writer = BufferedTopicWriter(topic_repository, flush_size=100)
+        topics = [
+            VKRTopic(**{**sample_topics_list[0], "title": f"Групповая запись темы номер {number}"})
+            for number in range(20)
+        ]
+
+        results = await asyncio.gather(*[writer.create_topics_bulk([topic]) for topic in topics])
+
+        assert all(result[0].id is not None for result in results)
+        assert writer.written == 20
+        assert writer.flushes < 20
+
     @pytest.mark.asyncio
     async def test_get_topic_existing(self, topic_repository, sample_topic_data):
         """Тест получения существующей темы"""
@@ -117,11 +216,54 @@ class TestTopicRepository:
         assert total_count >= 0
         assert len(topics) <= 10
         # Проверяем, что найденные темы содержат ключевые слова поиска
+        # (поиск учитывает словоформы, поэтому сравниваем основы слов)
+        assert total_count == 1
         for topic in topics:
-            search_terms = search_request.query.lower().split()
+            search_terms = [term[:6] for term in search_request.query.lower().split()]
             topic_text = (topic.title + " " + (topic.description or "")).lower()
             assert any(term in topic_text for term in search_terms)
     
+    @pytest.mark.asyncio
+    async def test_search_topics_full_text(self, topic_repository, sample_topics_list):
+        """Тест полнотекстового поиска: регистр, словоформы, ранжирование"""
+        for topic_data in sample_topics_list:
+            await topic_repository.create_topic(VKRTopic(**topic_data))
+        
+        await topic_repository.create_topic(VKRTopic(
+            title="Рекомендательные системы в электронной коммерции",
+            field="Экономика",
+            level=EducationLevel.BACHELOR,
+            description="Обзор подходов к рекомендациям без машинного обучения"
+        ))
+        
+        topics, total_count = await topic_repository.search_topics(
+            TopicSearchRequest(query="СИСТЕМА рекомендаций", limit=10, offset=0)
+        )
+        
+        assert total_count == 2
+        # Совпадение в названии и описании выше, чем только в названии
+        assert topics[0].title == sample_topics_list[0]["title"]
+    
+    @pytest.mark.asyncio
+    async def test_search_index_follows_updates_and_deletes(self, topic_repository,
+                                                            sample_topic_data):
+        """Тест синхронизации полнотекстового индекса при изменении тем"""
+        created_topic = await topic_repository.create_topic(VKRTopic(**sample_topic_data))
+        
+        await topic_repository.update_topic(
+            created_topic.id, TopicUpdateRequest(title="Квантовые вычисления в криптографии")
+        )
+        topics, _ = await topic_repository.search_topics(
+            TopicSearchRequest(query="квантовых", limit=10, offset=0)
+        )
+        assert [topic.id for topic in topics] == [created_topic.id]
+        
+        await topic_repository.delete_topic(created_topic.id)
+        topics, total_count = await topic_repository.search_topics(
+            TopicSearchRequest(query="квантовых", limit=10, offset=0)
+        )
+        assert total_count == 0
+    
     @pytest.mark.asyncio
     async def test_search_topics_by_field(self, topic_repository, sample_topics_list):
         """Тест поиска тем по области"""
@@ -199,6 +341,64 @@ class TestTopicRepository:
         page2_ids = {topic.id for topic in topics_page2}
         assert page1_ids.isdisjoint(page2_ids)
     
+    @pytest.mark.asyncio
+    async def test_search_topics_keyset_pagination(self, topic_repository):
+        """Тест keyset-пагинации по курсору"""
+        from src.database.pagination import TotalMode
+        
+        for i in range(12):
+            await topic_repository.create_topic(VKRTopic(
+                title=f"Тема исследования {i}",
+                field="Информатика",
+                level=EducationLevel.BACHELOR
+            ))
+        
+        search_request = TopicSearchRequest(query="", limit=5, offset=0)
+        page = await topic_repository.search_topics_page(
+            search_request, use_cursor=True, total_mode=TotalMode.NONE
+        )
+        seen_ids = [topic.id for topic in page.topics]
+        
+        while page.next_cursor:
+            page = await topic_repository.search_topics_page(
+                search_request, cursor=page.next_cursor
+            )
+            seen_ids.extend(topic.id for topic in page.topics)
+        
+        assert len(seen_ids) == 12
+        assert len(set(seen_ids)) == 12
+        assert page.has_next is False
+        assert page.total_count == 12
+        assert page.total_is_exact is True
+    
+    @pytest.mark.asyncio
+    async def test_search_topics_page_total_modes(self, topic_repository, sample_topics_list):
+        """Тест необязательного подсчета общего количества"""
+        from src.database.pagination import TotalMode
+        
+        for topic_data in sample_topics_list:
+            await topic_repository.create_topic(VKRTopic(**topic_data))
+        
+        search_request = TopicSearchRequest(query="", limit=1, offset=0)
+        
+        page = await topic_repository.search_topics_page(search_request, total_mode=TotalMode.NONE)
+        assert page.total_count is None
+        assert page.has_next is True
+        
+        page = await topic_repository.search_topics_page(
+            search_request, total_mode=TotalMode.APPROXIMATE
+        )
+        assert page.total_count == 2
+        assert page.next_cursor is None  # режим offset
+    
+    @pytest.mark.asyncio
+    async def test_search_topics_invalid_cursor(self, topic_repository):
+        """Тест обработки поврежденного курсора"""
+        with pytest.raises(ValueError, match="Некорректный курсор"):
+            await topic_repository.search_topics_page(
+                TopicSearchRequest(query="", limit=5, offset=0), cursor="не-курсор"
+            )
+    
     @pytest.mark.asyncio
     async def test_get_stats(self, topic_repository, sample_topics_list):
         """Тест получения статистики"""
@@ -229,6 +429,115 @@ class TestTopicRepository:
         assert stats.by_status["DRAFT"] == 2
         assert stats.by_status["APPROVED"] == 1
 
+    @pytest.mark.asyncio
+    async def test_get_stats_follows_changes(self, topic_repository, sample_topics_list):
+        """Тест обновления счетчиков статистики при изменении и удалении тем"""
+        created = await topic_repository.create_topics_bulk(
+            [VKRTopic(**topic_data, relevance_score=score)
+             for topic_data, score in zip(sample_topics_list, [0.6, 0.8])]
+        )
+
+        stats = await topic_repository.get_stats()
+        assert stats.total_topics == 2
+        assert stats.avg_relevance_score == pytest.approx(0.7)
+
+        await topic_repository.update_topic(
+            created[0].id, TopicUpdateRequest(status=TopicStatus.APPROVED, relevance_score=0.4)
+        )
+        stats = await topic_repository.get_stats()
+        assert stats.by_status == {"DRAFT": 1, "APPROVED": 1}
+        assert stats.avg_relevance_score == pytest.approx(0.6)
+
+        await topic_repository.delete_topic(created[1].id)
+        stats = await topic_repository.get_stats()
+        assert stats.total_topics == 1
+        assert stats.by_status == {"APPROVED": 1}
+        assert stats.avg_relevance_score == pytest.approx(0.4)
+
+    @pytest.mark.asyncio
+    async def test_get_stats_cached(self, topic_repository, sample_topics_list):
+        """Тест кэширования статистики между записями"""
+        from src.database.models import TopicStatsCounter
+
+        await topic_repository.create_topic(VKRTopic(**sample_topics_list[0]))
+        stats = await topic_repository.get_stats()
+
+        # Изменение в обход репозитория не сбрасывает кэш
+        topic_repository.db.query(TopicStatsCounter).delete()
+        topic_repository.db.commit()
+        assert await topic_repository.get_stats() is stats
+
+        # Запись через репозиторий сбрасывает кэш
+        await topic_repository.create_topic(VKRTopic(**sample_topics_list[1]))
+        assert (await topic_repository.get_stats()).total_topics == 1
+
+    def test_stats_counters_rebuilt_for_existing_topics(self, test_db, sample_topics_list):
+        """Тест заполнения счетчиков для базы, созданной до их появления"""
+        from src.database.models import TopicStatsCounter
+        from src.database.stats import install_stats_counters
+
+        for topic_data in sample_topics_list:
+            test_db.add(TopicDB.from_pydantic(VKRTopic(**topic_data)))
+        test_db.commit()
+
+        connection = test_db.connection()
+        TopicStatsCounter.__table__.drop(connection)
+        install_stats_counters(connection)
+        test_db.commit()
+
+        stats = TopicRepository(test_db)._get_stats()
+        assert stats.total_topics == 2
+        assert stats.by_field == {"Информатика": 2}
+
+    @pytest.mark.asyncio
+    async def test_top_keywords_follow_changes(self, topic_repository):
+        """Тест индекса ключевых слов: вставка, изменение, удаление, фильтры"""
+        topics = [
+            ("Информатика", EducationLevel.BACHELOR, ["нейросети", "python", "нейросети"]),
+            ("Информатика", EducationLevel.MASTER, ["нейросети", " базы данных "]),
+            ("Экономика", EducationLevel.BACHELOR, ["python", "финансы"]),
+        ]
+        created = await topic_repository.create_topics_bulk([
+            VKRTopic(title=f"Тема исследования {i}", field=field, level=level, keywords=keywords)
+            for i, (field, level, keywords) in enumerate(topics)
+        ])
+        await topic_repository.create_topic(
+            VKRTopic(title="Тема без ключевых слов", field="Экономика", level=EducationLevel.MASTER)
+        )
+
+        assert await topic_repository.get_top_keywords(2) == [("python", 2), ("нейросети", 2)]
+        assert await topic_repository.get_top_keywords(10, field="Экономика") == [
+            ("python", 1), ("финансы", 1)
+        ]
+        assert await topic_repository.get_top_keywords(
+            10, field="Информатика", level=EducationLevel.MASTER
+        ) == [("базы данных", 1), ("нейросети", 1)]
+
+        await topic_repository.update_topic(created[2].id, TopicUpdateRequest(keywords=["финансы"]))
+        await topic_repository.delete_topic(created[0].id)
+
+        assert await topic_repository.get_top_keywords(10) == [
+            ("базы данных", 1), ("нейросети", 1), ("финансы", 1)
+        ]
+        stats = await topic_repository.get_stats()
+        assert stats.most_popular_keywords == ["базы данных", "нейросети", "финансы"]
+
+    @pytest.mark.asyncio
+    async def test_top_keywords_index_matches_scan(self, topic_repository, sample_topics_list,
+                                                   monkeypatch):
+        """Тест совпадения индекса ключевых слов с подсчетом по таблице тем"""
+        from src.database import keywords
+
+        for topic_data in sample_topics_list:
+            await topic_repository.create_topic(VKRTopic(**topic_data))
+
+        indexed = await topic_repository.get_top_keywords(10, field="Информатика")
+        monkeypatch.setattr(keywords, "keyword_index_supported", lambda dialect_name: False)
+        scanned = await topic_repository.get_top_keywords(10, field="Информатика")
+
+        assert indexed == scanned
+        assert ("машинное обучение", 1) in indexed
+
 
 class TestTopicDBModel:
     """Тесты для модели TopicDB"""
@@ -272,3 +581,109 @@ class TestTopicDBModel:
         assert topic_db.keywords == sample_topic_data["keywords"]
         assert topic_db.created_at is not None
         assert topic_db.updated_at is not None
+
+
+class TestAsyncTopicRepository:
+    """Тесты для асинхронного репозитория тем"""
+    
+    @pytest.mark.asyncio
+    async def test_async_engine_not_reinitialized(self):
+        """Повторная инициализация асинхронного движка без закрытия пула запрещена"""
+        from src.database import dispose_async_engine, init_async_engine
+
+        await dispose_async_engine()
+        engine = init_async_engine("sqlite+aiosqlite:///:memory:")
+        try:
+            with pytest.raises(RuntimeError):
+                init_async_engine("sqlite+aiosqlite:///:memory:")
+        finally:
+            await dispose_async_engine()
+
+        assert init_async_engine("sqlite+aiosqlite:///:memory:") is not engine
+        await dispose_async_engine()
+    
+    @pytest.mark.asyncio
+    async def test_create_and_get_topic(self, async_topic_repository, sample_topic_data):
+        """Тест создания и получения темы через AsyncSession"""
+        topic = VKRTopic(**sample_topic_data)
+        
+        created_topic = await async_topic_repository.create_topic(topic)
+        retrieved_topic = await async_topic_repository.get_topic(created_topic.id)
+        
+        assert created_topic.id is not None
+        assert retrieved_topic is not None
+        assert retrieved_topic.title == topic.title
+        assert retrieved_topic.status == TopicStatus.DRAFT
+    
+    @pytest.mark.asyncio
+    async def test_update_and_delete_topic(self, async_topic_repository, sample_topic_data):
+        """Тест обновления и удаления темы через AsyncSession"""
+        created_topic = await async_topic_repository.create_topic(VKRTopic(**sample_topic_data))
+        
+        updated_topic = await async_topic_repository.update_topic(
+            created_topic.id, TopicUpdateRequest(status=TopicStatus.APPROVED)
+        )
+        assert updated_topic.status == TopicStatus.APPROVED
+        
+        assert await async_topic_repository.delete_topic(created_topic.id) is True
+        assert await async_topic_repository.get_topic(created_topic.id) is None
+    
+    @pytest.mark.asyncio
+    async def test_search_and_stats(self, async_topic_repository, sample_topics_list):
+        """Тест поиска и статистики через AsyncSession"""
+        for topic_data in sample_topics_list:
+            await async_topic_repository.create_topic(VKRTopic(**topic_data))
+        
+        topics, total_count = await async_topic_repository.search_topics(
+            TopicSearchRequest(query="", field="Информатика", limit=10, offset=0)
+        )
+        stats = await async_topic_repository.get_stats()
+        
+        assert total_count == 2
+        assert len(topics) == 2
+        assert stats.total_topics == 2
+        assert stats.by_field["Информатика"] == 2
+    
+    @pytest.mark.asyncio
+    async def test_slow_stats_query_does_not_block_event_loop(self, async_test_engine, monkeypatch):
+        """Медленный запрос статистики не задерживает другие запросы"""
+        import asyncio
+        import time
+        from sqlalchemy import event, text
+        from sqlalchemy.ext.asyncio import AsyncSession
+        
+        query_delay = 0.5
+        
+        @event.listens_for(async_test_engine.sync_engine, "connect")
+        def register_sleep(dbapi_connection, connection_record):
+            # Функция выполняется в потоке драйвера aiosqlite
+            dbapi_connection.create_function("slow_sleep", 1, time.sleep)
+        
+        await async_test_engine.dispose()  # новые соединения получат функцию
+        
+        original_get_stats = TopicRepository._get_stats
+        
+        def slow_get_stats(self):
+            self.db.execute(text("SELECT slow_sleep(:delay)"), {"delay": query_delay})
+            return original_get_stats(self)
+        
+        monkeypatch.setattr(TopicRepository, "_get_stats", slow_get_stats)
+        
+        async def unrelated_request() -> float:
+            """Другой запрос, выполняемый параллельно (время ожидания ответа)"""
+            start_time = time.perf_counter()
+            async with AsyncSession(async_test_engine) as session:
+                await AsyncTopicRepository(session).get_topic(1)
+            return time.perf_counter() - start_time
+        
+        async with AsyncSession(async_test_engine) as session:
+            stats_task = asyncio.create_task(AsyncTopicRepository(session).get_stats())
+            await asyncio.sleep(0.05)  # медленный запрос уже выполняется
+            
+            unrelated_latency = await unrelated_request()
+            stats = await stats_task
+        
+        print(f"Задержка параллельного запроса: {unrelated_latency * 1000:.1f} мс")
+        
+        assert stats.total_topics == 0
+        assert unrelated_latency < query_delay / 2
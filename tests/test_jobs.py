@@ -0,0 +1,302 @@
+"""
+Тесты для фоновых задач генерации
+"""
+
+import asyncio
+import pytest
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from src.agents import TopicGenerationConfig
+from src.jobs import JobManager, JobQueueFullError, JobStatus, TopicPool, run_bounded
+from src.models import DepartmentContext, EducationLevel, VKRTopic, TopicSearchRequest
+
+
+class TestJobManager:
+    """Тесты очереди фоновых задач"""
+
+    @pytest.mark.asyncio
+    async def test_bounded_concurrency(self):
+        """Одновременно выполняется не больше задач, чем обработчиков"""
+        manager = JobManager(workers=2, queue_size=10)
+        running = 0
+        max_running = 0
+
+        async def operation():
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return "готово"
+
+        jobs = [manager.submit("test", operation) for _ in range(6)]
+        assert jobs[0].status == JobStatus.QUEUED
+
+        for job in jobs:
+            await manager.wait(job.id, timeout=1)
+        await manager.stop()
+
+        assert max_running == 2
+        assert all(job.status == JobStatus.SUCCEEDED and job.result == "готово" for job in jobs)
+        assert all(job.wait_time >= 0 and job.run_time > 0 for job in jobs)
+
+        metrics = manager.metrics()
+        assert metrics["succeeded"] == 6
+        assert metrics["queue_depth"] == 0
+        assert metrics["run_time_p50"] > 0
+
+    @pytest.mark.asyncio
+    async def test_queue_full(self):
+        """Переполнение очереди отклоняет задачу"""
+        manager = JobManager(workers=1, queue_size=1)
+        release = asyncio.Event()
+
+        async def operation():
+            await release.wait()
+
+        manager.submit("test", operation)
+        await asyncio.sleep(0)  # обработчик забирает первую задачу
+        manager.submit("test", operation)
+
+        with pytest.raises(JobQueueFullError):
+            manager.submit("test", operation)
+
+        assert manager.metrics()["rejected"] == 1
+        assert manager.metrics()["queue_depth"] == 1
+        release.set()
+        await manager.stop()
+
+    @pytest.mark.asyncio
+    async def test_failed_job_and_long_poll(self):
+        """Ошибка задачи сохраняется, long-poll ждет завершения или таймаута"""
+        manager = JobManager(workers=1)
+
+        async def failing():
+            await asyncio.sleep(0.05)
+            raise RuntimeError("API Error")
+
+        job = manager.submit("test", failing)
+
+        early = await manager.wait(job.id, timeout=0.001)
+        assert early.status in (JobStatus.QUEUED, JobStatus.RUNNING)
+        assert (await manager.wait(job.id, timeout=1)).status == JobStatus.FAILED
+        assert job.error == "API Error"
+        assert await manager.wait("unknown", timeout=1) is None
+        await manager.stop()
+
+    @pytest.mark.asyncio
+    async def test_finished_jobs_retention(self):
+        """Хранятся только последние завершенные задачи"""
+        manager = JobManager(workers=1, retention=2)
+
+        async def operation():
+            return None
+
+        jobs = []
+        for _ in range(4):
+            jobs.append(manager.submit("test", operation))
+            await manager.wait(jobs[-1].id, timeout=1)
+        manager.submit("test", operation)
+
+        assert manager.get(jobs[0].id) is None
+        assert manager.get(jobs[1].id) is None
+        assert manager.get(jobs[3].id) is not None
+        await manager.stop()
+
+
+class TestRunBounded:
+    """Тесты пакетного выполнения с ограничением параллельности"""
+
+    @pytest.mark.asyncio
+    async def test_results_as_completed_with_errors(self):
+        """Результаты выдаются по мере готовности, ошибки не прерывают пакет"""
+        running = 0
+        max_running = 0
+
+        async def operation(delay):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(delay)
+            running -= 1
+            if delay == 0.02:
+                raise RuntimeError("API Error")
+            return delay
+
+        delays = [0.05, 0.01, 0.02, 0.03]
+        results = [item async for item in run_bounded(delays, operation, concurrency=2)]
+
+        assert max_running == 2
+        assert [index for index, _ in results] == [1, 2, 0, 3]
+        assert isinstance(dict(results)[2], RuntimeError)
+        assert dict(results)[0] == 0.05
+
+
+class TestJobsAPI:
+    """Тесты эндпоинтов фоновых задач"""
+
+    @pytest.mark.asyncio
+    async def test_submit_and_long_poll(self, topic_repository, sample_topics_list):
+        """Задача возвращается сразу, результат - через long-poll"""
+        import httpx
+        from src.api.server import app
+
+        mock_agent = MagicMock()
+        mock_agent.metrics.return_value = {}
+        mock_agent.generate_topics = AsyncMock(
+            side_effect=lambda config: [VKRTopic(**topic_data) for topic_data in sample_topics_list]
+        )
+
+        @asynccontextmanager
+        async def test_repository_scope():
+            yield topic_repository
+
+        manager = JobManager(workers=1)
+        transport = httpx.ASGITransport(app=app)
+        with patch("src.api.server.topic_agent", mock_agent), \
+             patch("src.api.server.job_manager", manager), \
+             patch("src.api.server.repository_scope", test_repository_scope):
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                submitted = await client.post(
+                    "/jobs/generate-topics", json={"field": "Информатика", "count": 2}
+                )
+                job_id = submitted.json()["job_id"]
+
+                finished = await client.get(f"/jobs/{job_id}", params={"wait": 5})
+                missing = await client.get("/jobs/unknown")
+                metrics = (await client.get("/metrics")).json()["jobs"]
+        await manager.stop()
+
+        assert submitted.status_code == 202
+        assert submitted.json()["status"] == "queued"
+
+        data = finished.json()
+        assert data["status"] == "succeeded"
+        assert data["result"]["total_count"] == 2
+        assert data["run_time"] is not None
+        assert missing.status_code == 404
+        assert metrics["submitted"] == 1
+
+        _, total_count = await topic_repository.search_topics(
+            TopicSearchRequest(query="", limit=10, offset=0)
+        )
+        assert total_count == 2
+
+
+def _pool_generator():
+    """Генерация тем с уникальными названиями (для запаса)"""
+    generated = []
+
+    async def generate(config, existing):
+        topics = [
+            VKRTopic(title=f"Тема номер {len(generated) + number} по направлению {config.field}",
+                     field=config.field, level=config.level)
+            for number in range(config.count)
+        ]
+        generated.extend(topics)
+        return topics
+
+    return generate, generated
+
+
+class TestTopicPool:
+    """Тесты запаса заранее сгенерированных тем"""
+
+    @pytest.mark.asyncio
+    async def test_refill_popular_combos_and_take(self):
+        """Запас ведется только для популярных сочетаний и выдает каждую тему один раз"""
+        generate, generated = _pool_generator()
+        pool = TopicPool(generate, ["Информатика", "Физика"], capacity=6, low_watermark=3,
+                         batch_size=4, min_requests=1.5)
+        config = TopicGenerationConfig(field="Информатика", level=EducationLevel.BACHELOR, count=2)
+
+        assert await pool.take(config) is None
+        assert await pool.refill() == 0
+        assert await pool.take(config) is None
+        assert await pool.take(TopicGenerationConfig(field="Физика", count=2)) is None
+        assert pool.hot_keys() == [("Информатика", "Бакалавриат")]
+
+        assert await pool.refill() == 6
+        first = await pool.take(config)
+        second = await pool.take(config)
+        assert [topic.title for topic in first + second] == [topic.title for topic in generated[:4]]
+        assert await pool.refill() == 4
+
+        # Запросы с персональным контекстом и не из supported_fields в запас не попадают
+        personal = TopicGenerationConfig(
+            field="Информатика", count=2,
+            department_context=DepartmentContext(existing_topics=["Тема"])
+        )
+        assert await pool.take(personal) is None
+        assert await pool.take(TopicGenerationConfig(field="Химия", count=2)) is None
+
+        metrics = pool.metrics()
+        assert metrics["hits"] == 2
+        assert metrics["misses"] == 3
+        assert metrics["pooled"] == {"Информатика/Бакалавриат": 6}
+        assert metrics["refill_calls"] == 3
+        assert metrics["generated_topics"] == 10
+
+    @pytest.mark.asyncio
+    async def test_duplicates_discarded_on_take(self):
+        """Темы, совпавшие с сохраненными после пополнения, не выдаются"""
+        generate, generated = _pool_generator()
+
+        async def check(topics):
+            return [topic.title != generated[0].title for topic in topics]
+
+        pool = TopicPool(generate, ["Информатика"], check=check, capacity=4, low_watermark=2,
+                         batch_size=4, min_requests=0.5)
+        config = TopicGenerationConfig(field="Информатика", count=2)
+        assert await pool.take(config) is None
+        await pool.refill()
+
+        topics = await pool.take(config)
+        assert [topic.title for topic in topics] == [generated[1].title, generated[2].title]
+        assert pool.metrics()["discarded_duplicates"] == 1
+        assert await pool.take(config) is None
+
+    @pytest.mark.asyncio
+    async def test_generate_topics_served_from_pool(self, topic_repository):
+        """/generate-topics отдает темы запаса без вызова модели и сохраняет их"""
+        import httpx
+        from src.api.server import app
+        from src.database import get_db
+
+        generate, generated = _pool_generator()
+        pool = TopicPool(generate, ["Информатика"], capacity=4, low_watermark=2, min_requests=0.5)
+        mock_agent = MagicMock()
+        mock_agent.metrics.return_value = {}
+        mock_agent.generate_topics = AsyncMock()
+
+        await pool.take(
+            TopicGenerationConfig(field="Информатика", level=EducationLevel.BACHELOR, count=3)
+        )
+        await pool.refill()
+
+        app.dependency_overrides[get_db] = lambda: topic_repository
+        transport = httpx.ASGITransport(app=app)
+        try:
+            with patch("src.api.server.topic_agent", mock_agent), \
+                 patch("src.api.server.topic_pool", pool), \
+                 patch("src.api.server.response_cache", None):
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    response = await client.post(
+                        "/generate-topics", json={"field": "Информатика", "count": 3}
+                    )
+                    metrics = (await client.get("/metrics")).json()["topic_pool"]
+        finally:
+            app.dependency_overrides.clear()
+
+        assert response.status_code == 200
+        assert response.headers["X-Cache"] == "POOL"
+        served = [topic["title"] for topic in response.json()["topics"]]
+        assert served == [topic.title for topic in generated[:3]]
+        mock_agent.generate_topics.assert_not_awaited()
+        assert metrics["hits"] == 1
+
+        _, total_count = await topic_repository.search_topics(
+            TopicSearchRequest(query="", limit=10, offset=0)
+        )
+        assert total_count == 3
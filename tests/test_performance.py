@@ -9,7 +9,7 @@ from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import AsyncMock, patch
 
 from src.agents import VKRTopicAgent, TopicGenerationConfig
-from src.models import EducationLevel
+from src.models import EducationLevel, VKRTopic, TopicSearchRequest
 
 
 class TestPerformance:
@@ -185,7 +185,7 @@ class TestPerformance:
         topics_data = []
         for i in range(1000):
             topic = VKRTopic(
-                title=f"Тема {i}",
+                title=f"Тема исследования {i}",
                 field="Информатика" if i % 2 == 0 else "Экономика",
                 level=EducationLevel.BACHELOR if i % 3 == 0 else EducationLevel.MASTER,
                 description=f"Описание темы {i}",
@@ -201,6 +201,17 @@ class TestPerformance:
         
         print(f"Время создания 1000 тем: {creation_time:.2f} секунд")
         
+        # Измеряем время пакетного создания (одна транзакция)
+        bulk_topics_data = [
+            topic.copy(update={"title": f"Пакетная {topic.title}"}) for topic in topics_data
+        ]
+        start_time = time.time()
+        created_topics = await topic_repository.create_topics_bulk(bulk_topics_data)
+        bulk_creation_time = time.time() - start_time
+        
+        print(f"Время пакетного создания 1000 тем: {bulk_creation_time:.3f} секунд "
+              f"(ускорение x{creation_time / bulk_creation_time:.1f})")
+        
         # Измеряем время поиска
         start_time = time.time()
         search_request = TopicSearchRequest(
@@ -218,6 +229,9 @@ class TestPerformance:
         assert creation_time < 30.0  # Создание менее 30 секунд
         assert search_time < 1.0  # Поиск менее 1 секунды
         assert len(topics) == 100  # Найдено ожидаемое количество
+        assert len(created_topics) == 1000
+        assert all(topic.id is not None for topic in created_topics)
+        assert bulk_creation_time < creation_time
     
     def test_concurrent_api_requests(self, test_client):
         """Тест параллельных API запросов"""
@@ -327,3 +341,842 @@ class TestLoadTesting:
             assert len(successful_results) >= 18  # Не менее 90% успешных
             assert len(failed_results) <= 2  # Не более 10% неудачных
             assert total_time < 10.0  # Общее время менее 10 секунд
+
+
+class TestConnectionPoolBenchmark:
+    """Бенчмарк пула соединений: движок на запрос против общего пула"""
+    
+    REQUESTS = 200
+    
+    @staticmethod
+    def _database_urls(tmp_path):
+        """SQLite всегда, PostgreSQL - если задан TEST_POSTGRES_URL"""
+        import os
+        
+        urls = [f"sqlite:///{tmp_path / 'bench.db'}"]
+        if os.getenv("TEST_POSTGRES_URL"):
+            urls.append(os.environ["TEST_POSTGRES_URL"])
+        return urls
+    
+    def _measure_rps(self, client) -> float:
+        """Количество запросов в секунду к эндпоинту с обращением к БД"""
+        start_time = time.time()
+        for _ in range(self.REQUESTS):
+            response = client.get("/topics/1")
+            assert response.status_code == 404
+        return self.REQUESTS / (time.time() - start_time)
+    
+    def test_pooled_engine_throughput(self, tmp_path):
+        """Сравнение RPS до и после перехода на общий пул"""
+        from fastapi.testclient import TestClient
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        
+        from src.api.server import app
+        from src.database import get_db, init_engine, dispose_engine, TopicRepository
+        from src.database.models import Base
+        
+        client = TestClient(app)
+        
+        for database_url in self._database_urls(tmp_path):
+            engine = init_engine(database_url)
+            Base.metadata.create_all(bind=engine)
+            
+            def legacy_get_db():
+                """Прежняя зависимость: новый движок на каждый запрос"""
+                legacy_engine = create_engine(database_url)
+                session = sessionmaker(autocommit=False, autoflush=False, bind=legacy_engine)()
+                try:
+                    yield TopicRepository(session)
+                finally:
+                    session.close()
+                    legacy_engine.dispose()
+            
+            try:
+                app.dependency_overrides[get_db] = legacy_get_db
+                legacy_rps = self._measure_rps(client)
+            finally:
+                app.dependency_overrides.clear()
+            
+            pooled_rps = self._measure_rps(client)
+            
+            Base.metadata.drop_all(bind=engine)
+            dispose_engine()
+            
+            backend = database_url.split(":", 1)[0]
+            print(f"[{backend}] движок на запрос: {legacy_rps:.0f} RPS, "
+                  f"общий пул: {pooled_rps:.0f} RPS (x{pooled_rps / legacy_rps:.1f})")
+            
+            assert pooled_rps > legacy_rps
+
+
+def _bench_size(default: int) -> int:
+    """Размер синтетического корпуса (VKR_BENCH_TOPICS=1000000 для полного прогона)"""
+    import os
+    
+    return int(os.getenv("VKR_BENCH_TOPICS", default))
+
+
+def _seed_topics(engine, size: int, seed: int = 42) -> list:
+    """Заполнение таблицы тем синтетическими данными, возвращает словарь корпуса"""
+    import random
+    from datetime import datetime, timedelta
+    from src.database.models import TopicDB
+    
+    rng = random.Random(seed)
+    syllables = [c + v for c in "бвгдзклмнпрстфх" for v in "аеиоуя"]
+    vocabulary = sorted({"".join(rng.choices(syllables, k=rng.randint(3, 5))) for _ in range(5000)})
+    # Ключевые слова с распределением Ципфа: частота k-го слова ~ 1/k
+    keyword_weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    fields = ["Информатика", "Экономика", "Физика", "Медицина"]
+    levels = [EducationLevel.BACHELOR, EducationLevel.MASTER]
+    base_time = datetime(2024, 1, 1)
+    
+    batch = []
+    with engine.begin() as connection:
+        for i in range(size):
+            words = rng.sample(vocabulary, 6)
+            batch.append({
+                "title": " ".join(words[:4]),
+                "field": fields[i % len(fields)],
+                "level": levels[i % len(levels)],
+                "description": " ".join(words[2:]),
+                "methodology": " ".join(words[4:]),
+                "keywords": rng.choices(vocabulary, weights=keyword_weights, k=3),
+                "status": "DRAFT",
+                "source": "benchmark",
+                "created_at": base_time + timedelta(seconds=i),
+                "updated_at": base_time + timedelta(seconds=i),
+            })
+            if len(batch) == 10_000:
+                connection.execute(TopicDB.__table__.insert(), batch)
+                batch = []
+        if batch:
+            connection.execute(TopicDB.__table__.insert(), batch)
+    
+    return vocabulary
+
+
+class TestFullTextSearchBenchmark:
+    """Бенчмарк полнотекстового поиска на синтетическом корпусе"""
+    
+    @pytest.mark.asyncio
+    async def test_search_latency(self, tmp_path, monkeypatch):
+        """Сравнение ILIKE и полнотекстового индекса (цель: < 10 мс на запрос)"""
+        import random
+        import statistics
+        from sqlalchemy.orm import Session
+        from src.config import settings
+        from src.database.connection import create_db_engine
+        from src.database.models import Base
+        from src.database.repository import TopicRepository
+        
+        size = _bench_size(20_000)
+        engine = create_db_engine(f"sqlite:///{tmp_path / 'search_bench.db'}")
+        Base.metadata.create_all(bind=engine)
+        vocabulary = _seed_topics(engine, size)
+        
+        rng = random.Random(7)
+        queries = [" ".join(rng.sample(vocabulary, 2)) for _ in range(30)]
+        
+        async def measure(backend: str) -> list:
+            monkeypatch.setattr(settings, "search_backend", backend)
+            latencies = []
+            with Session(engine) as session:
+                repository = TopicRepository(session)
+                for query in queries:
+                    start_time = time.perf_counter()
+                    await repository.search_topics(
+                        TopicSearchRequest(query=query, limit=20, offset=0)
+                    )
+                    latencies.append((time.perf_counter() - start_time) * 1000)
+            return latencies
+        
+        like_latencies = await measure("like")
+        fts_latencies = await measure("auto")
+        engine.dispose()
+        
+        like_p50 = statistics.median(like_latencies)
+        fts_p50 = statistics.median(fts_latencies)
+        fts_p95 = sorted(fts_latencies)[int(len(fts_latencies) * 0.95) - 1]
+        
+        print(f"Поиск по {size} темам: ILIKE p50={like_p50:.2f} мс, "
+              f"FTS p50={fts_p50:.2f} мс, p95={fts_p95:.2f} мс")
+        
+        assert fts_p50 < like_p50
+        assert fts_p50 < 10.0
+
+
+class TestPaginationBenchmark:
+    """Бенчмарк пагинации: OFFSET против курсора (keyset)"""
+    
+    @pytest.mark.asyncio
+    async def test_deep_page_latency(self, tmp_path):
+        """Сравнение задержки первой и глубокой страницы (до 10 000-й)"""
+        import statistics
+        from sqlalchemy.orm import Session
+        from src.database.connection import create_db_engine
+        from src.database.models import Base, TopicDB
+        from src.database.pagination import TotalMode, encode_cursor
+        from src.database.repository import TopicRepository
+        
+        size = _bench_size(20_000)
+        limit = 20
+        deep_page = min(10_000, size // limit - 1)
+        
+        engine = create_db_engine(f"sqlite:///{tmp_path / 'pagination_bench.db'}")
+        Base.metadata.create_all(bind=engine)
+        _seed_topics(engine, size)
+        
+        results = {}
+        with Session(engine) as session:
+            repository = TopicRepository(session)
+            
+            # Курсор глубокой страницы - позиция последней темы предыдущей страницы
+            anchor = (
+                session.query(TopicDB)
+                .order_by(TopicDB.created_at.desc(), TopicDB.id.desc())
+                .offset((deep_page - 1) * limit - 1)
+                .first()
+            )
+            deep_cursor = encode_cursor(anchor.created_at, anchor.id)
+            
+            async def measure(**kwargs) -> float:
+                latencies = []
+                for _ in range(10):
+                    start_time = time.perf_counter()
+                    page = await repository.search_topics_page(**kwargs)
+                    latencies.append((time.perf_counter() - start_time) * 1000)
+                assert len(page.topics) == limit
+                return statistics.median(latencies)
+            
+            for page_number in (1, deep_page):
+                offset_request = TopicSearchRequest(
+                    query="", limit=limit, offset=(page_number - 1) * limit
+                )
+                cursor_request = TopicSearchRequest(query="", limit=limit, offset=0)
+                cursor = None if page_number == 1 else deep_cursor
+                
+                results[("offset", page_number)] = await measure(
+                    search_request=offset_request, total_mode=TotalMode.EXACT
+                )
+                results[("cursor", page_number)] = await measure(
+                    search_request=cursor_request, cursor=cursor, use_cursor=True,
+                    total_mode=TotalMode.NONE
+                )
+        engine.dispose()
+        
+        for (mode, page_number), latency in sorted(results.items()):
+            print(f"{mode:>6}, страница {page_number}: {latency:.2f} мс")
+        
+        # Курсор не зависит от глубины страницы, OFFSET + COUNT растут линейно
+        assert results[("cursor", deep_page)] < results[("offset", deep_page)]
+        assert results[("cursor", deep_page)] < results[("cursor", 1)] * 5 + 1
+
+
+class TestKeywordStatsBenchmark:
+    """Бенчмарк популярных ключевых слов: индекс против разбора JSON"""
+    
+    @pytest.mark.asyncio
+    async def test_top_keywords_latency(self, tmp_path, monkeypatch):
+        """Top-50 ключевых слов (VKR_BENCH_TOPICS=500000 для полного прогона)"""
+        import statistics
+        from sqlalchemy.orm import Session
+        from src.database import keywords
+        from src.database.connection import create_db_engine
+        from src.database.models import Base
+        from src.database.repository import TopicRepository
+        
+        size = _bench_size(20_000)
+        engine = create_db_engine(f"sqlite:///{tmp_path / 'keywords_bench.db'}")
+        Base.metadata.create_all(bind=engine)
+        
+        start_time = time.perf_counter()
+        _seed_topics(engine, size)
+        seed_time = time.perf_counter() - start_time
+        print(f"\nЗаполнение {size} тем с индексом ключевых слов: {seed_time:.1f} с")
+        
+        async def measure(**kwargs) -> tuple:
+            latencies = []
+            with Session(engine) as session:
+                repository = TopicRepository(session)
+                for _ in range(5):
+                    start_time = time.perf_counter()
+                    top = await repository.get_top_keywords(50, **kwargs)
+                    latencies.append((time.perf_counter() - start_time) * 1000)
+            return statistics.median(latencies), top
+        
+        results = {}
+        filters = [
+            ("все темы", {}),
+            ("область + уровень", {"field": "Экономика", "level": EducationLevel.MASTER}),
+        ]
+        for name, kwargs in filters:
+            index_latency, index_top = await measure(**kwargs)
+            
+            with monkeypatch.context() as patched:
+                patched.setattr(keywords, "keyword_index_supported", lambda dialect_name: False)
+                scan_latency, scan_top = await measure(**kwargs)
+            
+            assert index_top == scan_top
+            results[name] = (index_latency, scan_latency)
+            print(f"{name}: индекс {index_latency:.2f} мс, разбор JSON {scan_latency:.2f} мс")
+        engine.dispose()
+        
+        for index_latency, scan_latency in results.values():
+            assert index_latency < scan_latency
+
+
+class TestStreamingBenchmark:
+    """Бенчмарк потоковой генерации: время до первой темы"""
+    
+    @pytest.mark.asyncio
+    async def test_time_to_first_topic(self, fake_streaming_llm, streaming_response_text):
+        """Время до первой темы при потоковой генерации против полного ответа"""
+        with patch('src.agents.vkr_topic_agent.ChatOpenAI'):
+            agent = VKRTopicAgent()
+        
+        # ~50 фрагментов по 2 мс: полный ответ модели занимает ~0.1-0.2 с
+        agent.llm = fake_streaming_llm(streaming_response_text, chunk_size=24, delay=0.002)
+        config = TopicGenerationConfig(field="Информатика", count=5)
+        
+        start_time = time.perf_counter()
+        first_topic_time = None
+        topics_count = 0
+        async for _ in agent.stream_topics(config):
+            topics_count += 1
+            if first_topic_time is None:
+                first_topic_time = time.perf_counter() - start_time
+        total_time = time.perf_counter() - start_time
+        
+        print(f"\nДо первой темы: {first_topic_time * 1000:.1f} мс, "
+              f"весь ответ: {total_time * 1000:.1f} мс ({first_topic_time / total_time:.0%})")
+        
+        assert topics_count == 5
+        # Без потока первая тема доступна только после всего ответа
+        assert first_topic_time < total_time * 0.35
+
+
+class TestBatchThroughputBenchmark:
+    """Бенчмарк пакетной генерации: пропускная способность от параллельности"""
+    
+    @pytest.mark.asyncio
+    async def test_throughput_vs_concurrency(self, mock_llm):
+        """Запросов в секунду для пакета 12 областей x 4 уровня при разной параллельности"""
+        from src.jobs import run_bounded
+        
+        response = mock_llm.ainvoke.return_value
+        
+        async def slow_ainvoke(prompt):
+            await asyncio.sleep(0.05)  # задержка ответа модели
+            return response
+        
+        mock_llm.ainvoke.side_effect = slow_ainvoke
+        with patch('src.agents.vkr_topic_agent.ChatOpenAI') as mock_openai:
+            mock_openai.return_value = mock_llm
+            agent = VKRTopicAgent()
+        
+        fields = [f"Область {i}" for i in range(12)]
+        configs = [
+            TopicGenerationConfig(field=field, level=level, count=2)
+            for field in fields for level in EducationLevel
+        ]
+        
+        throughput = {}
+        for concurrency in (1, 4, 16, len(configs)):
+            # Лучший из 3 прогонов - меньше влияние случайных пауз
+            elapsed = float("inf")
+            for _ in range(3):
+                start_time = time.perf_counter()
+                results = [
+                    result
+                    async for result in run_bounded(configs, agent.generate_topics, concurrency)
+                ]
+                elapsed = min(elapsed, time.perf_counter() - start_time)
+                
+                assert len(results) == len(configs)
+                assert not any(isinstance(result, Exception) for _, result in results)
+            throughput[concurrency] = len(configs) / elapsed
+            print(f"\nПараллельность {concurrency}: {throughput[concurrency]:.1f} запросов/с")
+        
+        rates = list(throughput.values())
+        assert all(previous < current for previous, current in zip(rates, rates[1:]))
+
+
+class TestPackingBenchmark:
+    """Бенчмарк упаковки запросов: токены против задержки"""
+    
+    @pytest.mark.asyncio
+    async def test_tokens_vs_latency(self, mock_llm, fake_packing_llm, monkeypatch):
+        """Символы промптов и задержка на запрос без упаковки и с упаковкой"""
+        from src.config import settings
+        
+        configs = [
+            TopicGenerationConfig(field=f"Область {i}", level=level, count=2)
+            for i in range(6) for level in EducationLevel
+        ]
+        
+        results = {}
+        for window in (0.0, 0.005):
+            monkeypatch.setattr(settings, "micro_batch_window", window)
+            with patch('src.agents.vkr_topic_agent.ChatOpenAI') as mock_openai:
+                mock_openai.return_value = mock_llm
+                agent = VKRTopicAgent()
+            # 50 мс на вызов плюс время обработки промпта
+            agent.llm = fake_packing_llm(base_delay=0.05, char_delay=0.00001)
+            
+            async def timed(config):
+                start_time = time.perf_counter()
+                topics = await agent.generate_topics(config)
+                assert len(topics) == config.count
+                return time.perf_counter() - start_time
+            
+            latencies = await asyncio.gather(*[timed(config) for config in configs])
+            mean_latency = sum(latencies) / len(latencies)
+            results[window] = (agent.llm.calls, agent.llm.prompt_chars, mean_latency)
+            print(f"\nОкно {window * 1000:.0f} мс: вызовов {agent.llm.calls}, "
+                  f"символов промптов {agent.llm.prompt_chars}, "
+                  f"средняя задержка {results[window][2] * 1000:.1f} мс")
+        
+        single_calls, single_chars, _ = results[0.0]
+        packed_calls, packed_chars, _ = results[0.005]
+        assert single_calls == len(configs)
+        assert packed_calls == len(configs) // settings.micro_batch_max_size
+        assert packed_chars < single_chars / 2
+
+
+class TestHedgingBenchmark:
+    """Бенчмарк хеджирования: хвост задержек при всплесках задержки модели"""
+    
+    @pytest.mark.asyncio
+    async def test_tail_latency(self, mock_llm, monkeypatch):
+        """p50/p95/p99 задержки без хеджирования и с хеджированием"""
+        import random
+        from src.config import settings
+        from src.jobs import run_bounded
+        
+        response = mock_llm.ainvoke.return_value
+        
+        results = {}
+        for hedging in (False, True):
+            monkeypatch.setattr(settings, "llm_hedging", hedging)
+            rng = random.Random(42)
+            
+            async def spiky_ainvoke(prompt):
+                # 5% вызовов попадают на всплеск задержки
+                await asyncio.sleep(0.5 if rng.random() < 0.05 else 0.01 + rng.random() * 0.01)
+                return response
+            
+            mock_llm.ainvoke.side_effect = spiky_ainvoke
+            with patch('src.agents.vkr_topic_agent.ChatOpenAI') as mock_openai:
+                mock_openai.return_value = mock_llm
+                agent = VKRTopicAgent()
+            
+            async def timed(number):
+                start_time = time.perf_counter()
+                await agent.generate_topics(
+                    TopicGenerationConfig(field=f"Область {number}", count=1)
+                )
+                return time.perf_counter() - start_time
+            
+            latencies = sorted([latency async for _, latency in run_bounded(range(300), timed, 20)])
+            p50, p95, p99 = (latencies[len(latencies) * percent // 100] for percent in (50, 95, 99))
+            results[hedging] = p99
+            print(f"\nХеджирование {'вкл' if hedging else 'выкл'}: p50 {p50 * 1000:.0f} мс, "
+                  f"p95 {p95 * 1000:.0f} мс, p99 {p99 * 1000:.0f} мс, "
+                  f"повторных запросов {agent.metrics()['resilience'][agent.model_name]['hedges']}")
+        
+        assert results[True] < results[False] / 2
+
+
+class TestHttpClientBenchmark:
+    """Бенчмарк общего пула HTTP-соединений против клиента на каждый агент"""
+    
+    @pytest.mark.asyncio
+    async def test_connection_reuse(self, fake_llm_server_factory, monkeypatch):
+        """Новые соединения и доля переиспользования при 20 агентах по 3 запроса"""
+        from src.agents.http_client import ConnectionStats, create_http_client
+        from src.config import settings
+        
+        server = fake_llm_server_factory(max_concurrency=8, delay=0.005)
+        monkeypatch.setenv("OPENAI_BASE_URL", server.url)
+        monkeypatch.setattr(settings, "openai_api_key", "test")
+        monkeypatch.setattr(settings, "openai_max_concurrency", 4)
+        
+        results = {}
+        for shared in (False, True):
+            stats = ConnectionStats()
+            clients = [create_http_client(stats)] if shared else []
+            
+            def client_factory():
+                if not shared:
+                    clients.append(create_http_client(stats))
+                return clients[-1]
+            
+            with patch('src.agents.vkr_topic_agent.get_http_client', client_factory):
+                agents = [VKRTopicAgent(model_name="openai:gpt-4.1") for _ in range(20)]
+            
+            start_time = time.perf_counter()
+            await asyncio.gather(*[
+                agent.generate_topics(
+                    TopicGenerationConfig(field=f"Область {number} {index}", count=1)
+                )
+                for number, agent in enumerate(agents)
+                for index in range(3)
+            ])
+            elapsed = time.perf_counter() - start_time
+            for client in clients:
+                await client.aclose()
+            
+            metrics = stats.metrics()
+            results[shared] = metrics
+            print(f"\n{'Общий клиент' if shared else 'Клиент на агента'}: {elapsed * 1000:.0f} мс, "
+                  f"соединений {metrics['connections']} на {metrics['requests']} запросов, "
+                  f"переиспользование {metrics['reuse_ratio']:.0%}")
+        
+        assert results[True]["requests"] == results[False]["requests"] == 60
+        assert results[True]["connections"] <= 4
+        assert results[False]["connections"] >= 20
+        assert results[True]["reuse_ratio"] > results[False]["reuse_ratio"]
+
+
+class TestStreamingParserBenchmark:
+    """Бенчмарк потокового парсера на ответах размером в мегабайты"""
+    
+    @staticmethod
+    def _response(count: int) -> str:
+        import json
+        topics = [
+            {
+                "title": f"Тема исследования номер {i} со {{скобками}} и \"кавычками\"",
+                "description": "Описание темы, " * 20,
+                "keywords": ["анализ", f"ключ {i}", "данные"],
+                "difficulty": "Средняя"
+            }
+            for i in range(count)
+        ]
+        payload = json.dumps({"topics": topics}, ensure_ascii=False, indent=2)
+        return "Вот темы:\n```json\n" + payload + "\n```"
+    
+    @staticmethod
+    def _parse(text: str, chunk_size: int = 256) -> float:
+        from src.agents import IncrementalTopicParser
+        
+        parser = IncrementalTopicParser()
+        start_time = time.perf_counter()
+        for position in range(0, len(text), chunk_size):
+            parser.feed(text[position:position + chunk_size])
+        parser.finish()
+        elapsed = time.perf_counter() - start_time
+        assert parser.topics_emitted == text.count('"title"')
+        return elapsed
+    
+    def test_linear_time(self):
+        """Время разбора растет линейно с длиной ответа"""
+        small, large = self._response(2000), self._response(8000)
+        small_time = min(self._parse(small) for _ in range(3))
+        large_time = min(self._parse(large) for _ in range(3))
+        
+        megabytes = len(large.encode("utf-8")) / 2 ** 20
+        print(f"\nОтвет {megabytes:.1f} МБ: {large_time * 1000:.0f} мс "
+              f"({megabytes / large_time:.0f} МБ/с), "
+              f"в 4 раза короче: {small_time * 1000:.0f} мс")
+        
+        assert megabytes > 4
+        # Линейный рост - в ~4 раза; квадратичный дал бы ~16
+        assert large_time < small_time * 8
+
+
+class TestDuplicateIndexBenchmark:
+    """Бенчмарк индекса почти совпадающих названий"""
+    
+    @staticmethod
+    def _titles(rng, count: int):
+        import itertools
+        
+        consonants, vowels = "бвгдзклмнпрстфхцчшщ", "аеиоуыяю"
+        syllables = [c + v for c in consonants for v in vowels]
+        vocabulary = sorted({
+            "".join(rng.choice(syllables) for _ in range(rng.randint(2, 5)))
+            for _ in range(8000)
+        })
+        # Частоты слов по закону Ципфа, как в настоящих названиях
+        weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+        titles = [
+            " ".join(rng.choices(vocabulary, cum_weights=weights, k=rng.randint(5, 9))).capitalize()
+            for _ in range(count)
+        ]
+        return titles, vocabulary
+    
+    def test_check_latency(self):
+        """Проверка названия занимает меньше миллисекунды"""
+        import random
+        from src.similarity import MinHashLSHIndex, jaccard, shingles
+        
+        rng = random.Random(1)
+        size = _bench_size(30000)
+        titles, vocabulary = self._titles(rng, size + 200)
+        new_titles = titles[size:]
+        titles = titles[:size]
+        
+        index = MinHashLSHIndex()
+        start_time = time.perf_counter()
+        index.add_many(enumerate(titles))
+        build_time = time.perf_counter() - start_time
+        
+        # Почти дубликаты: в сохраненном названии заменено одно слово
+        probes = []
+        for position in rng.sample(range(size), 200):
+            words = titles[position].split()
+            words[rng.randrange(len(words))] = rng.choice(vocabulary)
+            variant = " ".join(words)
+            if jaccard(shingles(variant), shingles(titles[position])) >= index.threshold:
+                probes.append(variant)
+        
+        start_time = time.perf_counter()
+        found = sum(index.find(title) is not None for title in probes)
+        duplicate_time = (time.perf_counter() - start_time) / len(probes)
+        
+        start_time = time.perf_counter()
+        # Совпадения здесь настоящие: find подтверждает сходство точным Жаккаром
+        matches = sum(index.find(title) is not None for title in new_titles)
+        new_time = (time.perf_counter() - start_time) / len(new_titles)
+        
+        recall = found / len(probes)
+        print(f"\nИндекс {size} названий: построение {build_time:.1f} с, "
+              f"дубликат {duplicate_time * 1e6:.0f} мкс, новое название {new_time * 1e6:.0f} мкс, "
+              f"полнота {recall:.2f}, совпадений среди новых {matches}")
+        
+        assert len(probes) > 50
+        assert recall >= 0.9
+        assert duplicate_time < 0.001
+        assert new_time < 0.001
+
+
+class TestSemanticIndexBenchmark:
+    """Бенчмарк семантического индекса: полнота и задержка в зависимости от nprobe"""
+    
+    def test_recall_latency_tradeoff(self, tmp_path):
+        """Отсев перефразированных тем и поиск соседей на синтетическом корпусе"""
+        import itertools
+        import random
+        from src.similarity import SemanticIndex, cosine
+        
+        rng = random.Random(7)
+        size = _bench_size(20000)
+        syllables = [c + v for c in "бвгдзклмнпрстфхцчшщ" for v in "аеиоуыяю"]
+        vocabulary = sorted({
+            "".join(rng.choice(syllables) for _ in range(rng.randint(3, 5))) for _ in range(20000)
+        })
+        weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+        
+        def text(words: int) -> str:
+            return " ".join(rng.choices(vocabulary, cum_weights=weights, k=words))
+        
+        topics = [(text(rng.randint(5, 8)), text(rng.randint(12, 20))) for _ in range(size)]
+        path = str(tmp_path / "semantic.bin")
+        index = SemanticIndex(path=path)
+        start_time = time.perf_counter()
+        for topic_id, (title, description) in enumerate(topics, start=1):
+            index.add(topic_id, title, description)
+        index.rebuild()
+        build_time = time.perf_counter() - start_time
+        
+        start_time = time.perf_counter()
+        index = SemanticIndex.load(path)
+        load_time = time.perf_counter() - start_time
+        
+        # Перефразирование: в названии заменено одно слово
+        probes = []
+        for topic_id in rng.sample(range(1, size + 1), 300):
+            title, description = topics[topic_id - 1]
+            words = title.split()
+            words[rng.randrange(len(words))] = rng.choice(vocabulary[:2000])
+            variant = " ".join(words)
+            if cosine(index.embed(variant, description), index.vector(topic_id)) >= index.threshold:
+                probes.append((topic_id, variant, description))
+        
+        vectors = [(topic_id, index.vector(topic_id)) for topic_id in range(1, size + 1)]
+        queries = [
+            (index.embed(title, description), topic_id)
+            for topic_id, title, description in probes[:20]
+        ]
+        exact = [
+            {topic_id for topic_id, _ in sorted(
+                ((topic_id, cosine(query, vector)) for topic_id, vector in vectors),
+                key=lambda item: -item[1]
+            )[:10]}
+            for query, _ in queries
+        ]
+        
+        print(f"\n{size} тем: построение {build_time:.1f} с, "
+              f"загрузка файла {load_time * 1000:.0f} мс")
+        results = {}
+        for nprobe in (1, 2, 4, 8):
+            index.nprobe = nprobe
+            start_time = time.perf_counter()
+            found = sum(
+                (match := index.find(title, description)) is not None and match[0] == topic_id
+                for topic_id, title, description in probes
+            )
+            find_time = (time.perf_counter() - start_time) / len(probes)
+            
+            start_time = time.perf_counter()
+            neighbours = [
+                {topic_id for topic_id, _ in index.search_vector(query, k=10)}
+                for query, _ in queries
+            ]
+            search_time = (time.perf_counter() - start_time) / len(queries)
+            hits = sum(len(got & expected) for got, expected in zip(neighbours, exact))
+            recall_at_10 = hits / (10 * len(exact))
+            
+            results[nprobe] = (found / len(probes), find_time, recall_at_10, search_time)
+            print(f"nprobe {nprobe}: дубликат {find_time * 1000:.2f} мс, "
+                  f"полнота {found / len(probes):.3f}; "
+                  f"10 соседей {search_time * 1000:.2f} мс, полнота {recall_at_10:.2f}")
+        
+        recall, find_time, _, _ = results[2]
+        assert len(probes) > 100
+        assert recall >= 0.95
+        assert find_time < 0.005
+        assert results[8][2] >= 0.8
+
+
+class TestNeighbourGraphBenchmark:
+    """Бенчмарк графа похожих тем: задержка выдачи и стоимость добавления темы"""
+    
+    def test_lookup_latency(self, tmp_path):
+        """p99 выдачи 20 похожих тем из графа против поиска по индексу"""
+        import itertools
+        import random
+        from src.similarity import NeighbourGraph, SemanticIndex
+        
+        rng = random.Random(11)
+        size = _bench_size(5000)
+        syllables = [c + v for c in "бвгдзклмнпрстфхцчшщ" for v in "аеиоуыяю"]
+        vocabulary = sorted({
+            "".join(rng.choice(syllables) for _ in range(rng.randint(3, 5))) for _ in range(20000)
+        })
+        weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+        
+        def text(words: int) -> str:
+            return " ".join(rng.choices(vocabulary, cum_weights=weights, k=words))
+        
+        semantic = SemanticIndex()
+        for topic_id in range(1, size + 1):
+            semantic.add(topic_id, text(rng.randint(5, 8)), text(rng.randint(12, 20)))
+        semantic.rebuild()
+        
+        path = str(tmp_path / "neighbours.bin")
+        graph = NeighbourGraph(semantic, k=20, path=path)
+        start_time = time.perf_counter()
+        while graph.update(1000):
+            pass
+        graph.save()
+        build_time = time.perf_counter() - start_time
+        graph = NeighbourGraph.load(semantic, path, k=20)
+        
+        def p99(timings: list) -> float:
+            return sorted(timings)[int(len(timings) * 0.99)]
+        
+        lookups = []
+        searches = []
+        for topic_id in rng.sample(range(1, size + 1), 1000):
+            start_time = time.perf_counter()
+            assert graph.neighbours(topic_id, 20) is not None
+            lookups.append(time.perf_counter() - start_time)
+            vector = semantic.vector(topic_id)
+            start_time = time.perf_counter()
+            semantic.search_vector(vector, 20, exclude=topic_id)
+            searches.append(time.perf_counter() - start_time)
+        
+        start_time = time.perf_counter()
+        for topic_id in range(size + 1, size + 101):
+            semantic.add(topic_id, text(rng.randint(5, 8)), text(rng.randint(12, 20)))
+        assert graph.update() == 100
+        add_time = (time.perf_counter() - start_time) / 100
+        
+        print(f"\n{size} тем: граф построен за {build_time:.1f} с, "
+              f"добавление темы {add_time * 1000:.2f} мс; "
+              f"p99 выдачи 20 соседей: граф {p99(lookups) * 1000:.3f} мс, "
+              f"поиск по индексу {p99(searches) * 1000:.2f} мс")
+        assert p99(lookups) < 0.005
+        assert p99(lookups) < p99(searches)
+
+
+class TestPromptRenderingBenchmark:
+    """
+    Бенчмарк сборки промптов: кэш блоков кафедр и разобранный шаблон
+    против форматирования шаблона
+    """
+    
+    def test_prompt_throughput(self, mock_llm):
+        """Сборка промптов для студентов нескольких кафедр - не меньше 10 тыс. в секунду"""
+        from src.agents.prompts import (
+            METHODOLOGY_TEXT, TRENDS_TEXT, format_department_context, format_duplicate_avoidance,
+            format_personalization, format_student_context
+        )
+        from src.models import DepartmentContext, StudentPreferences
+        
+        with patch('src.agents.vkr_topic_agent.ChatOpenAI') as mock_openai:
+            mock_openai.return_value = mock_llm
+            agent = VKRTopicAgent(model_name="openai:gpt-4.1")
+        
+        departments = [
+            DepartmentContext(
+                research_directions=[f"Направление {number}.{index}" for index in range(5)],
+                available_resources=["Вычислительный кластер", "Лаборатория данных"],
+                supervisor_expertise=[f"Эксперт {number}.{index}" for index in range(8)],
+                recent_publications=[f"Публикация {number}.{index}" for index in range(10)],
+                existing_topics=[
+                    f"Существующая тема кафедры {number} номер {index}" for index in range(30)
+                ]
+            )
+            for number in range(20)
+        ]
+        configs = [
+            TopicGenerationConfig(
+                field="Информатика",
+                count=5,
+                student_preferences=StudentPreferences(
+                    interests=[f"Интерес {number}"], skills=["Python"]
+                ),
+                # Каждый запрос присылает свою копию контекста кафедры
+                department_context=DepartmentContext(
+                    **departments[number % len(departments)].dict()
+                )
+            )
+            for number in range(10000)
+        ]
+        
+        def template_prompt(config):
+            return agent.prompt_template.format_messages(
+                count=config.count,
+                field=config.field,
+                specialization_text="",
+                level=config.level,
+                trends_text=TRENDS_TEXT,
+                methodology_text=METHODOLOGY_TEXT,
+                student_context_text=format_student_context(config.student_preferences),
+                department_context_text=format_department_context(config.department_context),
+                duplicate_avoidance_text=format_duplicate_avoidance(
+                    True, config.department_context
+                ),
+                personalization_text=format_personalization(config.student_preferences)
+            )
+        
+        start_time = time.perf_counter()
+        for config in configs:
+            template_prompt(config)
+        template_rate = len(configs) / (time.perf_counter() - start_time)
+        
+        start_time = time.perf_counter()
+        for config in configs:
+            agent._build_prompt(config)
+        rendered_rate = len(configs) / (time.perf_counter() - start_time)
+        
+        print(f"\nПромптов в секунду: шаблон LangChain {template_rate:.0f}, "
+              f"сборка {rendered_rate:.0f}")
+        assert rendered_rate >= 10000
+        assert rendered_rate > template_rate
+        assert agent.metrics()["prompts"]["misses"] == len(departments)
@@ -0,0 +1,391 @@
+"""
+Тесты поиска похожих тем
+"""
+
+import pytest
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from src.models import VKRTopic, EducationLevel
+from src.similarity import (
+    DuplicateFilter, MinHashLSHIndex, NeighbourGraph, SemanticIndex, TopicEmbedder,
+    jaccard, normalize_title, shingles, tokenize
+)
+
+
+TITLES = [
+    "Разработка системы рекомендаций на основе машинного обучения",
+    "Анализ тональности отзывов клиентов банка методами NLP",
+    "Прогнозирование спроса на электроэнергию с использованием нейронных сетей",
+    "Разработка мобильного приложения для учета личных финансов",
+    "Исследование методов защиты беспроводных сетей от атак",
+]
+
+
+class TestMinHashLSHIndex:
+    """Тесты индекса почти совпадающих названий"""
+
+    def test_normalization(self):
+        """Регистр, ё и пунктуация не влияют на n-граммы"""
+        normalized = normalize_title("  Учёт  ФИНАНСОВ: (веб-приложение)!")
+        assert normalized == "учет финансов веб приложение"
+        assert shingles("Учёт финансов") == shingles("учет, ФИНАНСОВ")
+        assert jaccard(shingles("Учёт финансов"), shingles("Учет финансов")) == 1.0
+
+    def test_finds_near_duplicates(self):
+        """Переформулированное название находится, другое - нет"""
+        index = MinHashLSHIndex()
+        index.add_many(enumerate(TITLES, start=1))
+
+        match = index.find("РАЗРАБОТКА систем рекомендаций на основе машинного обучения")
+        assert match is not None
+        assert match[0] == 1
+        assert match[1] == TITLES[0]
+        assert match[2] >= 0.7
+
+        assert index.find("Система рекомендаций на основе машинного обучения: разработка")[0] == 1
+        assert index.find(
+            "Оптимизация маршрутов доставки с помощью генетических алгоритмов"
+        ) is None
+        assert index.find("") is None
+
+    def test_remove_and_replace(self):
+        """Удаленное название не находится, замена по ID заменяет название"""
+        index = MinHashLSHIndex()
+        index.add_many(enumerate(TITLES, start=1))
+
+        assert index.remove(2)
+        assert not index.remove(2)
+        assert index.find(TITLES[1]) is None
+
+        index.add("Оптимизация маршрутов доставки с помощью генетических алгоритмов", 3)
+        assert index.find(TITLES[2]) is None
+        found = index.find("Оптимизация маршрута доставки с помощью генетических алгоритмов")
+        assert found[0] == 3
+        assert len(index) == 4
+
+    def test_merge_keeps_titles_searchable(self):
+        """Названия находятся и после слияния новых записей с массивами полос"""
+        index = MinHashLSHIndex(merge_size=7)
+        titles = [
+            f"{title} (вариант для кафедры номер {number})"
+            for number in range(10) for title in TITLES
+        ]
+        index.add_many(enumerate(titles))
+
+        assert all(index.find(title) is not None for title in titles)
+        assert index.find(titles[-1])[1] == titles[-1]
+
+
+class TestDuplicateFilter:
+    """Тесты отсева тем-дубликатов"""
+
+    @pytest.mark.asyncio
+    async def test_refresh_is_incremental(self, topic_repository, sample_topics_list):
+        """Загружаются только темы, появившиеся после прошлой загрузки"""
+        duplicate_filter = DuplicateFilter(MinHashLSHIndex(), page_size=1)
+        await topic_repository.create_topics_bulk(
+            [VKRTopic(**topic) for topic in sample_topics_list]
+        )
+
+        assert await duplicate_filter.refresh(topic_repository) == 2
+        assert await duplicate_filter.refresh(topic_repository) == 0
+
+        await topic_repository.create_topic(VKRTopic(
+            title=TITLES[2], field="Энергетика", level=EducationLevel.MASTER
+        ))
+        assert await duplicate_filter.refresh(topic_repository) == 1
+        assert duplicate_filter.metrics()["indexed_titles"] == 3
+
+    def test_find_duplicates(self):
+        """Совпадения с базой, с темами кафедры и внутри ответа"""
+        duplicate_filter = DuplicateFilter(MinHashLSHIndex())
+        duplicate_filter.index.add_many(enumerate(TITLES[:2], start=1))
+
+        duplicates = duplicate_filter.find_duplicates(
+            [
+                "Разработка систем рекомендаций на основе машинного обучения",
+                "Прогнозирование спроса на электроэнергию с использованием нейросетей",
+                "Оптимизация маршрутов доставки с помощью генетических алгоритмов",
+                "Оптимизация маршрута доставки с помощью генетических алгоритмов",
+            ],
+            existing=[TITLES[2]]
+        )
+
+        assert duplicates == [
+            TITLES[0],
+            TITLES[2],
+            None,
+            "Оптимизация маршрутов доставки с помощью генетических алгоритмов",
+        ]
+        metrics = duplicate_filter.metrics()
+        assert metrics["checks"] == 4
+        assert metrics["duplicates"] == 3
+
+
+class TestGenerateTopicsDedup:
+    """Тесты отсева дубликатов в /generate-topics"""
+
+    def test_duplicates_replaced_by_regeneration(self, test_client, topic_repository):
+        """Дубликат сохраненной темы отсеивается, вместо него генерируется новая тема"""
+        from src.agents import TopicGenerationConfig
+        from src.api.server import app
+        from src.database import get_db
+
+        duplicate_title = "Разработка систем рекомендаций на основе машинного обучения"
+        replies = [
+            [duplicate_title, "Анализ тональности отзывов клиентов банка методами NLP"],
+            ["Исследование методов защиты беспроводных сетей от атак"],
+        ]
+
+        async def generate(config: TopicGenerationConfig):
+            return [
+                VKRTopic(title=title, field=config.field, level=config.level)
+                for title in replies.pop(0)
+            ]
+
+        mock_agent = MagicMock()
+        mock_agent.metrics.return_value = {}
+        mock_agent.model_name = "openai:gpt-4.1"
+        mock_agent.generate_topics = AsyncMock(side_effect=generate)
+
+        @asynccontextmanager
+        async def repository_scope():
+            yield topic_repository
+
+        duplicate_filter = DuplicateFilter(MinHashLSHIndex())
+        app.dependency_overrides[get_db] = lambda: topic_repository
+        try:
+            with patch("src.api.server.topic_agent", mock_agent), \
+                 patch("src.api.server.duplicate_filter", duplicate_filter), \
+                 patch("src.api.server.repository_scope", repository_scope):
+                topic_repository._create_topic(VKRTopic(
+                    title=TITLES[0], field="Информатика", level=EducationLevel.BACHELOR
+                ))
+                response = test_client.post(
+                    "/generate-topics", json={"field": "Информатика", "count": 2}
+                )
+                metrics = test_client.get("/metrics").json()["dedup"]
+        finally:
+            app.dependency_overrides.clear()
+
+        assert response.status_code == 200
+        assert [topic["title"] for topic in response.json()["topics"]] == [
+            "Анализ тональности отзывов клиентов банка методами NLP",
+            "Исследование методов защиты беспроводных сетей от атак",
+        ]
+        retry_config = mock_agent.generate_topics.await_args_list[1].args[0]
+        assert retry_config.count == 1
+        assert retry_config.department_context.existing_topics == [duplicate_title]
+        assert metrics["duplicates"] == 1
+        # Принятые темы попадут в индекс при следующей загрузке из базы
+        assert metrics["indexed_titles"] == 1
+
+
+DESCRIPTIONS = [
+    "Персональные рекомендации товаров по истории покупок",
+    "Классификация отзывов по тональности",
+    "Краткосрочный прогноз потребления электроэнергии",
+    "Приложение для планирования бюджета",
+    "Обнаружение вторжений в сети Wi-Fi",
+]
+
+
+class TestSemanticIndex:
+    """Тесты индекса тем, похожих по смыслу"""
+
+    @pytest.fixture
+    def index(self):
+        index = SemanticIndex()
+        for topic_id, (title, description) in enumerate(zip(TITLES, DESCRIPTIONS), start=1):
+            index.add(topic_id, title, description)
+        return index
+
+    def test_tokenize(self):
+        """Сокращения раскрываются, синонимы и формы слова приводятся к одной основе"""
+        assert tokenize("Разработка рекомендательной системы на ML") == [
+            "создан", "рекоме", "систем", "машинн", "обучен"
+        ]
+        assert sorted(tokenize("Создание системы рекомендаций с машинным обучением")) == sorted(
+            tokenize("Разработка рекомендательной системы на ML")
+        )
+
+    def test_finds_paraphrase(self, index):
+        """Перефразированная тема находится, тема о другом - нет"""
+        match = index.find("Создание системы рекомендаций с машинным обучением")
+        assert match is not None
+        assert match[0] == 1
+        assert match[1] >= index.threshold
+
+        assert index.find("Создание мобильного приложения для учета складских запасов") is None
+        assert index.find("и на в") is None
+
+        # Кандидаты - только темы с общими главными признаками
+        neighbours = index.search(
+            "Разработка мобильного приложения для учета складских запасов", k=3
+        )
+        assert [topic_id for topic_id, _ in neighbours] == [4]
+        assert 0 < neighbours[0][1] < index.threshold
+
+    def test_save_and_load(self, index, tmp_path):
+        """Индекс сохраняется в файл и загружается через mmap вместе с последующими изменениями"""
+        path = str(tmp_path / "semantic.bin")
+        index.path = path
+        assert index.save()
+        assert not index.save()
+
+        loaded = SemanticIndex.load(path)
+        assert len(loaded) == 5
+        assert loaded.max_topic_id == 5
+        assert loaded.find("Создание системы рекомендаций с машинным обучением")[0] == 1
+
+        loaded.add(6, "Оптимизация маршрутов доставки с помощью генетических алгоритмов")
+        assert loaded.remove(1)
+        assert loaded.find("Создание системы рекомендаций с машинным обучением") is None
+        assert loaded.find("Улучшение маршрутов доставки генетическими алгоритмами")[0] == 6
+        assert loaded.save()
+
+        reloaded = SemanticIndex.load(path)
+        assert len(reloaded) == 5
+        assert reloaded.find("Создание системы рекомендаций с машинным обучением") is None
+        assert reloaded.find("Улучшение маршрутов доставки генетическими алгоритмами")[0] == 6
+        assert reloaded.vector(6) == pytest.approx(loaded.vector(6))
+
+    def test_rebuild_keeps_concurrent_changes(self, index, monkeypatch):
+        """Темы, добавленные и удаленные во время пересчета, не теряются"""
+        fit = TopicEmbedder.fit
+
+        def fit_with_changes(embedder, documents):
+            index.add(6, "Оптимизация маршрутов доставки с помощью генетических алгоритмов")
+            index.remove(1)
+            return fit(embedder, documents)
+
+        monkeypatch.setattr(TopicEmbedder, "fit", fit_with_changes)
+        index.rebuild()
+
+        assert len(index) == 5
+        assert index.metrics()["trained_size"] == 5
+        assert not index.metrics()["rebuilding"]
+        assert index.find("Создание системы рекомендаций с машинным обучением") is None
+        assert index.find("Оптимизация маршрутов доставки генетическими алгоритмами")[0] == 6
+        assert index.find(TITLES[1], DESCRIPTIONS[1])[0] == 2
+
+
+class TestSemanticDuplicateFilter:
+    """Тесты отсева тем, совпадающих по смыслу"""
+
+    @pytest.mark.asyncio
+    async def test_refresh_loads_texts(self, topic_repository, sample_topics_list):
+        """Семантический индекс догружает темы новее сохраненных"""
+        duplicate_filter = DuplicateFilter(MinHashLSHIndex(), semantic=SemanticIndex())
+        await topic_repository.create_topics_bulk(
+            [VKRTopic(**topic) for topic in sample_topics_list]
+        )
+
+        await duplicate_filter.refresh(topic_repository)
+        await duplicate_filter.refresh(topic_repository)
+        assert duplicate_filter.metrics()["semantic"]["indexed_topics"] == 2
+        assert duplicate_filter.semantic.max_topic_id == 2
+
+    def test_find_semantic_duplicates(self):
+        """Перефразированная тема отсеивается, хотя общих n-грамм мало"""
+        duplicate_filter = DuplicateFilter(MinHashLSHIndex(), semantic=SemanticIndex())
+        duplicate_filter.add(1, TITLES[0], DESCRIPTIONS[0])
+
+        duplicates = duplicate_filter.find_duplicates(
+            [
+                "Создание системы рекомендаций с машинным обучением",
+                "Изучение тональности отзывов клиентов банка "
+                "методами обработки естественного языка",
+                "Оптимизация маршрутов доставки с помощью генетических алгоритмов",
+            ],
+            existing=[TITLES[1]],
+            descriptions=["Рекомендации товаров", "", ""]
+        )
+
+        assert duplicates == [TITLES[0], TITLES[1], None]
+        metrics = duplicate_filter.metrics()
+        assert metrics["semantic_duplicates"] == 2
+        assert metrics["semantic"]["indexed_topics"] == 1
+
+
+class TestNeighbourGraph:
+    """Тесты графа похожих тем"""
+
+    @pytest.fixture
+    def semantic(self):
+        semantic = SemanticIndex()
+        for topic_id, (title, description) in enumerate(zip(TITLES, DESCRIPTIONS), start=1):
+            semantic.add(topic_id, title, description)
+        semantic.add(6, "Создание рекомендательной системы товаров с машинным обучением")
+        return semantic
+
+    def test_incremental_update(self, semantic, tmp_path):
+        """Новая тема получает соседей и попадает в их списки; удаленная пропадает из выдачи"""
+        graph = NeighbourGraph(semantic, k=3)
+        # До добавления в граф соседи ищутся по индексу
+        assert graph.neighbours(1)[0][0] == 6
+        assert graph.update() == 6
+        assert graph.update() == 0
+        assert graph.metrics()["fallbacks"] == 1
+
+        semantic.add(7, "Рекомендательная система фильмов на основе машинного обучения")
+        assert graph.update() == 1
+        assert {topic_id for topic_id, _ in graph.neighbours(7)} >= {1, 6}
+        assert 7 in [topic_id for topic_id, _ in graph.neighbours(1)]
+        assert graph.neighbours(99) is None
+
+        semantic.remove(6)
+        graph.remove(6)
+        assert 6 not in [topic_id for topic_id, _ in graph.neighbours(1)]
+        graph.update()
+        assert graph.metrics()["fallbacks"] == 1
+
+        # Измененная тема пересчитывается вместе со списками прежних соседей
+        semantic.add(7, "Оптимизация логистических маршрутов доставки")
+        graph.invalidate(7)
+        graph.update()
+        assert 7 not in [topic_id for topic_id, _ in graph.neighbours(1)]
+
+        path = str(tmp_path / "neighbours.bin")
+        graph.path = path
+        assert graph.save()
+        assert not graph.save()
+        loaded = NeighbourGraph.load(semantic, path, k=3)
+        assert loaded.max_topic_id == 7
+        assert loaded.neighbours(1) == pytest.approx(graph.neighbours(1))
+        assert loaded.neighbours(1, k=1) == loaded.neighbours(1)[:1]
+        with pytest.raises(ValueError):
+            NeighbourGraph.load(semantic, path, k=5)
+
+    def test_similar_topics_endpoint(self, test_client, topic_repository):
+        """Похожие темы отдаются из графа вместе с данными тем"""
+        from src.api.server import app
+        from src.database import get_db
+
+        titles = TITLES + ["Создание рекомендательной системы товаров с машинным обучением"]
+        for title in titles:
+            topic_repository._create_topic(
+                VKRTopic(title=title, field="Информатика", level=EducationLevel.BACHELOR)
+            )
+        semantic = SemanticIndex()
+        for topic_id, title in enumerate(titles, start=1):
+            semantic.add(topic_id, title)
+        graph = NeighbourGraph(semantic, k=3)
+        graph.update()
+
+        app.dependency_overrides[get_db] = lambda: topic_repository
+        try:
+            with patch("src.api.server.neighbour_graph", graph):
+                response = test_client.get("/topics/1/similar", params={"k": 1})
+                missing = test_client.get("/topics/100/similar")
+                metrics = test_client.get("/metrics").json()["similar_topics"]
+        finally:
+            app.dependency_overrides.clear()
+
+        assert response.status_code == 200
+        similar = response.json()["similar"]
+        assert [item["topic"]["title"] for item in similar] == [titles[5]]
+        assert similar[0]["similarity"] >= 0.5
+        assert missing.status_code == 404
+        assert metrics["lookups"] == 1